@@ -0,0 +1,98 @@
+"""Benchmark de la escritura de refPartJson / partJson de load_slot.
+
+Calcula en memoria el payload de un programa (load_slot_payload) y compara el
+coste de escribirlo y volver a leerlo:
+
+- anterior: serialize_for_json sobre todo el árbol + json.dump con indent=2
+- compacto: write_json_file sin sangría (orjson si está instalado)
+- compacto json: igual, forzando el módulo json
+- legible: write_json_file con indent=2 (load_slot.py --pretty)
+
+Comprueba que todos los ficheros se leen con json.load a los mismos datos.
+
+Uso (desde parser_lpp_BATCH_2):
+
+    python benchmarks/bench_load_slot_json.py <programa.lpp|.cnc> [--repeat 3]
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import module_ai2.load_slot as load_slot_module  # noqa: E402
+from module_ai2.load_slot import load_slot_payload, serialize_for_json, write_json_file  # noqa: E402
+
+
+def legacy_write(path: Path, payload) -> None:
+    """Escritura anterior: recorrido recursivo completo y json.dump con indent=2."""
+    with open(path, "w") as f:
+        json.dump(serialize_for_json(payload), f, indent=2)
+
+
+def json_only_write(path: Path, payload) -> None:
+    backend = load_slot_module.orjson
+    load_slot_module.orjson = None
+    try:
+        write_json_file(path, payload)
+    finally:
+        load_slot_module.orjson = backend
+
+
+def timed(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("slot_file")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        ref_list, part_list = load_slot_payload(args.slot_file)
+    payload = {"ref": ref_list, "parts": part_list}
+
+    variants = {
+        "anterior": legacy_write,
+        "compacto": lambda path, data: write_json_file(path, data),
+        "compacto json": json_only_write,
+        "legible": lambda path, data: write_json_file(path, data, indent=2),
+    }
+    backend = "orjson" if load_slot_module.orjson is not None else "json"
+    print(f"{Path(args.slot_file).name}: {len(ref_list)} referencias, {len(part_list)} piezas (backend {backend})")
+
+    same = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, write in variants.items():
+            path = Path(tmp) / f"{name.replace(' ', '_')}.json"
+            t_write = timed(lambda: write(path, payload), args.repeat)
+
+            def read():
+                with open(path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+
+            t_read = timed(read, args.repeat)
+            same = same and read() == payload
+            size_mb = path.stat().st_size / (1024 * 1024)
+            print(f"  {name:14s} escritura {t_write * 1000:8.1f} ms | lectura {t_read * 1000:8.1f} ms | {size_mb:7.2f} MB")
+
+    print(f"  mismos datos al leer: {same}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
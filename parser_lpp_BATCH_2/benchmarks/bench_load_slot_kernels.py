@@ -0,0 +1,165 @@
+"""Micro-benchmark de los kernels geométricos de load_slot.
+
+Compara la implementación anterior (bucle por segmento / por triángulo) de
+generate_contour_points y circumcenter_triangles con la vectorizada de
+module_ai2/load_slot.py sobre una pieza sintética de un único contorno con
+~5k segmentos (mitad rectas, mitad arcos), y comprueba que los resultados son
+idénticos bit a bit.
+
+Uso (desde parser_lpp_BATCH_2):
+
+    python benchmarks/bench_load_slot_kernels.py [--segments 5000] [--dist-res 3] [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy.spatial import Delaunay
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from module_ai2.load_slot import (  # noqa: E402
+    Contour,
+    Segment,
+    _SegmentColumns,
+    circumcenter_triangles,
+    generate_contour_points,
+)
+
+
+def legacy_generate_contour_points(segments, dist_res):
+    """Copia de la implementación anterior (un np.linspace por segmento)."""
+    points_list = []
+
+    for segment in segments:
+        seg_type = segment.type
+        initial_pos = np.array(segment.initial_pos)
+        final_pos = np.array(segment.final_pos)
+
+        if seg_type == 1:
+            vector = final_pos - initial_pos
+            dist = np.linalg.norm(vector)
+            if dist > 0:
+                dire = vector / dist
+                n_gaps = int(np.floor(dist / dist_res))
+                distances = np.linspace(0, dist - dist_res, n_gaps) if n_gaps > 0 else np.array([0])
+                interp_pos = initial_pos + dire * distances[:, np.newaxis]
+            else:
+                interp_pos = initial_pos.reshape(1, -1)
+
+        elif seg_type in (2, 3):
+            center_pos = initial_pos + np.array(segment.arc_center_off)
+            v1 = initial_pos[:2] - center_pos[:2]
+            v2 = final_pos[:2] - center_pos[:2]
+            r = np.linalg.norm(v2)
+            angle_1 = np.arctan2(v1[1], v1[0])
+            angle_2 = np.arctan2(v2[1], v2[0])
+            if seg_type == 2 and angle_2 >= angle_1:
+                angle_2 = angle_2 - 2 * np.pi
+            elif seg_type == 3 and angle_2 <= angle_1:
+                angle_2 = angle_2 + 2 * np.pi
+
+            angles = np.array([angle_1])
+            Z_col = final_pos[2]
+            if (dist_res <= (2 * r)) and (r > 0):
+                angular_res_aux = 2 * np.arcsin(dist_res / (2 * r))
+                n_gaps = int(np.floor(abs(angle_2 - angle_1) / angular_res_aux))
+                if n_gaps > 1:
+                    angles = np.linspace(angle_1, angle_2, n_gaps + 1)[:n_gaps]
+                    Z_col = np.linspace(center_pos[2], final_pos[2], n_gaps)
+
+            aux_points = center_pos[:2] + r * np.column_stack([np.cos(angles), np.sin(angles)])
+            if isinstance(Z_col, (int, float)):
+                Z_col = np.full(len(angles), Z_col)
+            interp_pos = np.column_stack([aux_points, Z_col])
+
+        else:
+            continue
+
+        points_list.append(interp_pos)
+
+    return np.vstack(points_list) if points_list else np.array([]).reshape(0, 3)
+
+
+def legacy_circumcenter_triangles(triangles, points):
+    """Copia de la implementación anterior (aritmética escalar por triángulo)."""
+    circumcenters = np.zeros((len(triangles), 2))
+    for i, tri in enumerate(triangles):
+        ax, ay = points[tri[0]][0], points[tri[0]][1]
+        bx, by = points[tri[1]][0], points[tri[1]][1]
+        cx, cy = points[tri[2]][0], points[tri[2]][1]
+        D = 2 * (ax * (by - cy) + bx * (cy - ay) + cx * (ay - by))
+        if abs(D) < 1e-10:
+            circumcenters[i] = np.array([(ax + bx + cx) / 3, (ay + by + cy) / 3])
+        else:
+            ux = ((ax**2 + ay**2) * (by - cy) + (bx**2 + by**2) * (cy - ay) + (cx**2 + cy**2) * (ay - by)) / D
+            uy = ((ax**2 + ay**2) * (cx - bx) + (bx**2 + by**2) * (ax - cx) + (cx**2 + cy**2) * (bx - ax)) / D
+            circumcenters[i] = np.array([ux, uy])
+    return circumcenters
+
+
+def build_synthetic_contour(n_segments: int, radius: float = 12000.0) -> Contour:
+    """Contorno cerrado CCW alrededor de un círculo: rectas y arcos alternos."""
+    columns = _SegmentColumns()
+    columns.start_contour()
+    step = 2 * math.pi / n_segments
+    for k in range(n_segments):
+        # Las rectas cortan hacia dentro (cuerda) y los arcos siguen el círculo
+        start = [radius * math.cos(k * step), radius * math.sin(k * step), 0.0]
+        end = [radius * math.cos((k + 1) * step), radius * math.sin((k + 1) * step), 0.0]
+        if k % 2 == 0:
+            columns.add((1, 1, start, end, [0.0, 0.0, 0.0], 100.0, 0))
+        else:
+            columns.add((3, 1, start, end, [-start[0], -start[1], 0.0], 100.0, -1))
+    store = columns.build()
+    return Contour(store=store, rows=store.contour_rows(0))
+
+
+def timed(func, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=5000)
+    parser.add_argument("--dist-res", type=float, default=3.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    contour = build_synthetic_contour(args.segments)
+    # La versión anterior trabajaba sobre objetos Segment
+    segments = [Segment(type=s.type, subtype=s.subtype, initial_pos=s.initial_pos, final_pos=s.final_pos,
+                        arc_center_off=s.arc_center_off, arc_center=s.arc_center, arc_sense=s.arc_sense,
+                        power=s.power) for s in contour.segments]
+
+    t_old, pts_old = timed(lambda: legacy_generate_contour_points(segments, args.dist_res), args.repeat)
+    t_new, pts_new = timed(lambda: generate_contour_points(contour, args.dist_res), args.repeat)
+    same_points = pts_old.shape == pts_new.shape and pts_old.tobytes() == pts_new.tobytes()
+    print(f"generate_contour_points: {contour.total_segments} segmentos -> {len(pts_new)} puntos")
+    print(f"  anterior {t_old * 1000:8.2f} ms | vectorizada {t_new * 1000:8.2f} ms | x{t_old / t_new:.1f} | idéntico: {same_points}")
+
+    P = pts_new[:, :2]
+    triangles = Delaunay(P).simplices
+    t_old, cc_old = timed(lambda: legacy_circumcenter_triangles(triangles, P), args.repeat)
+    t_new, cc_new = timed(lambda: circumcenter_triangles(triangles, P), args.repeat)
+    same_centers = cc_old.tobytes() == cc_new.tobytes()
+    print(f"circumcenter_triangles: {len(triangles)} triángulos")
+    print(f"  anterior {t_old * 1000:8.2f} ms | vectorizada {t_new * 1000:8.2f} ms | x{t_old / t_new:.1f} | idéntico: {same_centers}")
+
+    return 0 if same_points and same_centers else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
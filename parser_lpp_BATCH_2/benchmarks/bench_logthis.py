@@ -0,0 +1,95 @@
+"""Benchmark del log de la aplicación (modules/logthis.py).
+
+Registra N mensajes repartidos en varios hilos, como con DEBUG_LEVEL = 2 y
+compute_ref.max_workers > 1, y compara:
+
+- anterior: abrir, escribir y cerrar el fichero del día en cada mensaje
+- cola: LogThis actual (encola y escribe un hilo por lotes); se mide lo que
+  tardan los hilos en registrar y el total hasta que todo está en disco
+
+Comprueba que el fichero tiene una línea por mensaje. Escribe en una carpeta
+temporal, no en LOG/.
+
+Uso (desde parser_lpp_BATCH_2):
+
+    python benchmarks/bench_logthis.py [--messages 20000] [--threads 4]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules.logthis import LogThis, configure_log, flush_log  # noqa: E402
+
+
+def legacy_log(log_dir: str, mess_code: str, is_input: str, mess_str: str, value: str) -> None:
+    """Escritura anterior: datetime.now, exists y open/close por mensaje."""
+    ahora = datetime.now()
+    ahora_filename = f"{ahora.year}-{ahora.month}-{ahora.day}_Sorting-study.log"
+    new_line = f"{ahora.day}-{ahora.month}-{ahora.year} {ahora.hour}:{ahora.minute}:{ahora.second} {is_input} [{mess_code}] = {mess_str} {value}\n"
+    if not os.path.exists(os.path.join(log_dir, ahora_filename)) and not os.path.exists(log_dir):
+        os.mkdir(log_dir)
+    with open(os.path.join(log_dir, ahora_filename), "a", newline="") as archivo_log:
+        archivo_log.write(new_line)
+
+
+def run_threads(log, messages: int, threads: int) -> float:
+    per_thread = messages // threads
+
+    def worker(k: int) -> None:
+        for i in range(per_thread):
+            log("COMPUTE_REF", "INF", f"combinación {k}-{i}", "")
+
+    workers = [threading.Thread(target=worker, args=(k,)) for k in range(threads)]
+    t0 = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - t0
+
+
+def count_lines(log_dir: str) -> int:
+    return sum(len(open(os.path.join(log_dir, name)).read().splitlines()) for name in os.listdir(log_dir))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+    messages = args.messages // args.threads * args.threads
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_dir = os.path.join(tmp, "legacy")
+        # Sin lock, como antes: las líneas de varios hilos pueden mezclarse.
+        t_legacy = run_threads(lambda *a: legacy_log(legacy_dir, *a), messages, args.threads)
+        legacy_lines = count_lines(legacy_dir)
+
+        queue_dir = os.path.join(tmp, "queue")
+        configure_log(log_dir=queue_dir)
+        t_enqueue = run_threads(LogThis, messages, args.threads)
+        t0 = time.perf_counter()
+        flush_log()
+        t_total = t_enqueue + time.perf_counter() - t0
+        queue_lines = count_lines(queue_dir)
+
+    print(f"{messages} mensajes en {args.threads} hilos")
+    print(f"  anterior  {t_legacy * 1000:8.1f} ms ({legacy_lines} líneas)")
+    print(f"  cola      {t_enqueue * 1000:8.1f} ms registrando | {t_total * 1000:8.1f} ms hasta disco ({queue_lines} líneas)")
+    ok = queue_lines == messages
+    print(f"  una línea por mensaje: {ok}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""Benchmark del separador de piezas sobre un nido sintético grande.
+
+Genera un programa de ~500k líneas con muchas piezas distintas y repeticiones,
+lo separa con la implementación original (regex sin compilar y lista de IDs)
+y con la actual de modules/parse_parts.py, y comprueba que los CNC generados
+y su orden son idénticos byte a byte.
+
+Uso (desde parser_lpp_BATCH_2):
+
+    python benchmarks/bench_parse_parts.py [--lines 500000] [--pieces 5000] [--repeat 3]
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules.parse_parts import parse_gcode_parts  # noqa: E402
+
+
+def legacy_parse_gcode_parts(file_content, output_dir="OUT_cnc"):
+    """Copia de la implementación anterior, usada como referencia de salida y de tiempo."""
+    print("\nInicida la busqueda de piezas...")
+    current_line = 0
+    procesed_id = []
+    generated_files = []
+    current_piece_id = -1
+    current_contour = []
+    piece_id = None
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    piece_pattern = r'^\(P(\d+):ID(\d+):(.*?)\)'
+    n_pattern = r'^N\d+\s'
+    end_part_call_pattern = re.compile(r"\bP9103\b")
+
+    n_lines = len(file_content)
+
+    while current_line <= n_lines - 1:
+        piece_match = re.match(piece_pattern, file_content[current_line])
+
+        if piece_match:
+            piece_id = piece_match.group(2)
+            piece_name = piece_match.group(3)
+            if procesed_id.count(piece_id) == 0:
+                procesed_id.append(piece_id)
+                current_piece_id = piece_id
+                current_piece_name = piece_name
+                output_filename = output_dir / f"ID{current_piece_id}_{current_piece_name}.cnc"
+                print(f"    --> {file_content[current_line]}")
+
+        else:
+            if end_part_call_pattern.search(file_content[current_line]) and current_piece_id == piece_id:
+                nxxx_match = re.match(n_pattern, file_content[current_line])
+                if nxxx_match and current_piece_id == piece_id:
+                    _, n_characters = nxxx_match.span()
+                    current_contour.append(file_content[current_line][n_characters:])
+                else:
+                    current_contour.append(file_content[current_line])
+
+                with open(output_filename, "w", encoding="utf-8", newline="\n") as archivo:
+                    archivo.write(f"{current_piece_id}\n")
+                    archivo.write(f"{current_piece_name}\n")
+                    for c in current_contour:
+                        archivo.write(f"{c}\n")
+                generated_files.append(output_filename.name)
+
+                current_piece_id = None
+                current_piece_name = None
+                current_contour = []
+
+            else:
+                nxxx_match = re.match(n_pattern, file_content[current_line])
+                if nxxx_match and current_piece_id == piece_id:
+                    _, n_characters = nxxx_match.span()
+                    current_contour.append(file_content[current_line][n_characters:])
+                else:
+                    if current_piece_id == piece_id:
+                        current_contour.append(file_content[current_line])
+
+        current_line += 1
+
+    print(len(procesed_id), "piezas encontradas")
+    generated_files.sort()
+    return generated_files
+
+
+def build_synthetic_nest(n_lines: int, n_pieces: int) -> list[str]:
+    """Nido con cabecera, n_pieces IDs distintos y repeticiones hasta llegar a n_lines."""
+    lines = [
+        "O0099  ;",
+        "( MATERIAL : Acero al carbono N2 )  ;",
+        "( THICKNESS : 4 )  ;",
+        "( FORMAT : 1500x3000 )  ;",
+        "N100 G65 P9100 A103 B02  ;",
+    ]
+    n = 101
+    placement = 0
+    while len(lines) < n_lines:
+        piece = placement % n_pieces + 1
+        placement += 1
+        x0 = 10.0 + (placement % 50) * 25.0
+        y0 = 10.0 + (placement // 50 % 100) * 25.0
+        segments = 6 + piece % 40
+        lines.append(f"(P{placement}:ID{piece}:W{56000000 + piece})  ;")
+        lines.append(f"N{n} M98 P9101  ;")
+        lines.append(f"N{n + 1} G0X{x0:.2f}Y{y0:.2f}  ;")
+        lines.append(f"N{n + 2} G65 P9102 A101 B01  ;")
+        n += 3
+        for k in range(segments):
+            code = "G3" if k % 4 == 3 else "G1"
+            lines.append(f"N{n} {code}X{x0 + k * 0.5:.2f}Y{y0 + (k % 7) * 0.75:.2f}  ;")
+            n += 1
+        lines.append(f"N{n} M98 P9104  ;")
+        lines.append(f"N{n + 1} M98 P9103  ;")
+        n += 2
+    lines.extend(["(FOOTER)", f"N{n} M98 P9110  ;", f"N{n + 1} M30  ;", "%"])
+    return lines
+
+
+def _timed(func, lines, output_dir) -> tuple[float, list[str]]:
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        result = func(lines, output_dir=output_dir)
+        elapsed = time.perf_counter() - t0
+    return elapsed, result
+
+
+def _read_outputs(output_dir: Path, names: list[str]) -> list[tuple[str, bytes]]:
+    return [(name, (output_dir / name).read_bytes()) for name in names]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=500_000)
+    parser.add_argument("--pieces", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    lines = build_synthetic_nest(args.lines, args.pieces)
+    print(f"Nido sintético: {len(lines)} líneas, {args.pieces} IDs distintos")
+
+    best = {"original": float("inf"), "actual": float("inf")}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        outputs = {}
+        for run in range(args.repeat):
+            for label, func in (("original", legacy_parse_gcode_parts), ("actual", parse_gcode_parts)):
+                out_dir = tmp / f"{label}_{run}"
+                elapsed, names = _timed(func, lines, out_dir)
+                best[label] = min(best[label], elapsed)
+                if run == 0:
+                    outputs[label] = _read_outputs(out_dir, names)
+
+        identical = outputs["original"] == outputs["actual"]
+
+    print(f"  original: {best['original']:.3f} s")
+    print(f"  actual:   {best['actual']:.3f} s")
+    print(f"  mejora:   x{best['original'] / best['actual']:.1f}")
+    print(f"  salida idéntica ({len(outputs['actual'])} CNC): {'SI' if identical else 'NO'}")
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""Comprueba que dos versiones de load_slot generan los mismos refPartJson/partJson.
+
+Guarda el resultado de load_slot_payload de cada programa con una versión
+del código y lo compara después con otra. Sirve para validar cambios que no
+deben alterar la salida (almacenamiento de segmentos, kernels, JSON):
+
+    # referencia con la versión anterior (p. ej. un git worktree en /tmp/base)
+    python benchmarks/check_load_slot_outputs.py save /tmp/ref_out --tree /tmp/base/parser_lpp_BATCH_2 INPUT/*.lpp INPUT/*.cnc
+
+    # comparación con el árbol actual
+    python benchmarks/check_load_slot_outputs.py compare /tmp/ref_out INPUT/*.lpp INPUT/*.cnc
+
+Con árboles anteriores a load_slot_payload se llama a load_slot en una
+carpeta temporal y se leen los JSON que escribe. La comparación es exacta,
+sin tolerancias: los floats deben coincidir bit a bit. Informa de la primera
+diferencia de cada programa y sale con 1 si hay alguna.
+
+Uso (desde parser_lpp_BATCH_2):
+
+    python benchmarks/check_load_slot_outputs.py {save,compare} DIR [--tree RAIZ] PROGRAMA [PROGRAMA ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+
+def _first_difference(expected: Any, actual: Any, path: str = "$") -> str | None:
+    """Ruta y valores de la primera diferencia entre dos objetos JSON, o None si son iguales."""
+    if type(expected) is not type(actual):
+        return f"{path}: {type(expected).__name__} != {type(actual).__name__}"
+    if isinstance(expected, dict):
+        if expected.keys() != actual.keys():
+            return f"{path}: claves {sorted(expected.keys() ^ actual.keys())}"
+        for key in expected:
+            diff = _first_difference(expected[key], actual[key], f"{path}.{key}")
+            if diff:
+                return diff
+        return None
+    if isinstance(expected, list):
+        if len(expected) != len(actual):
+            return f"{path}: longitud {len(expected)} != {len(actual)}"
+        for index, (a, b) in enumerate(zip(expected, actual)):
+            diff = _first_difference(a, b, f"{path}[{index}]")
+            if diff:
+                return diff
+        return None
+    if expected != actual:
+        return f"{path}: {expected!r} != {actual!r}"
+    return None
+
+
+def _payload(load_slot_module, program: Path) -> dict[str, Any]:
+    with contextlib.redirect_stdout(io.StringIO()):
+        if hasattr(load_slot_module, "load_slot_payload"):
+            ref_part_json, part_json = load_slot_module.load_slot_payload(str(program))
+            # Ida y vuelta por JSON: se compara lo que se escribiría en disco.
+            return json.loads(json.dumps({"refPartJson": ref_part_json, "partJson": part_json}))
+
+        # Versiones antiguas: load_slot escribe los JSON en la carpeta actual.
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                load_slot_module.load_slot(str(program.resolve()))
+            finally:
+                os.chdir(cwd)
+            ref_files = sorted(Path(tmp).glob("refPartJson_*.json"))
+            part_files = sorted(Path(tmp).glob("partJson_*.json"))
+            if not ref_files or not part_files:
+                raise RuntimeError("load_slot no escribió refPartJson/partJson")
+            return {
+                "refPartJson": json.loads(ref_files[0].read_text(encoding="utf-8")),
+                "partJson": json.loads(part_files[0].read_text(encoding="utf-8")),
+            }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=("save", "compare"))
+    parser.add_argument("directory", help="carpeta con la salida de referencia")
+    parser.add_argument("programs", nargs="+", help="programas .lpp/.cnc")
+    parser.add_argument("--tree", default=str(Path(__file__).resolve().parent.parent),
+                        help="raíz de parser_lpp_BATCH_2 de la que se importa load_slot (por defecto, este árbol)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(Path(args.tree).resolve()))
+    from module_ai2 import load_slot as load_slot_module  # noqa: E402
+
+    directory = Path(args.directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    failures = 0
+    for program in (Path(name).resolve() for name in args.programs):
+        reference_path = directory / f"{program.name}.json"
+        t0 = time.perf_counter()
+        try:
+            payload = _payload(load_slot_module, program)
+        except Exception as exc:
+            payload = {"error": f"{type(exc).__name__}: {exc}"}
+        elapsed = time.perf_counter() - t0
+
+        if args.mode == "save":
+            reference_path.write_text(json.dumps(payload), encoding="utf-8")
+            print(f"  {program.name}: guardado ({elapsed:.2f} s)")
+            continue
+
+        if not reference_path.exists():
+            print(f"  {program.name}: sin referencia en {directory}")
+            failures += 1
+            continue
+        diff = _first_difference(json.loads(reference_path.read_text(encoding="utf-8")), payload)
+        if diff:
+            failures += 1
+        print(f"  {program.name}: {'DIFERENTE ' + diff if diff else 'idéntico'} ({elapsed:.2f} s)")
+
+    if args.mode == "compare":
+        print(f"{len(args.programs) - failures} de {len(args.programs)} programas idénticos")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,30 +18,44 @@ Notas importantes:
 
 from __future__ import annotations
 
+import argparse
 import ast
+import cProfile
+import glob
 import json
 import math
 import copy
 import os
+import queue
 import re
 import shutil
 import subprocess
 import sys
-from contextlib import contextmanager
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from shutil import rmtree
-from typing import Any
+from typing import Any, Iterable
 
+from modules.batch_manifest import BatchManifest, file_sha256, settings_signature
 from modules.parse_head import parse_gcode_head
-from modules.parse_parts import parse_gcode_parts
-from modules.draw_part import contour_to_points, contours_bbox, draw_contours
+from modules.parse_parts import ParsedPiece, iter_gcode_parts
+from modules.draw_part import contour_to_points, render_piece_contours
 from modules.scara_router import route_piece_outputs
-from modules.draw_solution_overlay import draw_solution_overlay_png
+from modules.draw_solution_overlay import build_contact_sheet, contact_sheet_tile, publish_png, render_solution_overlay
 from modules.generate_tool_report import generate_tool_report_files
-from modules.cnc_to_dxf import parse_cnc_contours, simplify_contour_geometry
-from modules.cnc_to_dxf import cnc_to_single_dxf
-from modules.logthis import LogThis
-from module_ai2.load_slot import load_slot as load_slot_script
+from modules.cnc_to_dxf import parse_cnc_contours_from_lines, simplify_contour_geometry
+from modules.cnc_to_dxf import write_contours_dxf
+from modules.geometry_cache import PieceGeometry, geometry_cache_stats, get_piece_geometry, invalidate_piece_geometry, seed_piece_geometry
+from modules.logthis import LogThis, configure_log
+from modules.solution_cache import SolutionCache, compute_solution_cache_key
+from modules.stage_timer import reset_stage_timings, stage_timer, write_stage_timings
+from modules.tool_history import ToolHistory, history_key
+from modules.watch_folder import FolderWatcher, JobStatusBoard
+from module_ai2.load_slot import VERSION as LOAD_SLOT_VERSION, load_slot_payload, write_json_file
+from module_ai2.reference_cache import ReferenceCache
+from module_ai2.compute_ref_native import NATIVE_VERSION, compute_ref as compute_ref_native
 
 
 # -----------------------------------------------------------------------------
@@ -54,8 +68,17 @@ DEBUG_LEVEL = 1  # 0 = sin logs, 1 = info básica, 2 = debug detallado
 LOAD_SLOT_CACHE_DIR = Path("OUT_ref_cache")
 INTERNAL_TMP_ROOT = Path("_internal")
 PARSED_PARTS_TMP_DIR = INTERNAL_TMP_ROOT / "parsed_parts"
+TIMINGS_PATH = Path("OUT_timings.json")
+PROFILE_PATH = Path("OUT_profile.pstats")
 _LOAD_SLOT_SOURCE_CACHE: dict[str, dict[str, Any] | None] = {}
 _RUNTIME_CONFIG_CACHE: dict[str, Any] | None = None
+_LOAD_SLOT_REFERENCE_CACHE: ReferenceCache | None = None
+# Tiempos por fase de cada pieza de la ejecución, por ruta absoluta del CNC.
+_PIECE_TIMINGS: dict[str, dict[str, float]] = {}
+# Miniaturas de los overlays para la hoja de contactos, por carpeta de combinación.
+_CONTACT_SHEET_TILES: dict[str, Any] = {}
+# Posiciones de cada herramienta procesada, por (ruta, mtime_ns, tamaño).
+_TOOL_POSITIONS_CACHE: dict[tuple[str, int, int], list[dict[str, Any]]] = {}
 
 CONFIG_PATH = Path(__file__).with_name("config.json")
 DEFAULT_CONFIG: dict[str, Any] = {
@@ -73,8 +96,60 @@ DEFAULT_CONFIG: dict[str, Any] = {
         ]
     },
     "compute_ref": {
+        "engine": "exe",
+        "native_safety_factor": 1.0,
         "max_compute_time": 3,
+        "timeout_margin_s": 10,
         "enhance_opti": 1,
+        "max_workers": 1,
+        "solution_cache": {
+            "enabled": False,
+            "dir": "OUT_solution_cache",
+            "max_entries": 5000,
+            "max_size_mb": 1024,
+        },
+    },
+    "tool_selection": {
+        "policy": "exhaustive",
+        "best_of_n": 2,
+        "piece_time_budget_s": 0,
+        "order_by_history": True,
+        "history_file": "OUT_tool_history.json",
+        "history_summaries": [],
+        "bbox_class_limits_mm": [150, 400, 1000],
+    },
+    "overlays": {
+        "combo_png": True,
+        "global_png": True,
+        "publish_mode": "hardlink",
+        "contact_sheet": False,
+        "contact_sheet_columns": 4,
+    },
+    "load_slot": {
+        "sampling": "fixed",
+        "chord_tolerance_mm": 0.05,
+        "max_contour_points": 2000,
+        "workers": 1,
+        "pretty_json": False,
+        "reference_cache": {
+            "enabled": True,
+            "dir": "OUT_ref_geometry_cache",
+            "max_entries": 2000,
+            "max_size_mb": 256,
+        },
+    },
+    "batch": {
+        "incremental": False,
+        "manifest": "OUT_batch_manifest.json",
+    },
+    "logging": {
+        "json_lines": False,
+    },
+    "watch": {
+        "poll_interval_s": 2.0,
+        "settle_s": 3.0,
+        "max_queue": 64,
+        "status_dir": "OUT_jobs",
     },
     "robots": {
         "anthro": {
@@ -141,18 +216,6 @@ DEFAULT_CONFIG: dict[str, Any] = {
 
 
 
-@contextmanager
-def pushd(directory: str | Path):
-    """Cambia temporalmente de directorio y restaura el anterior al salir."""
-    previous = Path.cwd()
-    os.makedirs(directory, exist_ok=True)
-    os.chdir(directory)
-    try:
-        yield
-    finally:
-        os.chdir(previous)
-
-
 def ensure_clean_dir(directory: str) -> None:
     """Borra y recrea un directorio para arrancar desde un estado limpio."""
     if os.path.exists(directory):
@@ -334,21 +397,29 @@ def polygon_signed_area(points: list[tuple[float, float]]) -> float:
     return 0.5 * area
 
 
+def piece_contours_from_lines(lines: list[str]):
+    """Parsea y simplifica los contornos de una pieza en memoria, descartando los vacíos."""
+    contours = parse_cnc_contours_from_lines(lines)
+    contours = [simplify_contour_geometry(c) for c in contours]
+    return [c for c in contours if c.entities]
+
+
 def compute_piece_metrics(piece_path: str | Path, density_g_cm3: float | None, thickness_mm: float | None) -> dict[str, object]:
     """Reconstruye la pieza desde CNC y calcula métricas geométricas básicas."""
-    contours = parse_cnc_contours(piece_path)
-    contours = [simplify_contour_geometry(c) for c in contours]
-    contours = [c for c in contours if c.entities]
-    if not contours:
+    return compute_geometry_metrics(get_piece_geometry(piece_path), density_g_cm3, thickness_mm)
+
+
+def compute_geometry_metrics(geometry: PieceGeometry, density_g_cm3: float | None, thickness_mm: float | None) -> dict[str, object]:
+    """Métricas geométricas básicas a partir de la geometría ya simplificada de la pieza."""
+    if not geometry.contours:
         return {"bbox_x": 0.0, "bbox_y": 0.0, "area_mm2": 0.0, "weight_kg": None}
 
-    min_x, min_y, max_x, max_y = contours_bbox(contours, arc_segments=72)
+    min_x, min_y, max_x, max_y = geometry.bbox(72)
     bbox_x = max_x - min_x
     bbox_y = max_y - min_y
 
     signed_total = 0.0
-    for contour in contours:
-        pts = contour_to_points(contour, arc_segments=72, close_if_open=True)
+    for pts in geometry.points(72, close_if_open=True):
         signed_total += polygon_signed_area(pts)
 
     area_mm2 = abs(signed_total)
@@ -391,19 +462,16 @@ def format_meta_lines(meta: dict[str, object]) -> list[str]:
     return lines
 
 
-def rewrite_piece_header(piece_path: str | Path, source_file: str, head_info: dict[str, object]) -> dict[str, object]:
-    """Reescribe la cabecera de una pieza con metadata calculada y heredada."""
-    piece_path = Path(piece_path)
-    with open(piece_path, "r", encoding="utf-8", errors="ignore") as f:
-        lines = [line.rstrip("\n") for line in f]
-
-    if len(lines) < 2:
-        return {}
-
-    piece_id = lines[0]
-    piece_name = lines[1]
-    body = [line for line in lines[2:] if not META_PATTERN.match(line.strip())]
+def build_piece_meta(
+    source_file: str,
+    head_info: dict[str, object],
+    metrics_for: Any,
+) -> tuple[dict[str, object], dict[str, object]]:
+    """Calcula la metadata META de una pieza y el resumen que usa el router.
 
+    metrics_for(density_g_cm3, thickness_mm) devuelve las métricas geométricas;
+    así la misma lógica sirve para piezas en disco y en memoria.
+    """
     material = str(head_info.get("MATERIAL", "")).strip()
     thickness_mm = _safe_float(head_info.get("THICKNESS"))
     format_xy = head_info.get("FORMAT", (0, 0))
@@ -411,7 +479,7 @@ def rewrite_piece_header(piece_path: str | Path, source_file: str, head_info: di
         format_xy = (0, 0)
 
     profile = material_profile(material)
-    metrics = compute_piece_metrics(piece_path, profile["density_g_cm3"], thickness_mm)
+    metrics = metrics_for(profile["density_g_cm3"], thickness_mm)
 
     meta = {
         "SOURCE_FILE": source_file,
@@ -427,14 +495,7 @@ def rewrite_piece_header(piece_path: str | Path, source_file: str, head_info: di
         "FORMAT_Y": format_xy[1],
     }
 
-    new_lines = [piece_id, piece_name]
-    new_lines.extend(format_meta_lines(meta))
-    new_lines.extend(body)
-
-    with open(piece_path, "w", encoding="utf-8", newline="\n") as f:
-        f.write("\n".join(new_lines) + "\n")
-
-    return {
+    piece_meta = {
         "material": material,
         "material_family": profile["family"],
         "ferromagnetic": profile["ferromagnetic"],
@@ -445,34 +506,99 @@ def rewrite_piece_header(piece_path: str | Path, source_file: str, head_info: di
         "area_mm2": metrics["area_mm2"],
         "weight_kg": metrics["weight_kg"],
     }
+    return meta, piece_meta
+
+
+def rewrite_piece_header(piece_path: str | Path, source_file: str, head_info: dict[str, object]) -> dict[str, object]:
+    """Reescribe la cabecera de una pieza con metadata calculada y heredada."""
+    piece_path = Path(piece_path)
+    with open(piece_path, "r", encoding="utf-8", errors="ignore") as f:
+        lines = [line.rstrip("\n") for line in f]
+
+    if len(lines) < 2:
+        return {}
+
+    piece_id = lines[0]
+    piece_name = lines[1]
+    body = [line for line in lines[2:] if not META_PATTERN.match(line.strip())]
+
+    meta, piece_meta = build_piece_meta(
+        source_file,
+        head_info,
+        lambda density, thickness: compute_piece_metrics(piece_path, density, thickness),
+    )
+
+    new_lines = [piece_id, piece_name]
+    new_lines.extend(format_meta_lines(meta))
+    new_lines.extend(body)
+
+    with open(piece_path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(new_lines) + "\n")
+    invalidate_piece_geometry(piece_path)
+
+    return piece_meta
+
+
+def _piece_timings(piece_path: str | Path) -> dict[str, float]:
+    """Tiempos por fase de una pieza (se guardan en el metadata_parser.json de sus combinaciones)."""
+    return _PIECE_TIMINGS.setdefault(os.path.normcase(os.path.abspath(piece_path)), {})
 
 
 def process_generated_pieces(
-    piece_files: list[str],
+    pieces: Iterable[ParsedPiece],
     source_filename: str,
     head_info: dict[str, object],
-    staging_dir: str | Path = PARSED_PARTS_TMP_DIR,
-) -> None:
-    """Procesa cada pieza nueva desde una carpeta temporal interna: cabecera, routing por robot, PNG y DXF."""
+    produced: list[dict[str, Any]] | None = None,
+) -> int:
+    """Procesa cada pieza en memoria según sale del separador: cabecera, routing por robot, PNG y DXF.
+
+    Los contornos se parsean una sola vez y se reutilizan para métricas, PNG y
+    DXF; el CNC final se escribe una única vez en la carpeta de su robot.
+    Si se pasa produced, se añade a esa lista cada pieza con su robot y sus
+    salidas (lo que guarda el manifiesto del modo incremental).
+    Devuelve el número de piezas procesadas.
+    """
     robot_settings = get_robot_runtime_settings()
-    staging_dir = Path(staging_dir)
     anthro_root = robot_settings["anthro_root"]
     scara_root = robot_settings["scara_root"]
     scara_enabled = robot_settings["scara_enabled"]
     scara_filters = robot_settings["scara_filters"]
 
-    for pf in piece_files:
-        original_piece_path = str(staging_dir / pf)
-        piece_meta = rewrite_piece_header(original_piece_path, source_filename, head_info)
-        route = route_piece_outputs(
-            original_piece_path,
-            piece_meta,
-            scara_filters,
-            anthro_root=anthro_root,
-            scara_root=scara_root,
-            scara_enabled=scara_enabled,
-            move_cnc=True,
-        )
+    processed = 0
+    parts = iter(pieces)
+    while True:
+        # El separador es un generador: el tiempo de split de cada pieza es lo
+        # que tarda en entregarla.
+        timings: dict[str, float] = {}
+        with stage_timer("split", timings):
+            piece = next(parts, None)
+        if piece is None:
+            break
+        processed += 1
+        pf = piece.filename
+        with stage_timer("metrics", timings):
+            body = [line for line in piece.lines if not META_PATTERN.match(line.strip())]
+            geometry = PieceGeometry(piece_contours_from_lines(piece.cnc_lines()))
+            piece.contours = geometry.contours
+
+            meta, piece_meta = build_piece_meta(
+                source_filename,
+                head_info,
+                lambda density, thickness: compute_geometry_metrics(geometry, density, thickness),
+            )
+            piece.metrics = piece_meta
+            meta_lines = format_meta_lines(meta)
+
+        with stage_timer("route", timings):
+            route = route_piece_outputs(
+                pf,
+                piece_meta,
+                scara_filters,
+                anthro_root=anthro_root,
+                scara_root=scara_root,
+                scara_enabled=scara_enabled,
+                cnc_lines=[piece.piece_id, piece.piece_name, *meta_lines, *body],
+            )
 
         if route["robot"] == "SCARA":
             mss = (f"    SCARA OK -> {pf}")
@@ -489,8 +615,41 @@ def process_generated_pieces(
         piece_path = route["piece_path"]
         png_path = route["png_path"]
         dxf_path = route["dxf_path"]
-
-        draw_ok = draw_contours([piece_path], output_filename=png_path, out_WH=(800, 800), N=72, auto_close_open=True)
+        if produced is not None:
+            robot_root = scara_root if route["robot"] == "SCARA" else anthro_root
+            produced.append(
+                {
+                    "robot": route["robot"],
+                    "piece": Path(piece_path).stem,
+                    "solutions_dir": Path(robot_root, "OUT_solutions").as_posix(),
+                    "files": [Path(path).as_posix() for path in (piece_path, png_path, dxf_path)],
+                }
+            )
+        # Las fases posteriores (ref JSON, overlays) reutilizan esta geometría.
+        seed_piece_geometry(piece_path, geometry)
+
+        # El PNG muestra la metadata tal y como queda escrita en la cabecera.
+        header_meta = {}
+        for line in meta_lines:
+            match = META_PATTERN.match(line)
+            if match:
+                header_meta[match.group(1).upper()] = match.group(2).strip()
+
+        draw_ok = False
+        if piece.contours:
+            with stage_timer("png", timings):
+                draw_ok = render_piece_contours(
+                    geometry,
+                    png_path,
+                    piece.piece_id.strip(),
+                    piece.piece_name.strip(),
+                    header_meta,
+                    out_WH=(800, 800),
+                    N=72,
+                    auto_close_open=True,
+                )
+        else:
+            print(f"No se detectaron contornos en '{piece_path}'")
         if draw_ok:
             mss = (f"    PNG creado: {os.path.basename(png_path)}")
             if DEBUG_LEVEL >= 2:
@@ -503,28 +662,22 @@ def process_generated_pieces(
             print(mss)
 
         try:
-            cnc_to_single_dxf(piece_path, dxf_path, geometry_only=True, separate_layers=False)
+            if not piece.contours:
+                raise ValueError(f"No se han detectado contornos en: {piece_path}")
+            with stage_timer("dxf", timings):
+                write_contours_dxf(piece.contours, dxf_path, separate_layers=False)
             mss = (f"    DXF creado: {os.path.basename(dxf_path)}")
             if DEBUG_LEVEL >= 2:
                 LogThis("ROUTING", "OUT", mss, "")
             print(mss)
-        except TypeError:
-            try:
-                cnc_to_single_dxf(piece_path, dxf_path, geometry_only=True)
-                mss = (f"    DXF creado: {os.path.basename(dxf_path)}")
-                if DEBUG_LEVEL >= 2:
-                    LogThis("ROUTING", "OUT", mss, "")
-                print(mss)
-            except Exception as e:
-                mss = (f"    Error al crear DXF de '{pf}': {e}")
-                if DEBUG_LEVEL >= 1:
-                    LogThis("ROUTING", "ERR", mss, "")
-                print(mss)
         except Exception as e:
             mss = (f"    Error al crear DXF de '{pf}': {e}")
             if DEBUG_LEVEL >= 1:
                 LogThis("ROUTING", "ERR", mss, "")
             print(mss)
+        _piece_timings(piece_path).update(timings)
+
+    return processed
 
 
 def _normalize_tool_reference(tool_name: str | None) -> str:
@@ -606,6 +759,435 @@ def _select_tool_names_for_robot(
     return ordered, resolved_default
 
 
+TOOL_SELECTION_POLICIES = ("exhaustive", "first_valid", "best_of_n")
+
+
+def _tool_selection_settings() -> dict[str, Any]:
+    """Lee y normaliza el bloque tool_selection de config.json."""
+    runtime_config = load_runtime_config()
+    raw = runtime_config.get("tool_selection", {}) if isinstance(runtime_config, dict) else {}
+    if not isinstance(raw, dict):
+        raw = {}
+
+    policy = str(raw.get("policy") or "exhaustive").strip().lower().replace("-", "_")
+    if policy not in TOOL_SELECTION_POLICIES:
+        if DEBUG_LEVEL >= 1:
+            LogThis("CONFIG", "ERR", f"tool_selection.policy no válido: {raw.get('policy')!r}. Se usa 'exhaustive'.", "")
+        policy = "exhaustive"
+
+    try:
+        best_of_n = max(1, int(raw.get("best_of_n", 2)))
+    except (TypeError, ValueError):
+        best_of_n = 2
+    budget = _safe_float(raw.get("piece_time_budget_s"))
+
+    return {
+        "policy": policy,
+        "best_of_n": best_of_n,
+        "piece_time_budget_s": budget if budget and budget > 0 else None,
+        "order_by_history": bool(raw.get("order_by_history", True)),
+        "history_file": raw.get("history_file") or None,
+        "history_summaries": raw.get("history_summaries") if isinstance(raw.get("history_summaries"), list) else [],
+    }
+
+
+OVERLAY_PUBLISH_MODES = ("hardlink", "copy")
+CONTACT_SHEET_SUFFIX = "__contact_sheet.png"
+
+
+def _overlay_settings() -> dict[str, Any]:
+    """Lee y normaliza el bloque overlays de config.json."""
+    runtime_config = load_runtime_config()
+    raw = runtime_config.get("overlays", {}) if isinstance(runtime_config, dict) else {}
+    if not isinstance(raw, dict):
+        raw = {}
+
+    publish_mode = str(raw.get("publish_mode") or "hardlink").strip().lower()
+    if publish_mode not in OVERLAY_PUBLISH_MODES:
+        if DEBUG_LEVEL >= 1:
+            LogThis("CONFIG", "ERR", f"overlays.publish_mode no válido: {raw.get('publish_mode')!r}. Se usa 'hardlink'.", "")
+        publish_mode = "hardlink"
+
+    try:
+        columns = max(1, int(raw.get("contact_sheet_columns", 4)))
+    except (TypeError, ValueError):
+        if DEBUG_LEVEL >= 1:
+            LogThis("CONFIG", "ERR", f"overlays.contact_sheet_columns no válido: {raw.get('contact_sheet_columns')!r}. Se usa 4.", "")
+        columns = 4
+
+    return {
+        "combo_png": bool(raw.get("combo_png", True)),
+        "global_png": bool(raw.get("global_png", True)),
+        "publish_mode": publish_mode,
+        "contact_sheet": bool(raw.get("contact_sheet", False)),
+        "contact_sheet_columns": columns,
+    }
+
+
+LOAD_SLOT_SAMPLING_MODES = ("fixed", "adaptive")
+
+
+def _load_slot_settings() -> dict[str, Any]:
+    """Lee y normaliza el bloque load_slot de config.json como argumentos de load_slot."""
+    runtime_config = load_runtime_config()
+    raw = runtime_config.get("load_slot", {}) if isinstance(runtime_config, dict) else {}
+    if not isinstance(raw, dict):
+        raw = {}
+
+    sampling = str(raw.get("sampling") or "fixed").strip().lower()
+    if sampling not in LOAD_SLOT_SAMPLING_MODES:
+        if DEBUG_LEVEL >= 1:
+            LogThis("CONFIG", "ERR", f"load_slot.sampling no válido: {raw.get('sampling')!r}. Se usa 'fixed'.", "")
+        sampling = "fixed"
+
+    tolerance = _safe_float(raw.get("chord_tolerance_mm"))
+    try:
+        max_points = max(3, int(raw.get("max_contour_points", 2000)))
+    except (TypeError, ValueError):
+        max_points = 2000
+
+    try:
+        workers = int(raw["workers"]) if raw.get("workers") is not None else 0
+    except (TypeError, ValueError):
+        if DEBUG_LEVEL >= 1:
+            LogThis("CONFIG", "ERR", f"load_slot.workers no válido: {raw.get('workers')!r}. Se usa 1.", "")
+        workers = 1
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+
+    return {
+        "chord_tolerance": (tolerance if tolerance and tolerance > 0 else 0.05) if sampling == "adaptive" else None,
+        "max_contour_points": max_points,
+        "reference_cache": _load_slot_reference_cache(raw.get("reference_cache")),
+        "workers": workers,
+    }
+
+
+def _batch_settings() -> dict[str, Any]:
+    """Lee el bloque batch de config.json (modo incremental y ruta del manifiesto)."""
+    runtime_config = load_runtime_config()
+    raw = runtime_config.get("batch", {}) if isinstance(runtime_config, dict) else {}
+    if not isinstance(raw, dict):
+        raw = {}
+    return {
+        "incremental": bool(raw.get("incremental", False)),
+        "manifest": Path(str(raw.get("manifest") or "OUT_batch_manifest.json")),
+    }
+
+
+def _configure_logging() -> None:
+    """Aplica el bloque logging de config.json (formato del fichero de LOG)."""
+    runtime_config = load_runtime_config()
+    raw = runtime_config.get("logging", {}) if isinstance(runtime_config, dict) else {}
+    configure_log(json_lines=bool(raw.get("json_lines", False)) if isinstance(raw, dict) else False)
+
+
+def _watch_settings() -> dict[str, Any]:
+    """Lee y normaliza el bloque watch de config.json (modo servicio, main.py --watch)."""
+    runtime_config = load_runtime_config()
+    raw = runtime_config.get("watch", {}) if isinstance(runtime_config, dict) else {}
+    if not isinstance(raw, dict):
+        raw = {}
+    poll_interval = _safe_float(raw.get("poll_interval_s"))
+    settle = _safe_float(raw.get("settle_s"))
+    try:
+        max_queue = max(1, int(raw.get("max_queue", 64)))
+    except (TypeError, ValueError):
+        if DEBUG_LEVEL >= 1:
+            LogThis("CONFIG", "ERR", f"watch.max_queue no válido: {raw.get('max_queue')!r}. Se usa 64.", "")
+        max_queue = 64
+    return {
+        "poll_interval_s": poll_interval if poll_interval and poll_interval > 0 else 2.0,
+        "settle_s": settle if settle is not None and settle >= 0 else 3.0,
+        "max_queue": max_queue,
+        "status_dir": Path(str(raw.get("status_dir") or "OUT_jobs")),
+    }
+
+
+def _batch_signature(tools_dir: str = "TOOLS") -> dict[str, Any]:
+    """Firma de todo lo que afecta a todas las piezas: config.json, herramientas, solver y load_slot."""
+    runtime_config = load_runtime_config()
+    compute_ref_config = runtime_config.get("compute_ref", {}) if isinstance(runtime_config, dict) else {}
+    engine = str(compute_ref_config.get("engine") or "exe").strip().lower()
+    return settings_signature(
+        CONFIG_PATH,
+        [os.path.join(tools_dir, name) for name in _tool_candidates(tools_dir)],
+        {"solver": _compute_ref_solver_signature(engine), "load_slot_version": LOAD_SLOT_VERSION},
+    )
+
+
+def _ref_json_indent() -> int | None:
+    """Sangría de los ref_<pieza>.json: 2 con load_slot.pretty_json, compactos (None) por defecto."""
+    runtime_config = load_runtime_config()
+    raw = runtime_config.get("load_slot", {}) if isinstance(runtime_config, dict) else {}
+    return 2 if isinstance(raw, dict) and raw.get("pretty_json", False) else None
+
+
+def _load_slot_reference_cache(cache_config: Any) -> ReferenceCache | None:
+    """Devuelve la caché de referencias de load_slot.reference_cache (una por proceso), o None si está desactivada."""
+    global _LOAD_SLOT_REFERENCE_CACHE
+    if not isinstance(cache_config, dict) or not cache_config.get("enabled", False):
+        return None
+    if _LOAD_SLOT_REFERENCE_CACHE is None:
+        try:
+            _LOAD_SLOT_REFERENCE_CACHE = ReferenceCache(
+                Path(cache_config.get("dir") or "OUT_ref_geometry_cache").resolve(),
+                LOAD_SLOT_VERSION,
+                max_entries=cache_config.get("max_entries"),
+                max_size_mb=cache_config.get("max_size_mb"),
+            )
+        except Exception as exc:
+            if DEBUG_LEVEL >= 1:
+                LogThis("CONFIG", "ERR", f"load_slot.reference_cache no válido: {exc}. Se desactiva la caché.", "")
+            return None
+    return _LOAD_SLOT_REFERENCE_CACHE
+
+
+def _bbox_class(bbox_x: float | None, bbox_y: float | None) -> str:
+    """Clasifica la pieza por su lado mayor según tool_selection.bbox_class_limits_mm."""
+    if bbox_x is None or bbox_y is None:
+        return "UNKNOWN"
+    runtime_config = load_runtime_config()
+    raw = runtime_config.get("tool_selection", {}) if isinstance(runtime_config, dict) else {}
+    limits = raw.get("bbox_class_limits_mm") if isinstance(raw, dict) else None
+    if not isinstance(limits, list) or not limits:
+        limits = DEFAULT_CONFIG["tool_selection"]["bbox_class_limits_mm"]
+
+    size = max(abs(bbox_x), abs(bbox_y))
+    labels = ["S", "M", "L", "XL", "XXL"]
+    for idx, limit in enumerate(sorted(float(v) for v in limits)):
+        if size <= limit:
+            return labels[idx] if idx < len(labels) else f"C{idx}"
+    idx = len(limits)
+    return labels[idx] if idx < len(labels) else f"C{idx}"
+
+
+def _piece_family_and_bbox_class(cnc_path: str | Path) -> tuple[str, str]:
+    """Familia de material y clase de tamaño de una pieza a partir de su cabecera META."""
+    _, _, meta = _read_piece_header(cnc_path)
+    family = str(material_profile(meta.get("MATERIAL", "")).get("family") or "UNKNOWN")
+    return family, _bbox_class(_safe_float(meta.get("BBOX_X")), _safe_float(meta.get("BBOX_Y")))
+
+
+def _history_key_for_row(row: dict[str, Any]) -> str:
+    """Clave de histórico de una fila de summary.json, también para filas antiguas sin clasificar."""
+    family = row.get("material_family") or material_profile(str(row.get("piece_material") or "")).get("family")
+    bbox_class = row.get("bbox_class")
+    if not bbox_class:
+        points = _normalize_bbox_points(row.get("reference_bbox_local"))
+        if points:
+            xs = [p[0] for p in points]
+            ys = [p[1] for p in points]
+            bbox_class = _bbox_class(max(xs) - min(xs), max(ys) - min(ys))
+    return history_key(family, bbox_class)
+
+
+def _build_tool_history(settings: dict[str, Any]) -> ToolHistory | None:
+    """Carga el histórico de herramientas e importa los summary.json archivados configurados."""
+    if settings["policy"] == "exhaustive" and not settings["history_file"]:
+        return None
+    history = ToolHistory(settings["history_file"])
+    for pattern in settings["history_summaries"]:
+        for summary_path in sorted(glob.glob(str(pattern))):
+            added = history.import_summary(summary_path, _history_key_for_row)
+            if added and DEBUG_LEVEL >= 2:
+                LogThis("TOOL_SELECTION", "INF", f"Histórico: {added} filas importadas de '{summary_path}'", "")
+    return history
+
+
+def _evaluate_piece_tools_with_policy(
+    unit: list[tuple[int, dict[str, Any]]],
+    *,
+    policy: str,
+    best_of_n: int,
+    piece_time_budget_s: float | None,
+) -> tuple[list[tuple[int, dict[str, Any]]], list[dict[str, Any]]]:
+    """Evalúa en orden las combinaciones de una pieza hasta cumplir la política de selección.
+
+    En exhaustive se evalúan todas. En first_valid y best_of_n se deja de lanzar
+    el solver al tener 1 o N soluciones válidas, o al agotar el presupuesto de
+    tiempo de la pieza. Devuelve (resultados, combinaciones omitidas).
+    """
+    results: list[tuple[int, dict[str, Any]]] = []
+    skipped: list[dict[str, Any]] = []
+    required_valid = 1 if policy == "first_valid" else best_of_n
+    valid_count = 0
+    started = time.monotonic()
+
+    for position, (result_index, combo) in enumerate(unit):
+        if policy != "exhaustive" and position > 0:
+            budget_spent = piece_time_budget_s is not None and time.monotonic() - started >= piece_time_budget_s
+            if valid_count >= required_valid or budget_spent:
+                skipped.extend(pending for _, pending in unit[position:])
+                break
+        metadata = _evaluate_piece_tool_combo(**combo)
+        results.append((result_index, metadata))
+        if metadata.get("solution_valid"):
+            valid_count += 1
+
+    return results, skipped
+
+
+def _evaluate_piece_tool_combo(
+    *,
+    robot_label: str,
+    cnc_path: str,
+    tool_name: str,
+    processed_tool_path: str,
+    ref_json_path: str,
+    material_json_path: str,
+    piece_material_payload: dict[str, Any],
+    combo_dir: str,
+    png_dir: str,
+    max_compute_time: float,
+    enhance_opti: int,
+    engine: str = "exe",
+    solution_cache: SolutionCache | None = None,
+    material_family: str | None = None,
+    bbox_class: str | None = None,
+    overlays: dict[str, Any] | None = None,
+    timings: dict[str, float] | None = None,
+) -> dict[str, Any]:
+    """Ejecuta el solver para una combinación pieza + herramienta y deja su metadata_parser.json.
+
+    Es la unidad de trabajo del pool de workers: solo escribe dentro de su
+    propio combo_dir y en el PNG global de la combinación. timings trae los
+    tiempos de preparación de la combinación (ref JSON) y se completa con los
+    de esta función.
+    """
+    piece_stem = Path(cnc_path).stem
+    tool_stem = Path(tool_name).stem
+    timings = dict(timings or {})
+
+    print(f"  [{robot_label}] CNC: {cnc_path}  |  Herramienta: {tool_name}")
+    cache_key = None
+    run_result = None
+    if solution_cache is not None:
+        try:
+            cache_key = compute_solution_cache_key(
+                ref_json_path,
+                processed_tool_path,
+                material_json_path,
+                max_compute_time,
+                enhance_opti,
+                solver_signature=_compute_ref_solver_signature(engine),
+            )
+            with stage_timer("solution_cache", timings):
+                run_result = solution_cache.lookup(cache_key, combo_dir, ref_json_path)
+        except Exception as exc:
+            cache_key = None
+            if DEBUG_LEVEL >= 1:
+                LogThis("SOLUTION_CACHE", "ERR", f"No se pudo consultar la caché para '{ref_json_path}': {exc}", "")
+
+    if run_result is not None:
+        print("    solución recuperada de caché")
+    else:
+        with stage_timer("solver", timings):
+            run_result = run_computeref(
+                ref_file=ref_json_path,
+                tool_file=processed_tool_path,
+                material_file=material_json_path,
+                workdir=combo_dir,
+                max_compute_time=max_compute_time,
+                enhance_opti=enhance_opti,
+                engine=engine,
+            )
+        # Solo se guardan ejecuciones reales y completas del solver; los fallos
+        # de arranque (sin ejecutable, sin wine) y los solvers detenidos por
+        # tiempo no son una respuesta del solver.
+        if solution_cache is not None and cache_key and run_result.get("executed") and not run_result.get("timed_out"):
+            solution_cache.store(cache_key, run_result, combo_dir, ref_json_path)
+
+    if not run_result["ok"]:
+        mss = (f"    compute_ref no completado: {run_result.get('reason')}")
+        if run_result.get("stdout"):
+            mss =(f"    stdout: {run_result['stdout'].strip()}")
+            print(mss)
+        if run_result.get("stderr"):
+            mss =(f"    stderr: {run_result['stderr'].strip()}")
+            print(mss)
+    elif run_result.get("stdout"):
+        mss = (f"    salida: {run_result['stdout'].strip()}")
+        print(mss)
+
+    with stage_timer("solution_metadata", timings):
+        solution_json_path = discover_solution_json(combo_dir, ref_json_path, run_result=run_result)
+        metadata = _build_solution_metadata(
+            piece_cnc=cnc_path,
+            ref_json_path=ref_json_path,
+            tool_json_path=processed_tool_path,
+            solution_json_path=solution_json_path,
+            combo_dir=combo_dir,
+            run_result=run_result,
+        )
+    metadata["robot"] = robot_label
+    metadata["solution_cache_hit"] = bool(run_result.get("from_cache"))
+    metadata["solution_cache_key"] = cache_key
+    metadata["material_family"] = material_family
+    metadata["bbox_class"] = bbox_class
+    metadata["material_json"] = str(Path(material_json_path).as_posix())
+    metadata["material_json_payload"] = copy.deepcopy(piece_material_payload)
+
+    solver_metadata_path = os.path.join(combo_dir, "metadata.json")
+    solver_metadata = None
+    if os.path.exists(solver_metadata_path):
+        try:
+            solver_metadata = _load_json(solver_metadata_path)
+        except Exception:
+            solver_metadata = None
+            if DEBUG_LEVEL >= 1:
+                LogThis("ROUTING", "ERR", f"No se pudo cargar metadata de solver para '{ref_json_path}'", "")
+
+    overlay_name = f"{piece_stem}__{tool_stem}.png"
+    combo_overlay_path = os.path.join(combo_dir, overlay_name)
+    global_overlay_path = os.path.join(png_dir, overlay_name)
+
+    should_render = bool(solution_json_path and os.path.exists(solution_json_path))
+    metadata_for_draw = dict(metadata)
+    if solver_metadata is not None:
+        metadata_for_draw.update(solver_metadata)
+
+    overlays = overlays or {"combo_png": True, "global_png": True, "publish_mode": "hardlink"}
+    contact_sheet = bool(overlays.get("contact_sheet", False))
+    overlay_targets = []
+    if overlays.get("combo_png", True):
+        overlay_targets.append(combo_overlay_path)
+    if overlays.get("global_png", True):
+        overlay_targets.append(global_overlay_path)
+
+    if should_render and (overlay_targets or contact_sheet):
+        try:
+            # Se rasteriza una sola vez; el PNG global es un enlace o copia del de la combinación.
+            with stage_timer("overlay", timings):
+                published = _draw_solution_overlay(
+                    cnc_path,
+                    processed_tool_path,
+                    solution_json_path,
+                    overlay_targets,
+                    metadata=metadata_for_draw,
+                    publish_mode=overlays.get("publish_mode", "hardlink"),
+                    contact_sheet_key=_contact_sheet_key(combo_dir) if contact_sheet else None,
+                )
+            metadata["solution_png"] = combo_overlay_path if published.get(combo_overlay_path) else None
+            metadata["solution_png_global"] = global_overlay_path if published.get(global_overlay_path) else None
+        except Exception as exc:
+            metadata["solution_png"] = None
+            metadata["solution_png_global"] = None
+            metadata["png_error"] = str(exc)
+            print(f"    Error dibujando overlay: {exc}")
+    else:
+        metadata["solution_png"] = None
+        metadata["solution_png_global"] = None
+
+    timings["total"] = round(sum(timings.values()), 6)
+    metadata["combo_timings_s"] = timings
+    metadata["piece_timings_s"] = dict(_PIECE_TIMINGS.get(os.path.normcase(os.path.abspath(cnc_path)), {}))
+
+    parser_metadata_path = os.path.join(combo_dir, "metadata_parser.json")
+    _dump_json(parser_metadata_path, metadata)
+    return metadata
+
+
 def process_robot_out_cnc_with_tools(
     robot_label: str,
     cnc_dir: str,
@@ -615,13 +1197,34 @@ def process_robot_out_cnc_with_tools(
     enhance_opti: int,
     solutions_dir: str,
     *,
+    engine: str = "exe",
     default_tool: str | None = None,
     allow_other_tools: bool = True,
     allowed_tools: list[str] | None = None,
+    max_workers: int = 1,
+    solution_cache: SolutionCache | None = None,
+    tool_selection: dict[str, Any] | None = None,
+    tool_history: ToolHistory | None = None,
+    overlays: dict[str, Any] | None = None,
+    only_pieces: set[str] | None = None,
 ) -> list[dict[str, Any]]:
-    """Ejecuta compute_ref.exe para un directorio CNC concreto de un robot."""
+    """Ejecuta compute_ref.exe para un directorio CNC concreto de un robot.
+
+    Con max_workers > 1 el trabajo se reparte en un pool de workers: una unidad
+    por combinación en modo exhaustive y una por pieza en los modos que cortan
+    la búsqueda. summary.json mantiene el orden pieza -> herramienta probada.
+
+    Con only_pieces (modo incremental) solo se resuelven esas piezas, no se
+    vacía solutions_dir y summary.json se completa con los metadata_parser.json
+    de las demás. Devuelve las filas de las combinaciones resueltas ahora.
+    """
+    tool_selection = tool_selection or {"policy": "exhaustive", "best_of_n": 1, "piece_time_budget_s": None, "order_by_history": False}
+    policy = tool_selection["policy"]
     cnc_files = [os.path.join(cnc_dir, name) for name in files_finder(cnc_dir, extensions=(".cnc",))]
-    if not cnc_files:
+    all_cnc_files = cnc_files
+    if only_pieces is not None:
+        cnc_files = [path for path in cnc_files if Path(path).stem in only_pieces]
+    if not all_cnc_files:
         mss = (f"No se encontraron CNCs en '{cnc_dir}' para {robot_label}")
         if DEBUG_LEVEL >= 1:
             LogThis("ROUTING", "ERR", mss, "")
@@ -654,11 +1257,17 @@ def process_robot_out_cnc_with_tools(
 
     processed_tools_dir = os.path.join(tools_dir, processed_tools_subdir)
     os.makedirs(processed_tools_dir, exist_ok=True)
-    ensure_clean_dir(solutions_dir)
+    if only_pieces is None:
+        ensure_clean_dir(solutions_dir)
+    else:
+        # Combinaciones de una versión anterior de la pieza, o de otra herramienta.
+        for cnc_path in cnc_files:
+            _remove_piece_solutions(solutions_dir, Path(cnc_path).stem)
     png_dir = os.path.join(solutions_dir, "png")
     os.makedirs(png_dir, exist_ok=True)
 
-    print(f"Procesando {len(cnc_files)} CNC(s) de {robot_label} con {len(tool_names)} herramienta(s) usando compute_ref.exe...")
+    engine_label = "solver nativo" if engine == "native" else "compute_ref.exe"
+    print(f"Procesando {len(cnc_files)} CNC(s) de {robot_label} con {len(tool_names)} herramienta(s) usando {engine_label}...")
     if allowed_tools:
         mss = (f"  Lista permitida de {robot_label} aplicada: {tool_names}")
         if DEBUG_LEVEL >= 2:
@@ -671,25 +1280,44 @@ def process_robot_out_cnc_with_tools(
             LogThis("ROUTING", "OUT", mss, "")
         print(mss)
 
-    summary: list[dict[str, Any]] = []
+    # Cada entrada de ordered_results corresponde a una combinación en el orden
+    # pieza -> herramienta. Las que se resuelven sin solver (errores previos) se
+    # guardan directamente; el resto se rellenan cuando termina su trabajo.
+    ordered_results: list[dict[str, Any] | None] = []
+    piece_units: list[list[tuple[int, dict[str, Any]]]] = []
+    processed_tool_cache: dict[str, str | Exception] = {}
 
     for cnc_path in cnc_files:
         piece_stem = Path(cnc_path).stem
         piece_dir = os.path.join(solutions_dir, piece_stem)
         os.makedirs(piece_dir, exist_ok=True)
+        piece_unit: list[tuple[int, dict[str, Any]]] = []
+        piece_units.append(piece_unit)
 
+        try:
+            material_family, bbox_class = _piece_family_and_bbox_class(cnc_path)
+        except Exception:
+            material_family, bbox_class = "UNKNOWN", "UNKNOWN"
+        piece_tool_names = tool_names
+        if policy != "exhaustive" and tool_selection.get("order_by_history") and tool_history is not None:
+            piece_tool_names = tool_history.order_tools(history_key(material_family, bbox_class), tool_names)
+            if DEBUG_LEVEL >= 2 and piece_tool_names != tool_names:
+                LogThis("TOOL_SELECTION", "INF", f"{piece_stem} ({material_family}|{bbox_class}): orden {piece_tool_names}", "")
+
+        piece_timings = _piece_timings(cnc_path)
         material_json_path = os.path.join(piece_dir, "material.json")
         try:
-            piece_material_payload = build_material_json_for_piece(
-                cnc_path,
-                material_json_path,
-            )
+            with stage_timer("material_json", piece_timings):
+                piece_material_payload = build_material_json_for_piece(
+                    cnc_path,
+                    material_json_path,
+                )
         except Exception as exc:
             mss = (f"    No se pudo generar material JSON para '{cnc_path}': {exc}")
             if DEBUG_LEVEL >= 1:
                 LogThis("ROUTING", "ERR", mss, "")
             print(mss)
-            summary.append(
+            ordered_results.append(
                 {
                     "robot": robot_label,
                     "piece_file": cnc_path,
@@ -702,17 +1330,25 @@ def process_robot_out_cnc_with_tools(
             )
             continue
 
-        for tool_name in tool_names:
+        for tool_name in piece_tool_names:
             tool_path = os.path.join(tools_dir, tool_name)
             tool_stem = Path(tool_name).stem
             combo_dir = os.path.join(piece_dir, tool_stem)
             os.makedirs(combo_dir, exist_ok=True)
 
-            try:
-                processed_tool_path = build_tool_polygons(tool_path, processed_tools_dir)
-            except Exception as exc:
+            # La herramienta procesada se genera una sola vez por ejecución y
+            # siempre desde el hilo principal, antes de repartir trabajo.
+            if tool_name not in processed_tool_cache:
+                try:
+                    with stage_timer("tool_polygons"):
+                        processed_tool_cache[tool_name] = build_tool_polygons(tool_path, processed_tools_dir)
+                except Exception as exc:
+                    processed_tool_cache[tool_name] = exc
+            processed_tool_path = processed_tool_cache[tool_name]
+            if isinstance(processed_tool_path, Exception):
+                exc = processed_tool_path
                 print(f"    Saltando herramienta '{tool_name}' por error en el paso de generación de polígonos: {exc}")
-                summary.append(
+                ordered_results.append(
                     {
                         "robot": robot_label,
                         "piece_file": cnc_path,
@@ -726,14 +1362,16 @@ def process_robot_out_cnc_with_tools(
                 continue
 
             ref_json_path = os.path.join(combo_dir, f"ref_{piece_stem}.json")
+            combo_timings: dict[str, float] = {}
             try:
-                build_ref_json_for_piece(cnc_path, ref_json_path)
+                with stage_timer("ref_json", combo_timings):
+                    build_ref_json_for_piece(cnc_path, ref_json_path)
             except Exception as exc:
                 mss = (f"    No se pudo generar ref JSON para '{cnc_path}': {exc}")
                 if DEBUG_LEVEL >= 1:
                     LogThis("ROUTING", "ERR", mss, "")
                 print(mss)
-                summary.append(
+                ordered_results.append(
                     {
                         "robot": robot_label,
                         "piece_file": cnc_path,
@@ -746,92 +1384,190 @@ def process_robot_out_cnc_with_tools(
                 )
                 continue
 
-            print(f"  [{robot_label}] CNC: {cnc_path}  |  Herramienta: {tool_name}")
-            run_result = run_computeref(
-                ref_file=ref_json_path,
-                tool_file=processed_tool_path,
-                material_file=material_json_path,
-                workdir=combo_dir,
-                max_compute_time=max_compute_time,
-                enhance_opti=enhance_opti,
+            ordered_results.append(None)
+            piece_unit.append(
+                (
+                    len(ordered_results) - 1,
+                    {
+                        "robot_label": robot_label,
+                        "cnc_path": cnc_path,
+                        "tool_name": tool_name,
+                        "processed_tool_path": processed_tool_path,
+                        "ref_json_path": ref_json_path,
+                        "material_json_path": material_json_path,
+                        "piece_material_payload": piece_material_payload,
+                        "combo_dir": combo_dir,
+                        "png_dir": png_dir,
+                        "max_compute_time": max_compute_time,
+                        "enhance_opti": enhance_opti,
+                        "engine": engine,
+                        "solution_cache": solution_cache,
+                        "material_family": material_family,
+                        "bbox_class": bbox_class,
+                        "overlays": overlays,
+                        "timings": combo_timings,
+                    },
+                )
             )
 
-            if not run_result["ok"]:
-                mss = (f"    compute_ref no completado: {run_result.get('reason')}")
-                if run_result.get("stdout"):
-                    mss =(f"    stdout: {run_result['stdout'].strip()}")
-                    print(mss)
-                if run_result.get("stderr"):
-                    mss =(f"    stderr: {run_result['stderr'].strip()}")
-                    print(mss)
-            elif run_result.get("stdout"):
-                mss = (f"    salida: {run_result['stdout'].strip()}")
-                print(mss)
-
-            solution_json_path = discover_solution_json(combo_dir, ref_json_path, run_result=run_result)
-            metadata = _build_solution_metadata(
-                piece_cnc=cnc_path,
-                ref_json_path=ref_json_path,
-                tool_json_path=processed_tool_path,
-                solution_json_path=solution_json_path,
-                combo_dir=combo_dir,
-                run_result=run_result,
-            )
-            metadata["robot"] = robot_label
-            metadata["material_json"] = str(Path(material_json_path).as_posix())
-            metadata["material_json_payload"] = copy.deepcopy(piece_material_payload)
+    pending_combos = [item for unit in piece_units for item in unit]
+    if policy == "exhaustive":
+        work_units = [[item] for item in pending_combos]
+    else:
+        work_units = [unit for unit in piece_units if unit]
+        mss = (f"  Política de herramientas de {robot_label}: {policy}")
+        if DEBUG_LEVEL >= 2:
+            LogThis("TOOL_SELECTION", "INF", mss, "")
+        print(mss)
 
-            solver_metadata_path = os.path.join(combo_dir, "metadata.json")
-            solver_metadata = None
-            if os.path.exists(solver_metadata_path):
-                try:
-                    solver_metadata = _load_json(solver_metadata_path)
-                except Exception:
-                    solver_metadata = None
-                    if DEBUG_LEVEL >= 1:
-                        LogThis("ROUTING", "ERR", f"No se pudo cargar metadata de solver para '{ref_json_path}'", "")
+    def run_unit(unit: list[tuple[int, dict[str, Any]]]):
+        return _evaluate_piece_tools_with_policy(
+            unit,
+            policy=policy,
+            best_of_n=int(tool_selection.get("best_of_n") or 1),
+            piece_time_budget_s=tool_selection.get("piece_time_budget_s"),
+        )
 
-            overlay_name = f"{piece_stem}__{tool_stem}.png"
-            combo_overlay_path = os.path.join(combo_dir, overlay_name)
-            global_overlay_path = os.path.join(png_dir, overlay_name)
+    skipped_combos: list[dict[str, Any]] = []
+    workers = min(max(1, int(max_workers or 1)), max(1, len(work_units)))
+    if workers > 1:
+        mss = (f"  {len(pending_combos)} combinaciones de {robot_label} repartidas en {workers} workers")
+        if DEBUG_LEVEL >= 2:
+            LogThis("COMPUTE_REF", "INF", mss, "")
+        print(mss)
+        # Hilos y no procesos: el trabajo pesado es el subprocess del solver,
+        # que no retiene el GIL, y así se comparten las cachés del proceso.
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_unit, unit) for unit in work_units]
+            try:
+                for future in as_completed(futures):
+                    unit_results, unit_skipped = future.result()
+                    for result_index, metadata in unit_results:
+                        ordered_results[result_index] = metadata
+                    skipped_combos.extend(unit_skipped)
+            except BaseException:
+                # Ctrl+C o error: sin esto el executor esperaría a que acabasen
+                # todas las combinaciones pendientes antes de salir.
+                for future in futures:
+                    future.cancel()
+                cancel_running_solvers()
+                raise
+    else:
+        for unit in work_units:
+            unit_results, unit_skipped = run_unit(unit)
+            for result_index, metadata in unit_results:
+                ordered_results[result_index] = metadata
+            skipped_combos.extend(unit_skipped)
+
+    # Las combinaciones que la política no llegó a lanzar no aparecen en
+    # summary.json; se quita su carpeta, que solo contenía el ref preparado.
+    for combo in skipped_combos:
+        shutil.rmtree(combo["combo_dir"], ignore_errors=True)
+    if skipped_combos:
+        mss = (f"  {len(skipped_combos)} de {len(pending_combos)} combinaciones de {robot_label} omitidas por la política {policy}")
+        if DEBUG_LEVEL >= 1:
+            LogThis("TOOL_SELECTION", "INF", mss, "")
+        print(mss)
 
-            should_render = bool(solution_json_path and os.path.exists(solution_json_path))
-            metadata_for_draw = dict(metadata)
-            if solver_metadata is not None:
-                metadata_for_draw.update(solver_metadata)
+    summary: list[dict[str, Any]] = [entry for entry in ordered_results if entry is not None]
 
-            if should_render:
-                try:
-                    overlay_ok_combo = _draw_solution_overlay(
-                        cnc_path,
-                        processed_tool_path,
-                        solution_json_path,
-                        combo_overlay_path,
-                        metadata=metadata_for_draw,
-                    )
-                    overlay_ok_global = _draw_solution_overlay(
-                        cnc_path,
-                        processed_tool_path,
-                        solution_json_path,
-                        global_overlay_path,
-                        metadata=metadata_for_draw,
-                    )
-                    metadata["solution_png"] = combo_overlay_path if overlay_ok_combo else None
-                    metadata["solution_png_global"] = global_overlay_path if overlay_ok_global else None
-                except Exception as exc:
-                    metadata["solution_png"] = None
-                    metadata["solution_png_global"] = None
-                    metadata["png_error"] = str(exc)
-                    print(f"    Error dibujando overlay: {exc}")
-            else:
-                metadata["solution_png"] = None
-                metadata["solution_png_global"] = None
+    if overlays is not None and overlays.get("contact_sheet"):
+        _write_contact_sheets(summary, png_dir, overlays.get("contact_sheet_columns", 4))
 
-            parser_metadata_path = os.path.join(combo_dir, "metadata_parser.json")
-            _dump_json(parser_metadata_path, metadata)
-            summary.append(metadata)
+    cache_stats = {"enabled": solution_cache is not None, "lookups": 0, "hits": 0, "misses": 0, "hit_rate": None}
+    if solution_cache is not None:
+        cache_hits = sum(1 for entry in summary if entry.get("solution_cache_hit"))
+        cache_lookups = len(pending_combos) - len(skipped_combos)
+        cache_stats.update(
+            lookups=cache_lookups,
+            hits=cache_hits,
+            misses=cache_lookups - cache_hits,
+            hit_rate=round(cache_hits / cache_lookups, 4) if cache_lookups else None,
+        )
+        mss = (f"  Caché de soluciones {robot_label}: {cache_hits} aciertos, {cache_lookups - cache_hits} fallos")
+        if DEBUG_LEVEL >= 1:
+            LogThis("SOLUTION_CACHE", "INF", mss, "")
+        print(mss)
 
-    _dump_json(os.path.join(solutions_dir, "summary.json"), summary)
+    if only_pieces is None:
+        summary_rows = summary
+    else:
+        summary_rows = _merge_incremental_summary(solutions_dir, all_cnc_files, summary, tool_names)
+    # solution_cache resume la caché en esta ejecución; rows son las combinaciones.
+    _dump_json(os.path.join(solutions_dir, "summary.json"), {"solution_cache": cache_stats, "rows": summary_rows})
+    if tool_history is not None:
+        tool_history.add_rows(summary, _history_key_for_row)
+    return summary
+
+
+def _contact_sheet_key(combo_dir: str | Path) -> str:
+    return os.path.normcase(os.path.abspath(combo_dir))
+
+
+def _write_contact_sheets(summary: list[dict[str, Any]], png_dir: str, columns: int) -> None:
+    """Escribe en png_dir una hoja de contactos por pieza con los overlays dibujados de sus combinaciones.
+
+    Las miniaturas siguen el orden de summary.json (pieza -> herramienta probada).
+    """
+    tiles_by_piece: dict[str, list[Any]] = {}
+    for entry in summary:
+        tile = _CONTACT_SHEET_TILES.pop(_contact_sheet_key(entry.get("combo_dir") or ""), None)
+        if tile is None:
+            continue
+        tiles_by_piece.setdefault(Path(str(entry.get("piece_file") or "")).stem, []).append(tile)
+
+    for piece_stem, tiles in tiles_by_piece.items():
+        sheet = build_contact_sheet(tiles, columns=columns)
+        if sheet is None:
+            continue
+        sheet_path = os.path.join(png_dir, f"{piece_stem}{CONTACT_SHEET_SUFFIX}")
+        with stage_timer("contact_sheet"):
+            published = publish_png(sheet, [sheet_path])
+        if not published[Path(sheet_path)] and DEBUG_LEVEL >= 1:
+            LogThis("OVERLAY", "ERR", f"No se pudo escribir la hoja de contactos '{sheet_path}'", "")
+
+
+def _remove_piece_solutions(solutions_dir: str | Path, piece_stem: str) -> None:
+    """Borra la carpeta de soluciones de una pieza y sus overlays de png/."""
+    shutil.rmtree(os.path.join(solutions_dir, piece_stem), ignore_errors=True)
+    pattern = os.path.join(glob.escape(str(solutions_dir)), "png", f"{glob.escape(piece_stem)}__*.png")
+    for png_path in glob.glob(pattern):
+        try:
+            os.remove(png_path)
+        except OSError:
+            pass
+
+
+def _merge_incremental_summary(
+    solutions_dir: str,
+    cnc_files: list[str],
+    run_rows: list[dict[str, Any]],
+    tool_names: list[str],
+) -> list[dict[str, Any]]:
+    """summary.json del modo incremental: filas de esta ejecución y, para el resto de piezas, sus metadata_parser.json.
+
+    Sigue el orden pieza -> herramienta de una ejecución completa; las
+    combinaciones leídas de disco se ordenan según tool_names.
+    """
+    run_rows_by_piece: dict[str, list[dict[str, Any]]] = {}
+    for row in run_rows:
+        run_rows_by_piece.setdefault(Path(str(row.get("piece_file") or "")).stem, []).append(row)
+    tool_rank = {Path(name).stem: index for index, name in enumerate(tool_names)}
+
+    summary: list[dict[str, Any]] = []
+    for cnc_path in cnc_files:
+        piece_stem = Path(cnc_path).stem
+        if piece_stem in run_rows_by_piece:
+            summary.extend(run_rows_by_piece[piece_stem])
+            continue
+        stored = []
+        for metadata_path in Path(solutions_dir, piece_stem).glob("*/metadata_parser.json"):
+            try:
+                stored.append((metadata_path.parent.name, _load_json(metadata_path)))
+            except RuntimeError:
+                continue
+        stored.sort(key=lambda item: (tool_rank.get(item[0], len(tool_rank)), item[0]))
+        summary.extend(payload for _, payload in stored)
     return summary
 
 
@@ -972,8 +1708,12 @@ def _compute_circumcenter(a: tuple[float, float], b: tuple[float, float], c: tup
     return float(ux), float(uy)
 
 
-def _build_polyshape_from_contours(contours) -> tuple[Any | None, list[list[float]]]:
-    """Intenta construir una polyShape y una nube Voronoi aproximada desde contornos CNC."""
+def _build_polyshape_from_contours(contours, sampled_rings: list[list[tuple[float, float]]] | None = None) -> tuple[Any | None, list[list[float]]]:
+    """Intenta construir una polyShape y una nube Voronoi aproximada desde contornos CNC.
+
+    sampled_rings, si se pasa, son los puntos de cada contorno ya muestreados
+    con 64 segmentos por arco (PieceGeometry.points(64)).
+    """
     try:
         from shapely.geometry import LineString, Point, Polygon
         from shapely.ops import polygonize, triangulate, unary_union
@@ -982,10 +1722,12 @@ def _build_polyshape_from_contours(contours) -> tuple[Any | None, list[list[floa
             LogThis("REF_JSON", "ERR", f"Shapely no disponible para construir referencia JSON: {exc}", "")
         raise RuntimeError(f"Shapely no disponible para construir la referencia JSON: {exc}")
 
+    if sampled_rings is None:
+        sampled_rings = [contour_to_points(contour, arc_segments=64, close_if_open=True) for contour in contours]
+
     lines = []
     raw_rings = []
-    for contour in contours:
-        pts = contour_to_points(contour, arc_segments=64, close_if_open=True)
+    for pts in sampled_rings:
         if len(pts) < 4:
             continue
         raw_rings.append(pts)
@@ -1052,33 +1794,15 @@ def _resolve_source_program_path(source_file: str | None) -> Path | None:
 
 
 def _load_slot_source_payload_for_source(source_cnc: str | Path) -> dict[str, Any] | None:
-    """Genera y cachea los JSON refPartJson y partJson de load_slot para un programa origen."""
+    """Calcula en memoria y cachea las listas refPartJson y partJson de load_slot para un programa origen."""
     source_cnc = Path(source_cnc).resolve()
     cache_key = str(source_cnc)
     if cache_key in _LOAD_SLOT_SOURCE_CACHE:
         return _LOAD_SLOT_SOURCE_CACHE[cache_key]
 
-    slot_name = source_cnc.stem
-    cache_dir = LOAD_SLOT_CACHE_DIR / slot_name
-    ref_json_path = cache_dir / f"refPartJson_{slot_name}.json"
-    part_json_path = cache_dir / f"partJson_{slot_name}.json"
-
     try:
-        if not ref_json_path.exists() or not part_json_path.exists():
-            with pushd(cache_dir):
-                error_flag = load_slot_script(str(source_cnc))
-            if error_flag != 0:
-                print(f"    load_slot devolvio {error_flag} para '{source_cnc.name}'")
-                _LOAD_SLOT_SOURCE_CACHE[cache_key] = None
-                return None
-
-        ref_list = _load_json(ref_json_path)
-        part_list = _load_json(part_json_path)
-        if not isinstance(ref_list, list):
-            raise ValueError(f"El refPartJson de load_slot no es una lista: {ref_json_path}")
-        if not isinstance(part_list, list):
-            raise ValueError(f"El partJson de load_slot no es una lista: {part_json_path}")
-
+        with stage_timer("load_slot"):
+            ref_list, part_list = load_slot_payload(str(source_cnc), **_load_slot_settings())
         payload = {
             "ref_list": ref_list,
             "part_list": part_list,
@@ -1245,19 +1969,18 @@ def _build_ref_json_for_piece_legacy(piece_cnc: str | Path, output_json: str | P
     output_json = Path(output_json)
     piece_id, piece_name, meta = _read_piece_header(piece_cnc)
 
-    contours = parse_cnc_contours(piece_cnc)
-    contours = [simplify_contour_geometry(c) for c in contours]
-    contours = [c for c in contours if c.entities]
+    geometry = get_piece_geometry(piece_cnc)
+    contours = geometry.contours
     if not contours:
         if DEBUG_LEVEL >= 1:
             LogThis("REF_JSON", "ERR", f"No se detectaron contornos en '{piece_cnc}' para construir la referencia JSON", "")
         raise ValueError(f"No se detectaron contornos en '{piece_cnc}'")
 
-    min_x, min_y, max_x, max_y = contours_bbox(contours, arc_segments=72)
+    min_x, min_y, max_x, max_y = geometry.bbox(72)
     shift_x = min_x
     shift_y = min_y
 
-    polyout, voronoi = _build_polyshape_from_contours(contours)
+    polyout, voronoi = _build_polyshape_from_contours(contours, geometry.points(64, close_if_open=True))
     if polyout is not None:
         polyout = affinity.translate(polyout, xoff=-shift_x, yoff=-shift_y)
         bbox_bounds = polyout.bounds
@@ -1282,8 +2005,7 @@ def _build_ref_json_for_piece_legacy(piece_cnc: str | Path, output_json: str | P
         computable = 0
 
     contour_items = []
-    for contour in contours:
-        pts = contour_to_points(contour, arc_segments=72, close_if_open=True)
+    for contour, pts in zip(contours, geometry.points(72, close_if_open=True)):
         signed_area = polygon_signed_area([(float(x), float(y)) for x, y in pts])
         contour_type = 0 if signed_area >= 0 else 1
         sense = 1 if signed_area >= 0 else -1
@@ -1320,8 +2042,7 @@ def _build_ref_json_for_piece_legacy(piece_cnc: str | Path, output_json: str | P
     }
 
     output_json.parent.mkdir(parents=True, exist_ok=True)
-    with open(output_json, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2, ensure_ascii=False)
+    write_json_file(output_json, payload, indent=_ref_json_indent())
 
     return output_json
 
@@ -1337,8 +2058,7 @@ def build_ref_json_for_piece(piece_cnc: str | Path, output_json: str | Path) ->
         return _build_ref_json_for_piece_legacy(piece_cnc, output_json)
 
     output_json.parent.mkdir(parents=True, exist_ok=True)
-    with open(output_json, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2, ensure_ascii=False)
+    write_json_file(output_json, payload, indent=_ref_json_indent())
 
     return output_json
 
@@ -1437,7 +2157,19 @@ def _tool_candidates(tools_dir: str) -> list[str]:
 
 
 def _read_tool_positions(tool_json_path: str | Path) -> list[dict[str, Any]]:
-    """Lee posiciones, diámetros y datos útiles de una herramienta JSON."""
+    """Lee posiciones, diámetros y datos útiles de una herramienta JSON.
+
+    Se llama una vez por combinación; el resultado queda en memoria mientras
+    el fichero no cambie.
+    """
+    try:
+        stat = os.stat(tool_json_path)
+        cache_key = (str(Path(tool_json_path).resolve()), stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        cache_key = None
+    if cache_key is not None and cache_key in _TOOL_POSITIONS_CACHE:
+        return copy.deepcopy(_TOOL_POSITIONS_CACHE[cache_key])
+
     payload = _load_json(tool_json_path)
     tools = _flatten_tool_payload(payload)
     result = []
@@ -1454,6 +2186,8 @@ def _read_tool_positions(tool_json_path: str | Path) -> list[dict[str, Any]]:
                 "force": item.get("force"),
             }
         )
+    if cache_key is not None:
+        _TOOL_POSITIONS_CACHE[cache_key] = copy.deepcopy(result)
     return result
 
 
@@ -1474,6 +2208,110 @@ def _find_compute_ref_executable() -> tuple[list[str] | None, str | None]:
     return None, "compute_ref.exe es un binario Windows y no hay 'wine' disponible en este entorno"
 
 
+# Ficheros de nombre fijo que compute_ref.exe deja en su carpeta de trabajo,
+# además de la solución que anuncia con "Solution saved to:".
+COMPUTE_REF_FIXED_OUTPUTS = ("metadata.json",)
+
+# compute_ref.exe en marcha, para poder detenerlos al cancelar el lote.
+_ACTIVE_SOLVERS: set[subprocess.Popen] = set()
+_ACTIVE_SOLVERS_LOCK = threading.Lock()
+_SOLVER_CANCEL = threading.Event()
+
+
+def _kill_solver(proc: subprocess.Popen) -> None:
+    try:
+        proc.kill()
+    except OSError:
+        pass
+
+
+def cancel_running_solvers() -> None:
+    """Detiene los compute_ref.exe en marcha y no deja lanzar más hasta el siguiente lote."""
+    _SOLVER_CANCEL.set()
+    with _ACTIVE_SOLVERS_LOCK:
+        running = list(_ACTIVE_SOLVERS)
+    for proc in running:
+        _kill_solver(proc)
+
+
+def _compute_ref_timeout(max_compute_time: float) -> float | None:
+    """Límite de reloj de un compute_ref.exe: max_compute_time + compute_ref.timeout_margin_s.
+
+    Con timeout_margin_s = null no hay límite.
+    """
+    runtime_config = load_runtime_config()
+    compute_ref_config = runtime_config.get("compute_ref", {}) if isinstance(runtime_config, dict) else {}
+    if "timeout_margin_s" in compute_ref_config and compute_ref_config["timeout_margin_s"] is None:
+        return None
+    margin = _safe_float(compute_ref_config.get("timeout_margin_s", 10))
+    if margin is None or margin < 0:
+        if DEBUG_LEVEL >= 1:
+            LogThis("CONFIG", "ERR", f"compute_ref.timeout_margin_s no válido: {compute_ref_config.get('timeout_margin_s')!r}. Se usa 10.", "")
+        margin = 10.0
+    return float(max_compute_time) + margin
+
+
+def _declared_solver_outputs(workdir: Path, report: dict[str, Any], started_ns: int) -> list[str]:
+    """Ficheros que ha escrito compute_ref.exe en esta ejecución, según lo que anuncia.
+
+    Son la solución de "Solution saved to:" y los COMPUTE_REF_FIXED_OUTPUTS
+    modificados desde el arranque del proceso (con 2 s de margen por la
+    resolución de fecha de algunos sistemas de ficheros).
+    """
+    outputs: set[str] = set()
+    saved_path = report.get("solution_saved_to")
+    if saved_path:
+        candidate = Path(saved_path)
+        if not candidate.is_absolute():
+            candidate = workdir / candidate
+        if candidate.is_file():
+            outputs.add(str(workdir / candidate.name) if candidate.parent.resolve() == workdir.resolve() else str(candidate))
+    for name in COMPUTE_REF_FIXED_OUTPUTS:
+        path = workdir / name
+        try:
+            if path.stat().st_mtime_ns >= started_ns - 2_000_000_000:
+                outputs.add(str(path))
+        except OSError:
+            continue
+    return sorted(outputs)
+
+
+def _compute_ref_not_executed(reason: str | None) -> dict[str, Any]:
+    """run_result de una combinación en la que no llegó a ejecutarse el solver."""
+    return {
+        "ok": False,
+        "executed": False,
+        "reason": reason,
+        "stdout": "",
+        "stderr": "",
+        "new_files": [],
+        "returncode_raw": None,
+        "returncode_signed": None,
+        "report": _parse_compute_ref_report(""),
+    }
+
+
+def _native_safety_factor() -> float:
+    """Factor de seguridad efectivo del solver nativo (compute_ref.native_safety_factor)."""
+    runtime_config = load_runtime_config()
+    compute_ref_config = runtime_config.get("compute_ref", {}) if isinstance(runtime_config, dict) else {}
+    safety_factor = _safe_float(compute_ref_config.get("native_safety_factor"))
+    return safety_factor if safety_factor is not None else 1.0
+
+
+def _compute_ref_solver_signature(engine: str = "exe") -> str:
+    """Identifica el solver (motor y binario) para invalidar la caché si se sustituye."""
+    if engine == "native":
+        # El factor de seguridad decide el flag de no poder levantar la pieza.
+        return f"native:{NATIVE_VERSION}:sf={_native_safety_factor()}"
+    exe_path = Path("module_ai2") / "compute_ref.exe"
+    try:
+        stat = exe_path.stat()
+    except OSError:
+        return "compute_ref.exe:missing"
+    return f"compute_ref.exe:{stat.st_size}:{stat.st_mtime_ns}"
+
+
 def _normalize_signed_returncode(returncode: int) -> int:
     """Convierte códigos de retorno Windows sin signo a enteros con signo."""
     if returncode > 0x7FFFFFFF:
@@ -1481,58 +2319,121 @@ def _normalize_signed_returncode(returncode: int) -> int:
     return returncode
 
 
-def _parse_compute_ref_report(text: str) -> dict[str, Any]:
-    """Extrae del log del solver datos como xmin, fxmin, flag y time limit."""
-    info: dict[str, Any] = {
-        "time_limit_hit": False,
-        "xmin": None,
-        "fxmin": None,
-        "error_flag": None,
-        "solution_saved_to": None,
-    }
-    if not text:
-        return info
+class _ComputeRefReportParser:
+    """Extrae del log del solver, línea a línea, datos como xmin, fxmin, flag y time limit.
 
-    if re.search(r"time limit\s*\([^)]+\)\s*exceeded", text, flags=re.IGNORECASE):
-        info["time_limit_hit"] = True
+    Permite ir leyendo la salida de compute_ref.exe mientras se ejecuta, de
+    modo que un solver detenido por tiempo conserva lo que llegó a escribir.
+    xmin, fxmin y la ruta de la solución se toman de su primera aparición; el
+    flag, de la última.
+    """
 
-    xmin_match = re.search(r"^\s*xmin:\s*(.+?)\s*$", text, flags=re.MULTILINE)
-    if xmin_match:
-        raw_xmin = xmin_match.group(1).strip()
-        try:
-            parsed = ast.literal_eval(raw_xmin)
-            if isinstance(parsed, (list, tuple)):
-                info["xmin"] = [float(v) for v in parsed]
-            else:
+    def __init__(self) -> None:
+        self.info: dict[str, Any] = {
+            "time_limit_hit": False,
+            "xmin": None,
+            "fxmin": None,
+            "error_flag": None,
+            "solution_saved_to": None,
+        }
+        self._seen: set[str] = set()
+
+    def feed(self, line: str) -> None:
+        info = self.info
+        if not info["time_limit_hit"] and re.search(r"time limit\s*\([^)]+\)\s*exceeded", line, flags=re.IGNORECASE):
+            info["time_limit_hit"] = True
+
+        xmin_match = None if "xmin" in self._seen else re.match(r"\s*xmin:\s*(.+?)\s*$", line)
+        if xmin_match:
+            self._seen.add("xmin")
+            raw_xmin = xmin_match.group(1).strip()
+            try:
+                parsed = ast.literal_eval(raw_xmin)
+                if isinstance(parsed, (list, tuple)):
+                    info["xmin"] = [float(v) for v in parsed]
+                else:
+                    info["xmin"] = raw_xmin
+            except Exception:
+                if DEBUG_LEVEL >= 2:
+                    LogThis("COMPUTE_REF", "WRN", f"No se pudo parsear xmin '{raw_xmin}' como literal, se deja como texto: {xmin_match.group(1).strip()}", "")
                 info["xmin"] = raw_xmin
-        except Exception:
-            if DEBUG_LEVEL >= 2:
-                LogThis("COMPUTE_REF", "WRN", f"No se pudo parsear xmin '{raw_xmin}' como literal, se deja como texto: {xmin_match.group(1).strip()}", "")
-            info["xmin"] = raw_xmin
 
-    fxmin_match = re.search(r"^\s*fxmin:\s*([^\r\n]+)", text, flags=re.MULTILINE)
-    if fxmin_match:
-        try:
-            info["fxmin"] = float(fxmin_match.group(1).strip())
-        except Exception:
-            if DEBUG_LEVEL >= 2:
-                LogThis("COMPUTE_REF", "WRN", f"No se pudo parsear fxmin '{fxmin_match.group(1).strip()}' como float, se deja como texto: {fxmin_match.group(1).strip()}", "")
-            info["fxmin"] = fxmin_match.group(1).strip()
+        fxmin_match = None if "fxmin" in self._seen else re.match(r"\s*fxmin:\s*([^\r\n]+)", line)
+        if fxmin_match:
+            self._seen.add("fxmin")
+            try:
+                info["fxmin"] = float(fxmin_match.group(1).strip())
+            except Exception:
+                if DEBUG_LEVEL >= 2:
+                    LogThis("COMPUTE_REF", "WRN", f"No se pudo parsear fxmin '{fxmin_match.group(1).strip()}' como float, se deja como texto: {fxmin_match.group(1).strip()}", "")
+                info["fxmin"] = fxmin_match.group(1).strip()
 
-    flag_matches = re.findall(r"^\s*(?:Error flag|Flag):\s*(-?\d+)", text, flags=re.MULTILINE)
-    if flag_matches:
-        try:
-            info["error_flag"] = int(flag_matches[-1])
-        except Exception:
-            if DEBUG_LEVEL >= 2:
-                LogThis("COMPUTE_REF", "WRN", f"No se pudo parsear error flag '{flag_matches[-1]}' como int, se deja como texto: {flag_matches[-1]}", "")
-            pass
+        flag_match = re.match(r"\s*(?:Error flag|Flag):\s*(-?\d+)", line)
+        if flag_match:
+            try:
+                info["error_flag"] = int(flag_match.group(1))
+            except Exception:
+                if DEBUG_LEVEL >= 2:
+                    LogThis("COMPUTE_REF", "WRN", f"No se pudo parsear error flag '{flag_match.group(1)}' como int, se deja como texto: {flag_match.group(1)}", "")
 
-    saved_match = re.search(r"Solution saved to:\s*([^\r\n]+)", text, flags=re.IGNORECASE)
-    if saved_match:
-        info["solution_saved_to"] = saved_match.group(1).strip()
+        saved_match = None if "saved" in self._seen else re.search(r"Solution saved to:\s*([^\r\n]+)", line, flags=re.IGNORECASE)
+        if saved_match:
+            self._seen.add("saved")
+            info["solution_saved_to"] = saved_match.group(1).strip()
+
+
+def _parse_compute_ref_report(text: str) -> dict[str, Any]:
+    """Extrae del log del solver datos como xmin, fxmin, flag y time limit."""
+    parser = _ComputeRefReportParser()
+    for line in (text or "").splitlines():
+        parser.feed(line)
+    return parser.info
+
+
+def _run_native_computeref(
+    ref_file: str,
+    tool_file: str,
+    material_file: str,
+    workdir: str,
+    max_compute_time: float,
+    enhance_opti: int,
+) -> dict[str, Any]:
+    """Ejecuta el solver nativo en proceso con el mismo contrato que run_computeref."""
+    safety_factor = _native_safety_factor()
+    workdir_path = Path(workdir)
+    workdir_path.mkdir(parents=True, exist_ok=True)
 
-    return info
+    try:
+        outcome = compute_ref_native(
+            ref_file,
+            tool_file,
+            material_file,
+            max_compute_time=float(max_compute_time),
+            enhance_opti=int(enhance_opti),
+            output_dir=str(workdir_path),
+            safety_factor=safety_factor,
+        )
+    except Exception as exc:
+        if DEBUG_LEVEL >= 1:
+            LogThis("COMPUTE_REF", "ERR", f"----->> Error en el solver nativo: {exc}", "")
+        return _compute_ref_not_executed(str(exc))
+
+    # El log del solver nativo reproduce las líneas de compute_ref.exe, así
+    # que el report se obtiene con el mismo parser.
+    stdout = "\n".join(outcome["log"])
+    flag = int(outcome["flag"])
+    solution_path = outcome.get("solution_path")
+    return {
+        "ok": flag == 0,
+        "executed": True,
+        "reason": None if flag == 0 else f"compute_ref devolvió código {flag}",
+        "stdout": stdout,
+        "stderr": "",
+        "new_files": [str(workdir_path / Path(solution_path).name)] if solution_path else [],
+        "returncode_raw": flag & 0xFFFFFFFF,
+        "returncode_signed": flag,
+        "report": _parse_compute_ref_report(stdout),
+    }
 
 
 def run_computeref(
@@ -1542,21 +2443,20 @@ def run_computeref(
     workdir: str,
     max_compute_time: float = 60.0,
     enhance_opti: int = 1,
+    engine: str = "exe",
 ) -> dict[str, Any]:
-    """Ejecuta compute_ref y devuelve un resultado rico, no solo el returncode."""
+    """Ejecuta compute_ref y devuelve un resultado rico, no solo el returncode.
+
+    Con engine="native" se usa el solver Python de module_ai2 en lugar del exe.
+    """
+    if engine == "native":
+        return _run_native_computeref(ref_file, tool_file, material_file, workdir, max_compute_time, enhance_opti)
+
     cmd_prefix, error = _find_compute_ref_executable()
     if cmd_prefix is None:
-        return {
-            "ok": False,
-            "executed": False,
-            "reason": error,
-            "stdout": "",
-            "stderr": "",
-            "new_files": [],
-            "returncode_raw": None,
-            "returncode_signed": None,
-            "report": _parse_compute_ref_report(""),
-        }
+        return _compute_ref_not_executed(error)
+    if _SOLVER_CANCEL.is_set():
+        return _compute_ref_not_executed("compute_ref cancelado")
 
     ref_abs = str(Path(ref_file).resolve())
     tool_abs = str(Path(tool_file).resolve())
@@ -1564,42 +2464,83 @@ def run_computeref(
     workdir_path = Path(workdir)
     workdir_path.mkdir(parents=True, exist_ok=True)
 
-    before = {str(p.name) for p in workdir_path.iterdir() if p.is_file()}
     cmd = cmd_prefix + [ref_abs, tool_abs, material_abs, str(max_compute_time), str(enhance_opti)]
     #print(f"    Ejecutando: {' '.join(cmd)}")
+    timeout_s = _compute_ref_timeout(max_compute_time)
+    started_ns = time.time_ns()
 
     try:
-        result = subprocess.run(cmd, cwd=str(workdir_path), capture_output=True, text=True)
+        proc = subprocess.Popen(cmd, cwd=str(workdir_path), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
     except Exception as exc:
         if DEBUG_LEVEL >= 1:
             LogThis("COMPUTE_REF", "ERR", f"----->> Error al ejecutar compute_ref.exe: {exc}", "")
-        return {
-            "ok": False,
-            "executed": False,
-            "reason": str(exc),
-            "stdout": "",
-            "stderr": "",
-            "new_files": [],
-            "returncode_raw": None,
-            "returncode_signed": None,
-            "report": _parse_compute_ref_report(""),
-        }
+        return _compute_ref_not_executed(str(exc))
+    with _ACTIVE_SOLVERS_LOCK:
+        _ACTIVE_SOLVERS.add(proc)
+
+    # stdout se interpreta según llega; stderr se lee aparte para que ninguna
+    # de las dos tuberías se llene y bloquee al solver.
+    parser = _ComputeRefReportParser()
+    stdout_lines: list[str] = []
+    stderr_chunks: list[str] = []
+
+    def read_stdout() -> None:
+        for line in proc.stdout:
+            stdout_lines.append(line)
+            parser.feed(line)
+
+    readers = [
+        threading.Thread(target=read_stdout, daemon=True),
+        threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
 
-    after_files = sorted(str(p.name) for p in workdir_path.iterdir() if p.is_file())
-    new_files = [str(workdir_path / name) for name in after_files if name not in before]
-    signed_returncode = _normalize_signed_returncode(int(result.returncode))
-    stdout = result.stdout or ""
-    stderr = result.stderr or ""
-    report = _parse_compute_ref_report("\n".join(part for part in (stdout, stderr) if part))
+    timed_out = False
+    try:
+        try:
+            proc.wait(timeout=timeout_s)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            _kill_solver(proc)
+            proc.wait()
+    except BaseException:
+        # Ctrl+C mientras se espera: el solver no queda huérfano.
+        _kill_solver(proc)
+        raise
+    finally:
+        with _ACTIVE_SOLVERS_LOCK:
+            _ACTIVE_SOLVERS.discard(proc)
+
+    cancelled = _SOLVER_CANCEL.is_set()
+    for reader in readers:
+        # Tras matar el proceso no se espera a algún hijo que herede las tuberías.
+        reader.join(timeout=2.0 if timed_out or cancelled else None)
+    stdout = "".join(stdout_lines)
+    stderr = "".join(stderr_chunks)
+    for line in stderr.splitlines():
+        parser.feed(line)
+    report = dict(parser.info)
+
+    signed_returncode = _normalize_signed_returncode(int(proc.returncode))
+    if cancelled:
+        reason = "compute_ref cancelado"
+    elif timed_out:
+        reason = f"compute_ref superó el límite de {timeout_s:g} s y se detuvo"
+        if DEBUG_LEVEL >= 1:
+            LogThis("COMPUTE_REF", "WRN", f"{reason}: {ref_abs}", "")
+    else:
+        reason = None if signed_returncode == 0 else f"compute_ref devolvió código {signed_returncode}"
 
     return {
-        "ok": signed_returncode == 0,
-        "executed": True,
-        "reason": None if signed_returncode == 0 else f"compute_ref devolvió código {signed_returncode}",
+        "ok": signed_returncode == 0 and not timed_out and not cancelled,
+        "executed": not cancelled,
+        "timed_out": timed_out,
+        "reason": reason,
         "stdout": stdout,
         "stderr": stderr,
-        "new_files": new_files,
-        "returncode_raw": int(result.returncode),
+        "new_files": _declared_solver_outputs(workdir_path, report, started_ns),
+        "returncode_raw": int(proc.returncode),
         "returncode_signed": signed_returncode,
         "report": report,
     }
@@ -1915,6 +2856,7 @@ def _build_solution_metadata(
         "run_ok": bool(run_result.get("ok")),
         "run_executed": bool(run_result.get("executed")),
         "run_reason": run_result.get("reason"),
+        "solver_timed_out": bool(run_result.get("timed_out")),
         "returncode_raw": run_result.get("returncode_raw"),
         "returncode_signed": returncode_signed,
         "solver_error_flag": error_flag,
@@ -1939,24 +2881,63 @@ def _draw_solution_overlay(
     piece_cnc: str | Path,
     processed_tool_json: str | Path,
     solution_json: str | Path,
-    output_png: str | Path,
+    output_pngs: list[str],
     metadata: dict[str, Any] | None = None,
     out_wh: tuple[int, int] = (900, 900),
-) -> bool:
-    """Dibuja el overlay delegando en el modulo reutilizable.
+    publish_mode: str = "hardlink",
+    contact_sheet_key: str | None = None,
+) -> dict[str, bool]:
+    """Dibuja el overlay una vez y lo publica en todas las rutas de output_pngs.
 
     La decisión de pintar o no la herramienta debe salir del metadata.json
     generado por compute_ref. Si solution_valid=True, se pinta encima de la
     pieza. Si es False, el renderer deja el texto de "Solución no encontrada".
+    Con contact_sheet_key se guarda además su miniatura para la hoja de
+    contactos de la pieza. Devuelve, por ruta, si el PNG quedó escrito.
     """
-    return draw_solution_overlay_png(
+    canvas = render_solution_overlay(
         piece_cnc=piece_cnc,
         processed_tool_json=processed_tool_json,
         solution_json=solution_json,
-        output_png=output_png,
         metadata=metadata,
         out_wh=out_wh,
     )
+    if canvas is None:
+        return {path: False for path in output_pngs}
+    if contact_sheet_key is not None:
+        _CONTACT_SHEET_TILES[contact_sheet_key] = contact_sheet_tile(canvas, Path(processed_tool_json).stem)
+    published = publish_png(canvas, output_pngs, mode=publish_mode)
+    return {path: published[Path(path)] for path in output_pngs}
+
+
+def _resolve_max_workers(value: Any) -> int:
+    """Interpreta compute_ref.max_workers: 0 o null usa todas las CPUs, mínimo 1."""
+    try:
+        workers = int(value) if value is not None else 0
+    except (TypeError, ValueError):
+        if DEBUG_LEVEL >= 1:
+            LogThis("CONFIG", "ERR", f"compute_ref.max_workers no válido: {value!r}. Se usa 1.", "")
+        return 1
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def _build_solution_cache(compute_ref_config: dict[str, Any]) -> SolutionCache | None:
+    """Crea la caché de soluciones descrita en compute_ref.solution_cache, o None si está desactivada."""
+    cache_config = compute_ref_config.get("solution_cache", {})
+    if not isinstance(cache_config, dict) or not cache_config.get("enabled", False):
+        return None
+    try:
+        return SolutionCache(
+            cache_config.get("dir") or "OUT_solution_cache",
+            max_entries=cache_config.get("max_entries"),
+            max_size_mb=cache_config.get("max_size_mb"),
+        )
+    except Exception as exc:
+        if DEBUG_LEVEL >= 1:
+            LogThis("CONFIG", "ERR", f"compute_ref.solution_cache no válido: {exc}. Se desactiva la caché.", "")
+        return None
 
 
 def process_out_cnc_with_tools(
@@ -1966,14 +2947,35 @@ def process_out_cnc_with_tools(
     max_compute_time: int | None = None,
     enhance_opti: int | None = None,
     solutions_dir: str = "OUT_solutions",
-) -> None:
-    """Ejecuta compute_ref para SCARA y ANTHRO en sus carpetas independientes."""
+    max_workers: int | None = None,
+    only_pieces: dict[str, set[str]] | None = None,
+) -> list[dict[str, Any]]:
+    """Ejecuta compute_ref para SCARA y ANTHRO en sus carpetas independientes.
+
+    only_pieces ({robot: piezas}) activa el modo incremental de
+    process_robot_out_cnc_with_tools. Devuelve las filas resueltas en esta
+    ejecución de ambos robots.
+    """
+    _SOLVER_CANCEL.clear()
     runtime_config = load_runtime_config()
     compute_ref_config = runtime_config.get("compute_ref", {}) if isinstance(runtime_config, dict) else {}
-    if max_compute_time is None:
-        max_compute_time = int(compute_ref_config.get("max_compute_time", 2))
     if enhance_opti is None:
         enhance_opti = int(compute_ref_config.get("enhance_opti", 1))
+    if max_workers is None:
+        max_workers = _resolve_max_workers(compute_ref_config.get("max_workers", 1))
+    engine = str(compute_ref_config.get("engine") or "exe").strip().lower()
+    if engine not in ("exe", "native"):
+        if DEBUG_LEVEL >= 1:
+            LogThis("CONFIG", "ERR", f"compute_ref.engine no válido: {engine!r}. Se usa 'exe'.", "")
+        engine = "exe"
+    if max_compute_time is None:
+        # compute_ref.exe recibe segundos enteros; el solver nativo admite decimales.
+        raw_time = compute_ref_config.get("max_compute_time", 2)
+        max_compute_time = float(raw_time) if engine == "native" else int(raw_time)
+    solution_cache = _build_solution_cache(compute_ref_config)
+    tool_selection = _tool_selection_settings()
+    tool_history = _build_tool_history(tool_selection)
+    overlays = _overlay_settings()
 
     robot_settings = get_robot_runtime_settings()
     anthro_root = robot_settings["anthro_root"]
@@ -1999,28 +3001,230 @@ def process_out_cnc_with_tools(
     ]
 
     any_processed = False
+    rows: list[dict[str, Any]] = []
     for robot_label, robot_cnc_dir, robot_solutions_dir, default_tool, allow_other_tools, allowed_tools in robot_jobs:
         if not os.path.isdir(robot_cnc_dir) or not files_finder(robot_cnc_dir, extensions=(".cnc",)):
             print(f"No se encontraron CNCs para {robot_label} en '{robot_cnc_dir}'")
+            if only_pieces is not None:
+                # Ya no queda ninguna pieza del robot: fuera summary e informes anteriores.
+                ensure_clean_dir(robot_solutions_dir)
             continue
         any_processed = True
-        process_robot_out_cnc_with_tools(
-            robot_label=robot_label,
-            cnc_dir=robot_cnc_dir,
-            tools_dir=tools_dir,
-            processed_tools_subdir=processed_tools_subdir,
-            max_compute_time=max_compute_time,
-            enhance_opti=enhance_opti,
-            solutions_dir=robot_solutions_dir,
-            default_tool=default_tool,
-            allow_other_tools=allow_other_tools,
-            allowed_tools=allowed_tools,
-        )
+        try:
+            rows += process_robot_out_cnc_with_tools(
+                robot_label=robot_label,
+                cnc_dir=robot_cnc_dir,
+                tools_dir=tools_dir,
+                processed_tools_subdir=processed_tools_subdir,
+                max_compute_time=max_compute_time,
+                enhance_opti=enhance_opti,
+                solutions_dir=robot_solutions_dir,
+                engine=engine,
+                default_tool=default_tool,
+                allow_other_tools=allow_other_tools,
+                allowed_tools=allowed_tools,
+                max_workers=max_workers,
+                solution_cache=solution_cache,
+                tool_selection=tool_selection,
+                tool_history=tool_history,
+                overlays=overlays,
+                only_pieces=None if only_pieces is None else only_pieces.get(robot_label, set()),
+            )
+        finally:
+            if solution_cache is not None:
+                solution_cache.save()
+            if tool_history is not None:
+                tool_history.save()
 
     if not any_processed:
         print("No se encontraron CNCs en SCARA/OUT_cnc ni ANTHRO/OUT_cnc para procesar con compute_ref.exe")
+    return rows
+
+
+def _prepare_incremental_run(manifest: BatchManifest, files: list[str]) -> tuple[list[str], dict[str, str]]:
+    """Compara INPUT con el manifiesto y borra las salidas de los programas modificados o eliminados.
+
+    Devuelve los programas a procesar (nuevos, modificados o incompletos) y el
+    hash de cada programa de INPUT.
+    """
+    digests = {name: file_sha256(os.path.join("INPUT", name)) for name in files}
+    current = {name for name in files if manifest.is_current(name, digests[name])}
+    pending = [name for name in files if name not in current]
+    stale = [name for name in manifest.programs if name not in current]
+    removed = sum(1 for name in stale if name not in digests)
+
+    _remove_program_outputs(manifest, stale, current)
+
+    mss = (f"Modo incremental: {len(current)} programas sin cambios, {len(pending)} nuevos o modificados, {removed} eliminados")
+    print(mss)
+    if DEBUG_LEVEL >= 1:
+        LogThis("INPUT_PROCESSING", "INF", mss, "")
+    return pending, digests
+
+
+def _remove_program_outputs(manifest: BatchManifest, stale: Iterable[str], kept: Iterable[str]) -> None:
+    """Borra las salidas de los programas stale y los quita del manifiesto.
+
+    Dos programas pueden generar una pieza con el mismo nombre: no se borra
+    nada que también sea salida de un programa de kept.
+    """
+    kept_files: set[str] = set()
+    kept_pieces: set[tuple[str, str]] = set()
+    for name in kept:
+        for piece in manifest.pieces(name):
+            kept_files.update(piece.get("files") or [])
+            kept_pieces.add((piece.get("solutions_dir"), piece.get("piece")))
+
+    for name in list(stale):
+        for piece in manifest.pieces(name):
+            for path in piece.get("files") or []:
+                if path in kept_files:
+                    continue
+                invalidate_piece_geometry(path)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            solutions_dir, piece_stem = piece.get("solutions_dir"), piece.get("piece")
+            if solutions_dir and piece_stem and (solutions_dir, piece_stem) not in kept_pieces:
+                _remove_piece_solutions(solutions_dir, piece_stem)
+        manifest.forget(name)
+
+
+def _process_input_programs(pending: list[str], manifest: BatchManifest | None, digests: dict[str, str]) -> None:
+    """Separa, enruta y dibuja las piezas de cada programa de INPUT y las anota en el manifiesto."""
+    for filename in pending:
+        print(f"\nProcesando '{filename}'...")
+        source_path = os.path.join("INPUT", filename)
+        file_lines = read_gcode_file(source_path)
+        head_info = parse_gcode_head(file_lines)
+
+        # Las piezas se procesan según las va entregando el separador, sin
+        # pasar por una carpeta temporal.
+        produced: list[dict[str, Any]] | None = [] if manifest is not None else None
+        generated = process_generated_pieces(iter_gcode_parts(file_lines), filename, head_info, produced=produced)
+        if manifest is not None:
+            manifest.record(filename, digests[filename], produced)
+
+        if not generated:
+            mss = (f"    No se generaron piezas para '{filename}'")
+            print(mss)
+            if DEBUG_LEVEL >= 2:
+                LogThis("INPUT_PROCESSING", "INF", mss, "")
+            continue
+
+        mss = (f"    {generated} piezas generadas")
+        print(mss)
+        if DEBUG_LEVEL >= 1:
+            LogThis("INPUT_PROCESSING", "INF", mss, "")
+
+
+def _solve_pending_programs(pending: list[str], manifest: BatchManifest | None) -> list[dict[str, Any]]:
+    """Lanza compute_ref para las piezas de los programas procesados y guarda el manifiesto.
+
+    Sin manifiesto se resuelven todas las piezas de OUT_cnc. Devuelve las filas
+    resueltas.
+    """
+    print("\n")
+    mss2 =("=" * 70)
+    mss = ("Procesamiento completo. Iniciando paso adicional con compute_ref.exe...")
+    print(mss2)
+    print(mss)
+    if DEBUG_LEVEL >= 2:
+        LogThis("INPUT_PROCESSING", "INF", mss, "")
+    only_pieces = None
+    if manifest is not None:
+        only_pieces = {"ANTHRO": set(), "SCARA": set()}
+        for filename in pending:
+            for piece in manifest.pieces(filename):
+                only_pieces.setdefault(piece.get("robot"), set()).add(piece.get("piece"))
+    rows = process_out_cnc_with_tools(
+        tools_dir="TOOLS",
+        processed_tools_subdir="processed",
+        max_compute_time=None,
+        enhance_opti=None,
+        only_pieces=only_pieces,
+    )
+
+    if manifest is not None:
+        # Un programa con alguna combinación sin metadata_parser.json (error
+        # antes del solver) se repite en la siguiente ejecución.
+        failed = {
+            Path(str(row.get("piece_file") or "")).stem
+            for row in rows
+            if not os.path.exists(os.path.join(str(row.get("combo_dir") or ""), "metadata_parser.json"))
+        }
+        for filename in pending:
+            if any(piece.get("piece") in failed for piece in manifest.pieces(filename)):
+                manifest.mark_incomplete(filename)
+        manifest.save()
+    return rows
+
+
+def _generate_robot_reports(anthro_root: str, scara_root: str) -> None:
+    """Genera el Excel y el JSON de estadísticas a partir del summary.json de cada robot."""
+    print("\n")
+    print("=" * 70)
+    mss = ("--> Generando informes de estadísticas por robot")
+    print(mss)
+    if DEBUG_LEVEL >= 1:
+        LogThis("INPUT_PROCESSING", "INF", mss, "")
+    for robot_label, robot_root in (("ANTHRO", anthro_root), ("SCARA", scara_root)):
+        summary_path = os.path.join(robot_root, "OUT_solutions", "summary.json")
+        if os.path.exists(summary_path):
+            try:
+                mss = (f"Generando informe para {robot_label}: {summary_path}")
+                print(mss)
+                if DEBUG_LEVEL >= 2:
+                    LogThis("TOOL_REPORTING", "INF", mss, "")
+                with stage_timer("report"):
+                    e01, e02 = generate_tool_report_files(summary_path, output_dir=os.path.join(robot_root, "OUT_solutions", "report"))
+                if e01 is not None:
+                    print(e01)
+                    if DEBUG_LEVEL >= 1:
+                        LogThis("TOOL_REPORTING", "ERR", f"Error {robot_label}: {e01}", "")
+                else:
+                    mss1 = (f"Informe de estadísticas para {robot_label} --> EXCEL generado correctamente")
+                    print("\n" + mss1)
+                    if DEBUG_LEVEL >= 1:
+                        LogThis("TOOL_REPORTING", "INF", mss1, "")
+
+                if e02 is not None:
+                    print(e02)
+                    if DEBUG_LEVEL >= 1:
+                        LogThis("TOOL_REPORTING", "ERR", f"Error {robot_label}: {e02}", "")
+                else:
+                    mss2 = (f"Informe de estadísticas para {robot_label} --> JSON generado correctamente")
+                    print("\n" + mss2)
+                    if DEBUG_LEVEL >= 1:
+                        LogThis("TOOL_REPORTING", "INF", mss2, "")
+
+            except Exception as exc:
+                mss = (f"Error generando informe de estadísticas para {robot_label}: {exc}")
+                print(mss)
+                if DEBUG_LEVEL >= 1:
+                    LogThis("INPUT_PROCESSING", "INF", mss, "")
+        else:
+            mss = (f"No se encontró '{summary_path}' para generar el informe de estadísticas de {robot_label}.")
+            print(mss)
+            if DEBUG_LEVEL >= 1:
+                LogThis("INPUT_PROCESSING", "INF", mss, "")
+
+
+def _write_timings() -> None:
+    """Escribe TIMINGS_PATH con p50/p95/máximo por fase de lo medido hasta ahora."""
+    try:
+        path = write_stage_timings(TIMINGS_PATH)
+    except Exception as exc:
+        if DEBUG_LEVEL >= 1:
+            LogThis("TIMINGS", "ERR", f"No se pudo escribir '{TIMINGS_PATH}': {exc}", "")
+        return
+    if DEBUG_LEVEL >= 2:
+        LogThis("TIMINGS", "INF", f"Tiempos por fase guardados en '{path}'", "")
+
 
 def cleanup_runtime_dirs() -> None:
+    # PARSED_PARTS_TMP_DIR y LOAD_SLOT_CACHE_DIR ya no se usan; se siguen borrando por si quedan restos de versiones anteriores.
     for path in (PARSED_PARTS_TMP_DIR, LOAD_SLOT_CACHE_DIR):
         try:
             if path.exists():
@@ -2037,6 +3241,7 @@ def cleanup_runtime_dirs() -> None:
 def main() -> None:
     """Orquesta el pipeline completo: separación, salidas geométricas y optimización."""
     try:
+        _configure_logging()
         if DEBUG_LEVEL >= 1:
             #LogThis("========================================================", "", "", "")
             LogThis("===================== INICIO ===========================", "", "", "")
@@ -2044,14 +3249,32 @@ def main() -> None:
         if DEBUG_LEVEL >= 2:
             LogThis("RUNTIME_CLEANUP INITIAL", "INF", "Iniciando limpieza de directorios temporales...", "")
 
-        ensure_clean_dir(str(PARSED_PARTS_TMP_DIR))
         robot_settings = get_robot_runtime_settings()
         anthro_root = robot_settings["anthro_root"]
         scara_root = robot_settings["scara_root"]
-        ensure_clean_robot_dirs(anthro_root)
-        ensure_clean_robot_dirs(scara_root)
-        ensure_clean_dir(str(LOAD_SLOT_CACHE_DIR))
+
+        # Modo incremental: solo se procesan los programas nuevos o modificados
+        # mientras no cambien config.json, las herramientas ni el solver.
+        batch = _batch_settings()
+        manifest = None
+        if batch["incremental"]:
+            manifest = BatchManifest.load(batch["manifest"])
+            signature = _batch_signature()
+            if manifest.settings != signature:
+                if manifest.programs:
+                    mss = ("Modo incremental: han cambiado config.json, las herramientas o el solver. Se procesa todo INPUT.")
+                    print(mss)
+                    if DEBUG_LEVEL >= 1:
+                        LogThis("INPUT_PROCESSING", "INF", mss, "")
+                manifest = BatchManifest(batch["manifest"])
+                manifest.settings = signature
+        if manifest is None or not manifest.programs:
+            ensure_clean_robot_dirs(anthro_root)
+            ensure_clean_robot_dirs(scara_root)
         _LOAD_SLOT_SOURCE_CACHE.clear()
+        _PIECE_TIMINGS.clear()
+        _CONTACT_SHEET_TILES.clear()
+        reset_stage_timings()
         
         renamed = change_extension("INPUT")
         if renamed > 0:
@@ -2061,7 +3284,7 @@ def main() -> None:
                 LogThis("INPUT_PROCESSING", "INF", mss, "")
 
         files = files_finder("INPUT", extensions=(".cnc",))
-        if not files:
+        if not files and (manifest is None or not manifest.programs):
             mss = ("No hay archivos .cnc en INPUT")
             print(mss)
             if DEBUG_LEVEL >= 1:
@@ -2073,99 +3296,232 @@ def main() -> None:
         if DEBUG_LEVEL >= 1:
             LogThis("INPUT_PROCESSING", "INF", mss, "")
 
-        for filename in files:
-            print(f"\nProcesando '{filename}'...")
-            source_path = os.path.join("INPUT", filename)
-            file_lines = read_gcode_file(source_path)
-            head_info = parse_gcode_head(file_lines)
+        pending = files
+        digests: dict[str, str] = {}
+        if manifest is not None:
+            pending, digests = _prepare_incremental_run(manifest, files)
 
-            ensure_clean_dir(str(PARSED_PARTS_TMP_DIR))
-            new_piece_files = parse_gcode_parts(file_lines, output_dir=PARSED_PARTS_TMP_DIR)
+        _process_input_programs(pending, manifest, digests)
 
-            if not new_piece_files:
-                mss = (f"    No se generaron piezas en la carpeta temporal interna para '{filename}'")
-                print(mss)
-                if DEBUG_LEVEL >= 2:
-                    LogThis("INPUT_PROCESSING", "INF", mss, "")
-                continue
-
-            mss = (f"    {len(new_piece_files)} piezas generadas")
-            print(mss)
+        if _LOAD_SLOT_REFERENCE_CACHE is not None:
+            _LOAD_SLOT_REFERENCE_CACHE.prune()
             if DEBUG_LEVEL >= 1:
-                LogThis("INPUT_PROCESSING", "INF", mss, "")
-            process_generated_pieces(new_piece_files, filename, head_info, staging_dir=PARSED_PARTS_TMP_DIR)
-            ensure_clean_dir(str(PARSED_PARTS_TMP_DIR))
+                LogThis("LOAD_SLOT", "INF", f"Caché de referencias: {_LOAD_SLOT_REFERENCE_CACHE.stats()}", "")
+
+        _solve_pending_programs(pending, manifest)
+        _generate_robot_reports(anthro_root, scara_root)
 
-        print("\n")
-        mss2 =("=" * 70)
-        mss = ("Procesamiento completo. Iniciando paso adicional con compute_ref.exe...")
-        print(mss2)
-        print(mss)
         if DEBUG_LEVEL >= 2:
-            LogThis("INPUT_PROCESSING", "INF", mss, "")
-        process_out_cnc_with_tools(
-            tools_dir="TOOLS",
-            processed_tools_subdir="processed",
-            max_compute_time=None,
-            enhance_opti=None,
-        )
+            geo_stats = geometry_cache_stats()
+            LogThis("GEOMETRY_CACHE", "INF", f"Caché de geometría: {geo_stats['hits']} aciertos, {geo_stats['misses']} fallos", "")
 
-        print("\n")
-        print("=" * 70)
-        mss = ("--> Generando informes de estadísticas por robot")
-        print(mss)
+    except KeyboardInterrupt:
+        print("\nProceso interrumpido por el usuario.")
         if DEBUG_LEVEL >= 1:
-            LogThis("INPUT_PROCESSING", "INF", mss, "")
-        for robot_label, robot_root in (("ANTHRO", anthro_root), ("SCARA", scara_root)):
-            summary_path = os.path.join(robot_root, "OUT_solutions", "summary.json")
-            if os.path.exists(summary_path):
+            LogThis("MAIN", "WRN", "Proceso interrumpido por el usuario.", "")
+    finally:
+        if DEBUG_LEVEL >= 2:
+            LogThis("RUNTIME_CLEANUP FINAL", "INF", "Iniciando limpieza de directorios temporales...", "")
+        cleanup_runtime_dirs()
+        _write_timings()
+
+
+# -----------------------------------------------------------------------------
+# Modo servicio: vigilancia de INPUT (main.py --watch)
+# -----------------------------------------------------------------------------
+
+def _watch_scanner(
+    watcher: FolderWatcher,
+    jobs: queue.Queue,
+    status: JobStatusBoard,
+    stop: threading.Event,
+    poll_interval_s: float,
+) -> None:
+    """Hilo de sondeo: encola un trabajo por cada programa listo o eliminado.
+
+    Con la cola llena el fichero no se confirma y se vuelve a intentar en el
+    siguiente sondeo; así la memoria no crece si llegan programas más rápido
+    de lo que se procesan.
+    """
+    while not stop.is_set():
+        ready, removed = watcher.poll()
+        for name in ready:
+            if jobs.full():
+                break
+            if name.lower().endswith(".lpp"):
+                # Mismo renombrado que change_extension, ya con el fichero completo.
+                target = os.path.splitext(name)[0] + ".cnc"
                 try:
-                    mss = (f"Generando informe para {robot_label}: {summary_path}")
-                    print(mss)
-                    if DEBUG_LEVEL >= 2:
-                        LogThis("TOOL_REPORTING", "INF", mss, "")
-                    e01, e02 = generate_tool_report_files(summary_path, output_dir=os.path.join(robot_root, "OUT_solutions", "report"))
-                    if e01 is not None:
-                        print(e01)
-                        if DEBUG_LEVEL >= 1:
-                            LogThis("TOOL_REPORTING", "ERR", f"Error {robot_label}: {e01}", "")
-                    else:
-                        mss1 = (f"Informe de estadísticas para {robot_label} --> EXCEL generado correctamente")
-                        print("\n" + mss1)
-                        if DEBUG_LEVEL >= 1:
-                            LogThis("TOOL_REPORTING", "INF", mss1, "")
-
-                    if e02 is not None:
-                        print(e02)
-                        if DEBUG_LEVEL >= 1:
-                            LogThis("TOOL_REPORTING", "ERR", f"Error {robot_label}: {e02}", "")
-                    else:
-                        mss2 = (f"Informe de estadísticas para {robot_label} --> JSON generado correctamente")
-                        print("\n" + mss2)
-                        if DEBUG_LEVEL >= 1:
-                            LogThis("TOOL_REPORTING", "INF", mss2, "")
-                    
-                except Exception as exc:
-                    mss = (f"Error generando informe de estadísticas para {robot_label}: {exc}")
-                    print(mss)
+                    os.replace(os.path.join(watcher.directory, name), os.path.join(watcher.directory, target))
+                except OSError as exc:
                     if DEBUG_LEVEL >= 1:
-                        LogThis("INPUT_PROCESSING", "INF", mss, "")
-            else:
-                mss = (f"No se encontró '{summary_path}' para generar el informe de estadísticas de {robot_label}.")
-                print(mss)
-                if DEBUG_LEVEL >= 1:
-                    LogThis("INPUT_PROCESSING", "INF", mss, "")
+                        LogThis("WATCH", "ERR", f"No se pudo renombrar '{name}' a .cnc: {exc}", "")
+                    continue
+                watcher.forget(name)
+                name = target
+            jobs.put(status.new_job(name, "process"))
+            watcher.acknowledge(name)
+        for name in removed:
+            if jobs.full():
+                break
+            jobs.put(status.new_job(name, "remove"))
+            watcher.forget(name)
+        stop.wait(poll_interval_s)
+
+
+def _run_watch_job(job: dict[str, Any], manifest: BatchManifest, status: JobStatusBoard, anthro_root: str, scara_root: str) -> None:
+    """Procesa o elimina un programa de INPUT y publica el resultado en su JSON de estado."""
+    name = job["program"]
+    source_path = os.path.join("INPUT", name)
+    status.start(job)
+    mss = (f"[{job['job_id']}] {'Procesando' if job['action'] == 'process' else 'Eliminando'} '{name}'")
+    print("\n" + mss)
+    if DEBUG_LEVEL >= 1:
+        LogThis("WATCH", "INF", mss, "")
+    try:
+        others = [program for program in manifest.programs if program != name]
+        pending: list[str] = []
+        if job["action"] == "process" and os.path.exists(source_path):
+            digest = file_sha256(source_path)
+            if manifest.is_current(name, digest):
+                status.finish(job, "unchanged", pieces=len(manifest.pieces(name)))
+                return
+            _remove_program_outputs(manifest, [name], others)
+            # El payload de load_slot de la versión anterior del programa ya no vale.
+            _LOAD_SLOT_SOURCE_CACHE.clear()
+            _PIECE_TIMINGS.clear()
+            _CONTACT_SHEET_TILES.clear()
+            _process_input_programs([name], manifest, {name: digest})
+            pending = [name]
+        else:
+            _remove_program_outputs(manifest, [name], others)
+
+        if _LOAD_SLOT_REFERENCE_CACHE is not None:
+            _LOAD_SLOT_REFERENCE_CACHE.prune()
+        rows = _solve_pending_programs(pending, manifest)
+        _generate_robot_reports(anthro_root, scara_root)
+        status.finish(
+            job,
+            "done",
+            pieces=len(manifest.pieces(name)),
+            combos=len(rows),
+            valid_solutions=sum(1 for row in rows if row.get("solution_valid")),
+        )
+        # En modo servicio timings.json acumula todos los trabajos desde el arranque.
+        _write_timings()
+    except Exception as exc:
+        mss = (f"[{job['job_id']}] Error procesando '{name}': {exc}")
+        print(mss)
+        if DEBUG_LEVEL >= 1:
+            LogThis("WATCH", "ERR", mss, "")
+        manifest.mark_incomplete(name)
+        try:
+            manifest.save()
+        except OSError:
+            pass
+        status.finish(job, "failed", error=str(exc))
+
+
+def watch_input() -> None:
+    """Modo servicio: vigila INPUT y pasa cada programa nuevo, modificado o eliminado por el pipeline.
+
+    El proceso queda en marcha con imports, config.json, herramientas
+    procesadas y cachés de geometría en memoria. Usa siempre el manifiesto del
+    modo incremental para saber qué salidas pertenecen a cada programa. Los
+    cambios de config.json, herramientas o solver requieren reiniciar el
+    servicio.
+    """
+    _configure_logging()
+    settings = _watch_settings()
+    robot_settings = get_robot_runtime_settings()
+    anthro_root = robot_settings["anthro_root"]
+    scara_root = robot_settings["scara_root"]
 
-        ensure_clean_dir(str(PARSED_PARTS_TMP_DIR))
+    if DEBUG_LEVEL >= 1:
+        LogThis("===================== INICIO (watch) ===================", "", "", "")
 
+    batch = _batch_settings()
+    manifest = BatchManifest.load(batch["manifest"])
+    signature = _batch_signature()
+    if manifest.settings != signature:
+        if manifest.programs:
+            mss = ("Modo servicio: han cambiado config.json, las herramientas o el solver. Se procesa todo INPUT.")
+            print(mss)
+            if DEBUG_LEVEL >= 1:
+                LogThis("WATCH", "INF", mss, "")
+        manifest = BatchManifest(batch["manifest"])
+        manifest.settings = signature
+        ensure_clean_robot_dirs(anthro_root)
+        ensure_clean_robot_dirs(scara_root)
+        manifest.save()
+    _LOAD_SLOT_SOURCE_CACHE.clear()
+    os.makedirs("INPUT", exist_ok=True)
+
+    jobs: queue.Queue = queue.Queue(maxsize=settings["max_queue"])
+    status = JobStatusBoard(settings["status_dir"])
+    watcher = FolderWatcher("INPUT", extensions=(".lpp", ".cnc"), settle_s=settings["settle_s"])
+    stop = threading.Event()
+
+    # Programas del manifiesto que se borraron de INPUT con el servicio parado.
+    # Los que siguen en INPUT los entrega el primer sondeo y, si no han
+    # cambiado, terminan como 'unchanged' sin recalcular nada.
+    for name in sorted(manifest.programs):
+        if not os.path.exists(os.path.join("INPUT", name)):
+            _run_watch_job(status.new_job(name, "remove"), manifest, status, anthro_root, scara_root)
+
+    scanner = threading.Thread(
+        target=_watch_scanner,
+        args=(watcher, jobs, status, stop, settings["poll_interval_s"]),
+        name="watch-input",
+        daemon=True,
+    )
+    scanner.start()
+    mss = (f"Vigilando INPUT cada {settings['poll_interval_s']} s (estado de trabajos en '{settings['status_dir']}'). Ctrl+C para salir.")
+    print(mss)
+    if DEBUG_LEVEL >= 1:
+        LogThis("WATCH", "INF", mss, "")
+    try:
+        while True:
+            try:
+                job = jobs.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            _run_watch_job(job, manifest, status, anthro_root, scara_root)
     except KeyboardInterrupt:
-        print("\nProceso interrumpido por el usuario.")
+        print("\nServicio detenido por el usuario.")
         if DEBUG_LEVEL >= 1:
-            LogThis("MAIN", "WRN", "Proceso interrumpido por el usuario.", "")
+            LogThis("WATCH", "WRN", "Servicio detenido por el usuario.", "")
     finally:
-        if DEBUG_LEVEL >= 2:
-            LogThis("RUNTIME_CLEANUP FINAL", "INF", "Iniciando limpieza de directorios temporales...", "")
+        stop.set()
+        scanner.join(timeout=settings["poll_interval_s"] + 1.0)
         cleanup_runtime_dirs()
 
+
+def _parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pipeline principal del parser LPP/CNC.")
+    parser.add_argument("--watch", action="store_true", help="modo servicio: vigila INPUT y procesa cada programa según llega")
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=str(PROFILE_PATH),
+        default=None,
+        metavar="FICHERO",
+        help=f"guarda un perfil cProfile de la ejecución (por defecto {PROFILE_PATH}); se lee con python -m pstats",
+    )
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    main()
+    args = _parse_args()
+    entry_point = watch_input if args.watch else main
+    if args.profile:
+        # cProfile solo ve el hilo principal: con compute_ref.max_workers > 1 el
+        # tiempo de los workers aparece como espera en as_completed.
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(entry_point)
+        finally:
+            profiler.dump_stats(args.profile)
+            print(f"Perfil guardado en '{args.profile}' (python -m pstats {args.profile})")
+    else:
+        entry_point()
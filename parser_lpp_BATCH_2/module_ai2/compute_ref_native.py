@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Native Python gripper-placement solver.
+
+In-process replacement for compute_ref.exe. Reads the same refPartJson,
+tool ``_with_polygons.json`` and material JSON, searches the tool pose
+(x, y, angle) and the set of active pads that maximise holding force while
+every active pad stays fully inside the part ``polyShape``, and writes the
+same ``<ref>_solution.json`` (``toolLocation`` / ``toolActive``) and log
+lines (xmin, fxmin, Flag, Solution saved to) as the executable.
+
+Pad containment is evaluated for all candidate poses at once: the polyShape
+is rasterised once into a clearance map (distance to the part boundary) and
+a pad is valid when the clearance at its centre is at least its radius.
+The chosen pose is re-checked exactly with shapely before writing.
+"""
+
+import json
+import math
+import time
+import numpy as np
+import cv2
+from pathlib import Path
+from typing import Dict, List, Tuple, Optional, Any
+from shapely.geometry import Point, shape
+from shapely.geometry.base import BaseGeometry
+
+
+NATIVE_VERSION = "1.000"
+
+# Error flags shared with compute_ref.exe
+FLAG_OK = 0
+FLAG_CANNOT_LIFT = -6
+FLAG_INVALID_INPUT = -1
+
+# Search parameters
+RASTER_MAX_PX = 1500          # Longest side of the clearance map in pixels
+COARSE_CELLS = 32             # Coarse grid cells along the longest bbox side
+COARSE_ANGLES = (8, 24)       # Coarse angle count for enhance_opti = 0 / 1
+REFINE_KEEP = 6               # Best poses kept between refinement rounds
+IMBALANCE_WEIGHT = 0.5        # Penalty for holding-force centroid away from part centroid
+
+
+def _load_json(path: str) -> Any:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _flatten_tools(payload: Any) -> List[Dict[str, Any]]:
+    """Flatten tool payloads that may come grouped by system."""
+    if isinstance(payload, dict):
+        payload = [payload]
+    tools = []
+    for item in payload or []:
+        if isinstance(item, dict) and isinstance(item.get("tool"), list):
+            tools.extend(t for t in item["tool"] if isinstance(t, dict))
+        elif isinstance(item, dict):
+            tools.append(item)
+    return tools
+
+
+def _part_polygon(ref_payload: Dict[str, Any]) -> BaseGeometry:
+    """Build the part polygon from the refPartJson polyShape."""
+    geometry = ref_payload.get("geometry") if isinstance(ref_payload.get("geometry"), dict) else {}
+    poly_shape = geometry.get("polyShape") or ref_payload.get("polyShape")
+    if not poly_shape:
+        raise ValueError("refPartJson without polyShape")
+    polygon = shape(poly_shape)
+    if not polygon.is_valid:
+        polygon = polygon.buffer(0)
+    if polygon.is_empty:
+        raise ValueError("empty polyShape")
+    return polygon
+
+
+def _polygon_rings(polygon: BaseGeometry) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """Return exterior and interior rings of a (multi)polygon as arrays."""
+    parts = list(polygon.geoms) if hasattr(polygon, "geoms") else [polygon]
+    exteriors = [np.asarray(p.exterior.coords, dtype=float) for p in parts]
+    interiors = [np.asarray(ring.coords, dtype=float) for p in parts for ring in p.interiors]
+    return exteriors, interiors
+
+
+class ClearanceMap:
+    """
+    Rasterised distance-to-boundary of the part, in mm.
+
+    Lookups are vectorised: any array of points returns an array of
+    clearances, with 0 outside the part.
+    """
+
+    def __init__(self, polygon: BaseGeometry, max_px: int = RASTER_MAX_PX):
+        min_x, min_y, max_x, max_y = polygon.bounds
+        self.resolution = max(max(max_x - min_x, max_y - min_y) / float(max_px), 1e-3)
+        self.origin = np.array([min_x, min_y], dtype=float)
+        width = int(math.ceil((max_x - min_x) / self.resolution)) + 3
+        height = int(math.ceil((max_y - min_y) / self.resolution)) + 3
+
+        mask = np.zeros((height, width), dtype=np.uint8)
+        exteriors, interiors = _polygon_rings(polygon)
+        cv2.fillPoly(mask, [self._to_pixels(ring) for ring in exteriors], 1)
+        if interiors:
+            cv2.fillPoly(mask, [self._to_pixels(ring) for ring in interiors], 0)
+
+        distance_px = cv2.distanceTransform(mask, cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+        # One pixel of margin keeps the raster conservative against the exact polygon.
+        self.clearance = np.maximum(distance_px * self.resolution - self.resolution, 0.0).astype(np.float32)
+
+    def _to_pixels(self, ring: np.ndarray) -> np.ndarray:
+        pixels = np.rint((ring - self.origin) / self.resolution + 1.0)
+        return pixels.astype(np.int32).reshape(-1, 1, 2)
+
+    def lookup(self, points: np.ndarray) -> np.ndarray:
+        """Clearance at points with shape (..., 2)."""
+        idx = np.rint((points - self.origin) / self.resolution + 1.0).astype(np.int64)
+        ix = idx[..., 0]
+        iy = idx[..., 1]
+        height, width = self.clearance.shape
+        inside = (ix >= 0) & (ix < width) & (iy >= 0) & (iy < height)
+        out = np.zeros(ix.shape, dtype=np.float32)
+        out[inside] = self.clearance[iy[inside], ix[inside]]
+        return out
+
+
+class PoseEvaluator:
+    """
+    Vectorised scoring of tool poses.
+
+    A pad is active when it lies fully inside the part. Every valid pad is
+    activated, since pad forces are non-negative and activating it can only
+    increase the holding force. The score is the active force, reduced when
+    its centroid moves away from the part centroid.
+    """
+
+    def __init__(self, clearance_map: ClearanceMap, offsets: np.ndarray, radii: np.ndarray,
+                 forces: np.ndarray, part_centroid: np.ndarray, part_scale: float):
+        self.clearance_map = clearance_map
+        self.offsets = offsets
+        self.radii = radii
+        self.forces = forces
+        self.part_centroid = part_centroid
+        self.part_scale = max(part_scale, 1e-9)
+
+    def pad_positions(self, poses: np.ndarray) -> np.ndarray:
+        """Pad centres for poses (N, 3) -> (N, P, 2)."""
+        c = np.cos(poses[:, 2])[:, None]
+        s = np.sin(poses[:, 2])[:, None]
+        ox = self.offsets[None, :, 0]
+        oy = self.offsets[None, :, 1]
+        x = poses[:, 0:1] + c * ox - s * oy
+        y = poses[:, 1:2] + s * ox + c * oy
+        return np.stack((x, y), axis=-1)
+
+    def evaluate(self, poses: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Score poses.
+
+        Args:
+            poses: Array (N, 3) of x, y, angle in radians
+
+        Returns:
+            Tuple of (scores (N,), active mask (N, P), holding force (N,))
+        """
+        pads = self.pad_positions(poses)
+        active = self.clearance_map.lookup(pads) >= self.radii[None, :]
+        scores, holding = self.score(pads, active)
+        return scores, active, holding
+
+    def score(self, pads: np.ndarray, active: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Score and holding force for pad centres (N, P, 2) and active mask (N, P)."""
+        weighted = active * self.forces[None, :]
+        holding = weighted.sum(axis=1)
+
+        safe_holding = np.where(holding > 0, holding, 1.0)
+        centroid = (pads * weighted[..., None]).sum(axis=1) / safe_holding[:, None]
+        imbalance = np.linalg.norm(centroid - self.part_centroid[None, :], axis=1) / self.part_scale
+        scores = holding * (1.0 - IMBALANCE_WEIGHT * np.minimum(imbalance, 1.0))
+        scores = np.where(holding > 0, scores, 0.0)
+        return scores, holding
+
+
+def _grid_poses(min_xy: np.ndarray, max_xy: np.ndarray, step: float, angles: np.ndarray) -> np.ndarray:
+    xs = np.arange(min_xy[0], max_xy[0] + step * 0.5, step)
+    ys = np.arange(min_xy[1], max_xy[1] + step * 0.5, step)
+    gx, gy, ga = np.meshgrid(xs, ys, angles, indexing="ij")
+    return np.column_stack((gx.ravel(), gy.ravel(), ga.ravel()))
+
+
+def _neighbour_poses(seeds: np.ndarray, step: float, angle_step: float) -> np.ndarray:
+    deltas = np.array([-1.0, 0.0, 1.0])
+    dx, dy, da = np.meshgrid(deltas * step, deltas * step, deltas * angle_step, indexing="ij")
+    offsets = np.column_stack((dx.ravel(), dy.ravel(), da.ravel()))
+    return (seeds[:, None, :] + offsets[None, :, :]).reshape(-1, 3)
+
+
+def _top_unique(poses: np.ndarray, scores: np.ndarray, keep: int) -> np.ndarray:
+    order = np.argsort(-scores, kind="stable")
+    _, first = np.unique(np.round(poses[order], 6), axis=0, return_index=True)
+    return poses[order[np.sort(first)][:keep]]
+
+
+def _exact_active(polygon: BaseGeometry, pads: np.ndarray, radii: np.ndarray, active: np.ndarray) -> np.ndarray:
+    """Drop pads that the raster accepted but do not fit inside the exact polygon."""
+    checked = active.copy()
+    for idx in np.flatnonzero(active):
+        circle = Point(float(pads[idx, 0]), float(pads[idx, 1])).buffer(float(radii[idx]), 16)
+        if not polygon.covers(circle):
+            checked[idx] = False
+    return checked
+
+
+def search_pose(polygon: BaseGeometry, tools: List[Dict[str, Any]], max_compute_time: float,
+                enhance_opti: int = 1) -> Dict[str, Any]:
+    """
+    Search the best tool pose for a part.
+
+    Args:
+        polygon: Part polygon in the refPartJson local frame
+        tools: Flattened tool pads with position, diameter and force
+        max_compute_time: Time budget in seconds
+        enhance_opti: 1 enables a finer angular search and refinement
+
+    Returns:
+        Dictionary with pose, active mask, holding force, score and time_limit_hit
+    """
+    started = time.monotonic()
+    deadline = started + max(float(max_compute_time), 0.0)
+
+    offsets = np.array([[float(t.get("position", [0, 0])[0]), float(t.get("position", [0, 0])[1])] for t in tools], dtype=float)
+    radii = np.array([0.5 * float(t.get("diameter", 0.0) or 0.0) for t in tools], dtype=float)
+    forces = np.array([max(float(t.get("force", 0.0) or 0.0), 0.0) for t in tools], dtype=float)
+
+    min_x, min_y, max_x, max_y = polygon.bounds
+    centroid = np.array([polygon.centroid.x, polygon.centroid.y], dtype=float)
+    part_scale = 0.5 * math.hypot(max_x - min_x, max_y - min_y)
+    evaluator = PoseEvaluator(ClearanceMap(polygon), offsets, radii, forces, centroid, part_scale)
+
+    n_angles = COARSE_ANGLES[1] if enhance_opti else COARSE_ANGLES[0]
+    angle_step = 2.0 * math.pi / n_angles
+    step = max(max_x - min_x, max_y - min_y) / COARSE_CELLS
+    angles = np.arange(n_angles) * angle_step
+    poses = _grid_poses(np.array([min_x, min_y]), np.array([max_x, max_y]), step, angles)
+    scores, _, _ = evaluator.evaluate(poses)
+
+    best_idx = int(np.argmax(scores))
+    best_pose = poses[best_idx]
+    best_score = float(scores[best_idx])
+    time_limit_hit = time.monotonic() > deadline
+
+    # Coarse-to-fine refinement around the best poses until the step reaches
+    # the raster resolution or the time budget runs out.
+    min_step = evaluator.clearance_map.resolution
+    seeds = _top_unique(poses, scores, REFINE_KEEP)
+    max_rounds = 12 if enhance_opti else 4
+    for _ in range(max_rounds):
+        if step <= min_step:
+            break
+        if time.monotonic() > deadline:
+            time_limit_hit = True
+            break
+        step *= 0.5
+        angle_step *= 0.5
+        poses = _neighbour_poses(seeds, step, angle_step)
+        scores, _, _ = evaluator.evaluate(poses)
+        round_idx = int(np.argmax(scores))
+        if float(scores[round_idx]) > best_score:
+            best_score = float(scores[round_idx])
+            best_pose = poses[round_idx]
+        seeds = _top_unique(poses, scores, REFINE_KEEP)
+
+    best_pose = best_pose.copy()
+    best_pose[2] = math.atan2(math.sin(best_pose[2]), math.cos(best_pose[2]))
+    _, active, _ = evaluator.evaluate(best_pose[None, :])
+    pads = evaluator.pad_positions(best_pose[None, :])[0]
+    active = _exact_active(polygon, pads, radii, active[0])
+    score, holding = evaluator.score(pads[None, :, :], active[None, :])
+
+    return {
+        "pose": [float(v) for v in best_pose],
+        "active": active,
+        "holding_force": float(holding[0]),
+        "score": float(score[0]),
+        "time_limit_hit": time_limit_hit,
+        "elapsed": time.monotonic() - started,
+    }
+
+
+def part_weight(polygon: BaseGeometry, material: Dict[str, Any]) -> Optional[float]:
+    """Part weight in kg from polygon area (mm2), Thickness (mm) and Density (kg/mm3)."""
+    thickness = material.get("Thickness")
+    density = material.get("Density")
+    if thickness is None or density is None:
+        return None
+    return float(polygon.area) * float(thickness) * float(density)
+
+
+def compute_ref(ref_file: str, tool_file: str, material_file: str, max_compute_time: float = 10.0,
+                enhance_opti: int = 1, output_dir: str = ".", safety_factor: float = 1.0) -> Dict[str, Any]:
+    """
+    Solve one part + tool combination and write the solution JSON.
+
+    Args:
+        ref_file: refPartJson path
+        tool_file: Processed tool JSON path (``_with_polygons.json``)
+        material_file: Material JSON path
+        max_compute_time: Time budget in seconds
+        enhance_opti: Same meaning as in compute_ref.exe
+        output_dir: Directory for ``<ref>_solution.json``
+        safety_factor: Required holding force over part weight
+
+    Returns:
+        Dictionary with flag, xmin, fxmin, time_limit_hit, solution_path and log lines
+    """
+    ref_payload = _load_json(ref_file)
+    tools = _flatten_tools(_load_json(tool_file))
+    material = _load_json(material_file)
+    if not isinstance(material, dict):
+        material = {}
+
+    output_path = Path(output_dir) / f"{Path(ref_file).stem}_solution.json"
+    log: List[str] = []
+
+    try:
+        polygon = _part_polygon(ref_payload)
+        if not tools:
+            raise ValueError("tool JSON without pads")
+    except Exception as exc:
+        log.append(f"Error: {exc}")
+        log.append(f"Flag: {FLAG_INVALID_INPUT}")
+        return {"flag": FLAG_INVALID_INPUT, "xmin": None, "fxmin": None, "time_limit_hit": False,
+                "solution_path": None, "log": log}
+
+    result = search_pose(polygon, tools, max_compute_time, enhance_opti)
+    weight = part_weight(polygon, material)
+    required = (weight or 0.0) * float(safety_factor)
+
+    flag = FLAG_OK
+    if result["holding_force"] <= 0.0 or result["holding_force"] < required:
+        flag = FLAG_CANNOT_LIFT
+
+    solution = dict(ref_payload)
+    if flag == FLAG_OK:
+        solution["toolLocation"] = result["pose"]
+        solution["toolActive"] = [int(v) for v in result["active"]]
+    else:
+        solution["toolLocation"] = []
+        solution["toolActive"] = []
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(solution, f)
+
+    fxmin = -result["score"]
+    if result["time_limit_hit"]:
+        log.append(f"Warning: time limit ({max_compute_time} s) exceeded")
+    log.append(f"xmin: {result['pose']}")
+    log.append(f"fxmin: {fxmin}")
+    log.append(f"Holding force: {result['holding_force']}  Weight: {weight}")
+    log.append(f"Flag: {flag}")
+    log.append(f"Solution saved to: {output_path.name}")
+
+    return {
+        "flag": flag,
+        "xmin": result["pose"],
+        "fxmin": fxmin,
+        "time_limit_hit": result["time_limit_hit"],
+        "solution_path": str(output_path),
+        "log": log,
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 6:
+        print("Usage: python compute_ref_native.py <refFileJson> <toolFileJson> <materialFileJson> <maxComputeTime> <enhanceOpti>")
+        sys.exit(1)
+
+    outcome = compute_ref(sys.argv[1], sys.argv[2], sys.argv[3], float(sys.argv[4]), int(sys.argv[5]))
+    print("\n".join(outcome["log"]))
+    sys.exit(0 if outcome["flag"] == FLAG_OK else 1)
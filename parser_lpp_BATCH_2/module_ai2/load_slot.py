@@ -4,18 +4,40 @@ Python translation of loadSlot.m and all its dependencies.
 Complete standalone implementation for processing TCI G-Code files.
 """
 
+import hashlib
 import json
 import math
 import numpy as np
 import matplotlib.pyplot as plt
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional, Any
-from dataclasses import dataclass, field
-from scipy.spatial import Delaunay
+from dataclasses import dataclass, field, replace
+from scipy.spatial import Delaunay, QhullError
 from scipy.spatial.distance import cdist
 from shapely.geometry import Polygon, MultiPolygon, Point
 from shapely import affinity
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import re
+
+import shapely
+
+try:
+    import triangle  # optional: constrained Delaunay triangulation (Shewchuk's Triangle)
+except ImportError:
+    triangle = None
+
+try:
+    import orjson  # optional: faster JSON writer for write_json_file
+except ImportError:
+    orjson = None
+
+try:
+    from modules.parse_head import iter_header_fields
+except ImportError:  # standalone run: python module_ai2/load_slot.py <file>
+    import sys
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from modules.parse_head import iter_header_fields
 
 
 # Global constants
@@ -23,7 +45,17 @@ CW = -1
 CCW = 1
 INNER_CONT = 1
 OUTER_CONT = 0
-VERSION = "1.004"
+# Part of the reference geometry cache key and of the batch manifest
+# signature: bump it with every change that can alter the
+# generated geometry (sampling, triangulation, Voronoi, JSON content) so the
+# stored results are recomputed.
+VERSION = "1.005"
+
+# Contour sampling for the main reference triangulation
+DEFAULT_DIST_RES = 3
+DEFAULT_MAX_CONTOUR_POINTS = 2000
+
+SEGMENT_TOKEN_PATTERN = re.compile(r'([GBXYZIJQE])([-+]?\d*\.?\d+)')
 
 def polygon_to_geojson(polygon: Polygon) -> Dict[str, Any]:
     """
@@ -39,13 +71,13 @@ def polygon_to_geojson(polygon: Polygon) -> Dict[str, Any]:
         return None
     
     try:
-        # Extract exterior coordinates
-        exterior_coords = list(polygon.exterior.coords)
+        # Extract exterior coordinates (lists, as json.load would return them)
+        exterior_coords = np.asarray(polygon.exterior.coords).tolist()
         
         # Extract interior coordinates (holes)
         holes = []
         for interior in polygon.interiors:
-            holes.append(list(interior.coords))
+            holes.append(np.asarray(interior.coords).tolist())
         
         # Build coordinates array: [exterior, hole1, hole2, ...]
         coordinates = [exterior_coords]
@@ -65,6 +97,9 @@ def polygon_to_geojson(polygon: Polygon) -> Dict[str, Any]:
         return None
 
 
+_JSON_LEAF_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
 def serialize_for_json(obj):
     """
     Convert numpy and other non-serializable objects to JSON-compatible types.
@@ -75,6 +110,9 @@ def serialize_for_json(obj):
     Returns:
         JSON-serializable object
     """
+    if type(obj) in _JSON_LEAF_TYPES:
+        # Most of the tree: plain Python leaves (numpy scalars are subclasses, not these types)
+        return obj
     if isinstance(obj, Polygon):
         # Convert Shapely Polygon to GeoJSON
         return polygon_to_geojson(obj)
@@ -134,11 +172,181 @@ class Segment:
     length: float = 0.0
 
 
-@dataclass
+# Columns of a SegmentStore, named as the Segment fields they hold
+SEGMENT_COLUMNS = ('type', 'subtype', 'initial_pos', 'final_pos', 'arc_center_off',
+                   'arc_center', 'arc_sense', 'power', 'orientation', 'length')
+
+
+class SegmentStore:
+    """
+    Column-wise (structure-of-arrays) segment storage for one part.
+
+    Row i of every column describes one segment. contour_offsets holds the
+    row ranges of the contours as read from the G-code: contour c spans rows
+    contour_offsets[c]:contour_offsets[c + 1]. Post-processed contours address
+    the store through their own row index arrays (Contour.rows), so removing
+    entrance segments or merging contours never copies coordinates.
+    """
+
+    def __init__(self, size: int = 0):
+        self.type = np.full(size, -1, dtype=np.int32)
+        self.subtype = np.full(size, -1, dtype=np.int32)
+        self.initial_pos = np.zeros((size, 3))
+        self.final_pos = np.zeros((size, 3))
+        self.arc_center_off = np.zeros((size, 3))
+        self.arc_center = np.zeros((size, 3))
+        self.arc_sense = np.zeros(size, dtype=np.int8)
+        self.power = np.full(size, -1.0)
+        self.orientation = np.zeros(size)
+        self.length = np.zeros(size)
+        self.contour_offsets = np.zeros(1, dtype=np.intp)
+        self._buffers: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.type)
+
+    @property
+    def total_contours(self) -> int:
+        return len(self.contour_offsets) - 1
+
+    def contour_rows(self, contour_index: int) -> np.ndarray:
+        """Row indexes of a contour as read from the G-code."""
+        return np.arange(self.contour_offsets[contour_index],
+                         self.contour_offsets[contour_index + 1], dtype=np.intp)
+
+    def append(self, segment) -> int:
+        """
+        Append one segment (Segment or SegmentView) as a new row.
+
+        Used for the segments created after reading (micro-joint closing
+        segments, reversed contours) and by the Contour.segments setter.
+        Each column keeps a spare-capacity buffer that doubles when full, and
+        the public column is a view of its first len(self) rows, so n appends
+        cost O(n) instead of re-copying every column each time.
+
+        Returns:
+            Row index of the new segment
+        """
+        row = len(self)
+        for name in SEGMENT_COLUMNS:
+            column = getattr(self, name)
+            buffer = self._buffers.get(name)
+            if (buffer is None or len(buffer) <= row or column.base is not buffer
+                    or column.ctypes.data != buffer.ctypes.data):
+                # First append, buffer full, or the column was replaced from outside.
+                buffer = np.empty((max(2 * row, 16),) + column.shape[1:], dtype=column.dtype)
+                buffer[:row] = column
+                self._buffers[name] = buffer
+            buffer[row] = getattr(segment, name)
+            setattr(self, name, buffer[:row + 1])
+        return row
+
+    def view(self, row: int) -> 'SegmentView':
+        return SegmentView(self, int(row))
+
+
+class SegmentView:
+    """
+    Segment-compatible view of one SegmentStore row.
+
+    Reading a position returns a new list; assign the whole attribute
+    (view.final_pos = [...]) to write it back to the store.
+    """
+    __slots__ = ('store', 'row')
+
+    def __init__(self, store: SegmentStore, row: int):
+        self.store = store
+        self.row = row
+
+    def __repr__(self) -> str:
+        return (f"SegmentView(row={self.row}, type={self.type}, "
+                f"initial_pos={self.initial_pos}, final_pos={self.final_pos})")
+
+    @property
+    def points(self) -> List[List[float]]:
+        return []
+
+
+def _scalar_column(name: str, cast):
+    def getter(view: SegmentView):
+        return cast(getattr(view.store, name)[view.row])
+
+    def setter(view: SegmentView, value) -> None:
+        getattr(view.store, name)[view.row] = value
+
+    return property(getter, setter)
+
+
+def _position_column(name: str):
+    def getter(view: SegmentView) -> List[float]:
+        return getattr(view.store, name)[view.row].tolist()
+
+    def setter(view: SegmentView, value) -> None:
+        getattr(view.store, name)[view.row] = value
+
+    return property(getter, setter)
+
+
+for _name, _cast in (('type', int), ('subtype', int), ('arc_sense', int),
+                     ('power', float), ('orientation', float), ('length', float)):
+    setattr(SegmentView, _name, _scalar_column(_name, _cast))
+for _name in ('initial_pos', 'final_pos', 'arc_center_off', 'arc_center'):
+    setattr(SegmentView, _name, _position_column(_name))
+
+
+class _SegmentColumns:
+    """Plain-list accumulator used by tci_gcode_reader to build one part's SegmentStore."""
+
+    def __init__(self):
+        self.type = []
+        self.subtype = []
+        self.initial_pos = []
+        self.final_pos = []
+        self.arc_center_off = []
+        self.arc_sense = []
+        self.power = []
+        self.contour_starts = []
+
+    def start_contour(self) -> None:
+        self.contour_starts.append(len(self.type))
+
+    def add(self, fields: Tuple) -> None:
+        seg_type, subtype, initial_pos, final_pos, arc_center_off, power, arc_sense = fields
+        self.type.append(seg_type)
+        self.subtype.append(subtype)
+        self.initial_pos.append(initial_pos)
+        self.final_pos.append(final_pos)
+        self.arc_center_off.append(arc_center_off)
+        self.power.append(power)
+        self.arc_sense.append(arc_sense)
+
+    def build(self) -> SegmentStore:
+        store = SegmentStore()
+        n = len(self.type)
+        store.type = np.array(self.type, dtype=np.int32)
+        store.subtype = np.array(self.subtype, dtype=np.int32)
+        store.initial_pos = np.array(self.initial_pos, dtype=float).reshape(n, 3)
+        store.final_pos = np.array(self.final_pos, dtype=float).reshape(n, 3)
+        store.arc_center_off = np.array(self.arc_center_off, dtype=float).reshape(n, 3)
+        store.arc_center = store.initial_pos + store.arc_center_off
+        store.arc_sense = np.array(self.arc_sense, dtype=np.int8)
+        store.power = np.array(self.power, dtype=float)
+        store.orientation = np.zeros(n)
+        store.length = np.zeros(n)
+        store.contour_offsets = np.array(self.contour_starts + [n], dtype=np.intp)
+        return store
+
+
+@dataclass(eq=False)
 class Contour:
-    """Structure for contour information"""
-    segments: List[Segment] = field(default_factory=list)
-    total_segments: int = 0
+    """
+    Structure for contour information.
+
+    The segments live in the part's SegmentStore; rows selects them in
+    traversal order. segments materialises SegmentView objects on demand.
+    """
+    store: Optional[SegmentStore] = None
+    rows: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.intp))
     type: int = -1  # 0: outer contour; 1: inner contour
     points: List[List[float]] = field(default_factory=list)
     entrance_segment: List[Segment] = field(default_factory=list)
@@ -148,11 +356,64 @@ class Contour:
     micro_joint_start: List[float] = field(default_factory=lambda: [0.0, 0.0, 0.0])
     micro_joint_end: List[float] = field(default_factory=lambda: [0.0, 0.0, 0.0])
 
+    @property
+    def total_segments(self) -> int:
+        return len(self.rows)
+
+    @total_segments.setter
+    def total_segments(self, value: int) -> None:
+        # Kept for compatibility: the count always follows rows, it can only shrink it
+        if value > len(self.rows):
+            raise ValueError("total_segments cannot exceed the stored segments")
+        self.rows = self.rows[:value]
+
+    @property
+    def segments(self) -> List[SegmentView]:
+        if self.store is None:
+            return []
+        return [SegmentView(self.store, int(row)) for row in self.rows]
+
+    @segments.setter
+    def segments(self, segments) -> None:
+        if self.store is None:
+            self.store = SegmentStore()
+        rows = []
+        for segment in segments:
+            if isinstance(segment, SegmentView) and segment.store is self.store:
+                rows.append(segment.row)
+            else:
+                rows.append(self.store.append(segment))
+        self.rows = np.array(rows, dtype=np.intp)
+
+    def column(self, name: str) -> np.ndarray:
+        """Values of one SegmentStore column for this contour, in traversal order."""
+        if self.store is None:
+            empty = SegmentStore()
+            return getattr(empty, name)
+        return getattr(self.store, name)[self.rows]
+
+
+@dataclass
+class PartSource:
+    """
+    Raw G-code of a part instance whose geometry has not been built yet.
+
+    Used by tci_gcode_reader(lazy_instances=True): the instance keeps its
+    pose and this line span, and ensure_part_geometry() parses it on demand.
+    """
+    lines: List[str]
+    start: int  # first line after the part header
+    end: int  # next part header (exclusive)
+    motion_line: int = -1  # last motion line before the span (-1: none, start at origin)
+    quality: int = 0  # active quality (G65 B) at the start of the span
+
 
 @dataclass
 class Part:
     """Structure for part information"""
     contours: List[Contour] = field(default_factory=list)
+    segments: SegmentStore = field(default_factory=SegmentStore)
+    source: Optional[PartSource] = None  # set while the geometry is pending (lazy mode)
     area: float = 0.0
     gravity_center: List[float] = field(default_factory=lambda: [0.0, 0.0, 0.0])
     delaunay_tri: Optional[Any] = None
@@ -174,55 +435,59 @@ class PartReference:
     ref_name: str = ''
 
 
-def process_header(tline: str, cutting_unit: CuttingUnit) -> CuttingUnit:
-    """Process header information from G-code file"""
-    split_line = tline.split(':')
-    
-    if len(split_line) < 2:
-        return cutting_unit
-    
-    header_type = split_line[0]
-    content = split_line[1]
-    
-    # Find closing parenthesis
-    close_paren = content.find(' )')
-    if close_paren > 0:
-        value = content[:close_paren].strip()
-    else:
-        return cutting_unit
-    
+def apply_header_field(label: str, value: str, cutting_unit: CuttingUnit) -> CuttingUnit:
+    """
+    Store one header field, as returned by modules.parse_head.iter_header_fields.
+
+    Args:
+        label: Header label (e.g. 'MATERIAL', 'FORMAT')
+        value: Raw text value
+        cutting_unit: Cutting unit being filled
+
+    Returns:
+        The same cutting unit
+    """
+    value = value.strip()
+
     # Skip empty values
     if not value:
         return cutting_unit
-    
+
     try:
-        if header_type == '( MACHINE ':
+        if label == 'MACHINE':
             cutting_unit.machine = value
-        elif header_type == '( MATERIAL ':
+        elif label == 'MATERIAL':
             cutting_unit.material = value
-        elif header_type == '( THICKNESS ':
+        elif label == 'THICKNESS':
             cutting_unit.thickness = float(value)
-        elif header_type == '( REPETITIONS ':
+        elif label == 'REPETITIONS':
             cutting_unit.repetitions = int(value)
-        elif header_type == '( FORMAT ':
+        elif label == 'FORMAT':
             format_parts = value.split('x')
             if len(format_parts) == 2:
                 cutting_unit.height = float(format_parts[0])
                 cutting_unit.width = float(format_parts[1])
-        elif header_type == '( JOB NUMBER ':
+        elif label == 'JOB NUMBER':
             cutting_unit.job_number = value
-        elif header_type == '( PROGRAM NUMBER ':
+        elif label == 'PROGRAM NUMBER':
             cutting_unit.prog_number = int(value)
-        elif header_type == '( TYPE ':
+        elif label == 'TYPE':
             cutting_unit.type = int(value)
-        elif header_type == '( NUMBER OF SHEETS ':
+        elif label == 'NUMBER OF SHEETS':
             cutting_unit.sheets = int(value)
-        elif header_type == '( CUTTING HEADS ':
+        elif label == 'CUTTING HEADS':
             cutting_unit.heads = int(value)
     except (ValueError, TypeError) as e:
         # Skip malformed header values
         pass
-    
+
+    return cutting_unit
+
+
+def process_header(tline: str, cutting_unit: CuttingUnit) -> CuttingUnit:
+    """Process header information from a single G-code line"""
+    for label, value in iter_header_fields([tline]):
+        cutting_unit = apply_header_field(label, value, cutting_unit)
     return cutting_unit
 
 
@@ -317,75 +582,104 @@ def process_part_info(tline: str, part_references: List[PartReference],
     return ref_index, part_index, part_references, cutting_unit
 
 
-def process_segment_info(tline: str, current_pos: List[float], 
-                        current_quality: int) -> Tuple[Segment, List[float], int]:
-    """Process segment information from G-code line"""
-    
-    segment = Segment()
-    
-    # Parse the line using regex
-    import re
-    tokens = re.findall(r'([GBXYZIJQE])([-+]?\d*\.?\d+)', tline)
-    
-    # Filter out empty values
-    tokens = [(coord, value) for coord, value in tokens if value.strip()]
-    
+def parse_segment_line(tline: str, current_pos: List[float],
+                       current_quality: int) -> Tuple[Optional[Tuple], List[float], int]:
+    """
+    Parse one G instruction into plain values, without building a Segment.
+
+    Args:
+        tline: G-code instruction (without the N block number)
+        current_pos: Position before the instruction
+        current_quality: Active quality (B parameter of the last G65)
+
+    Returns:
+        (fields, current_pos, current_quality). fields is None for G65 quality
+        changes, otherwise (type, subtype, initial_pos, final_pos,
+        arc_center_off, power, arc_sense).
+    """
+    tokens = SEGMENT_TOKEN_PATTERN.findall(tline)
+
     # Check if it's a G65 command (quality change)
-    g_commands = [token for token in tokens if token[0] == 'G']
-    if g_commands and g_commands[0][1] == '65':
-        for token in tokens:
-            if token[0] == 'B':
+    g_value = next((value for coord, value in tokens if coord == 'G'), None)
+    if g_value == '65':
+        for coord, value in tokens:
+            if coord == 'B':
                 try:
-                    current_quality = int(float(token[1]))
+                    current_quality = int(float(value))
                 except ValueError:
                     pass
-        return segment, current_pos, current_quality
-    
-    # Process regular G command
-    segment.subtype = current_quality
-    
-    if g_commands:
+        return None, current_pos, current_quality
+
+    seg_type = -1
+    arc_sense = 0
+    if g_value is not None:
         try:
-            segment.type = int(float(g_commands[0][1]))
-            
-            if segment.type == 2:
-                segment.arc_sense = 1
-            elif segment.type == 3:
-                segment.arc_sense = -1
+            seg_type = int(float(g_value))
+
+            if seg_type == 2:
+                arc_sense = 1
+            elif seg_type == 3:
+                arc_sense = -1
         except ValueError:
-            segment.type = -1
-    
-    segment.initial_pos = current_pos.copy()
-    
-    for token in tokens:
-        coord, value = token
+            seg_type = -1
+
+    # Coordinates are not modal: a missing axis stays at 0
+    final_pos = [0.0, 0.0, 0.0]
+    arc_center_off = [0.0, 0.0, 0.0]
+    power = -1.0
+
+    for coord, value in tokens:
         try:
             if coord == 'X':
-                segment.final_pos[0] = float(value)
+                final_pos[0] = float(value)
             elif coord == 'Y':
-                segment.final_pos[1] = float(value)
+                final_pos[1] = float(value)
             elif coord == 'Z':
-                segment.final_pos[2] = float(value)
+                final_pos[2] = float(value)
             elif coord == 'I':
-                segment.arc_center_off[0] = float(value)
+                arc_center_off[0] = float(value)
             elif coord == 'J':
-                segment.arc_center_off[1] = float(value)
+                arc_center_off[1] = float(value)
             elif coord == 'Q':
-                segment.power = float(value)
+                power = float(value)
         except ValueError:
             # Skip invalid numeric values
             continue
-    
+
+    fields = (seg_type, current_quality, current_pos, final_pos, arc_center_off, power, arc_sense)
+    return fields, final_pos, current_quality
+
+
+def process_segment_info(tline: str, current_pos: List[float], 
+                        current_quality: int) -> Tuple[Segment, List[float], int]:
+    """Process segment information from G-code line"""
+
+    fields, new_pos, current_quality = parse_segment_line(tline, current_pos, current_quality)
+    if fields is None:
+        return Segment(), current_pos, current_quality
+
+    seg_type, subtype, initial_pos, final_pos, arc_center_off, power, arc_sense = fields
+    segment = Segment(type=seg_type, subtype=subtype, initial_pos=initial_pos.copy(),
+                      final_pos=final_pos.copy(), arc_center_off=arc_center_off,
+                      arc_sense=arc_sense, power=power)
+
     # Calculate arc center
     segment.arc_center = [
         segment.initial_pos[0] + segment.arc_center_off[0],
         segment.initial_pos[1] + segment.arc_center_off[1],
         segment.initial_pos[2] + segment.arc_center_off[2]
     ]
-    
-    current_pos = segment.final_pos.copy()
-    
-    return segment, current_pos, current_quality
+
+    return segment, new_pos.copy(), current_quality
+
+
+def _endpoint_columns(segments) -> Tuple[np.ndarray, np.ndarray]:
+    """(initial_pos, final_pos) arrays (n x 3) of a Contour or of a list of segments."""
+    if isinstance(segments, Contour):
+        return segments.column('initial_pos'), segments.column('final_pos')
+    initial = np.array([seg.initial_pos for seg in segments], dtype=float).reshape(-1, 3)
+    final = np.array([seg.final_pos for seg in segments], dtype=float).reshape(-1, 3)
+    return initial, final
 
 
 def remove_entrance_segments(contour: Contour, entrance_point_distance: float = 1.0) -> Tuple[Contour, List[int]]:
@@ -397,42 +691,33 @@ def remove_entrance_segments(contour: Contour, entrance_point_distance: float =
     if total_segments <= 1:
         return contour, entrance_segment_indices
     
-    contour_final_point = contour.segments[total_segments - 1].final_pos
+    final_pos = contour.column('final_pos')
+    contour_final_point = final_pos[total_segments - 1]
     
     if total_segments == 2:
-        segment1_final_point = contour.segments[0].final_pos
-        v1 = np.array(segment1_final_point) - np.array(contour_final_point)
-        v1_mod = np.linalg.norm(v1)
+        v1_mod = np.linalg.norm(final_pos[0] - contour_final_point)
         
         if v1_mod < entrance_point_distance:
-            contour.entrance_segment = [contour.segments[0]]
-            contour.segments = contour.segments[1:]
-            contour.total_segments = total_segments - 1
+            contour.entrance_segment = [contour.store.view(contour.rows[0])]
+            contour.rows = contour.rows[1:]
             entrance_segment_indices = [0]
     
     else:
-        segment1_final_point = contour.segments[0].final_pos
-        segment2_final_point = contour.segments[1].final_pos
-        
-        v1 = np.array(segment1_final_point) - np.array(contour_final_point)
-        v2 = np.array(segment2_final_point) - np.array(contour_final_point)
-        
-        v1_mod = np.linalg.norm(v1)
-        v2_mod = np.linalg.norm(v2)
+        v1_mod = np.linalg.norm(final_pos[0] - contour_final_point)
+        v2_mod = np.linalg.norm(final_pos[1] - contour_final_point)
         
         min_mod = min(v1_mod, v2_mod)
         min_index = 0 if v1_mod < v2_mod else 1
         
         if min_mod < entrance_point_distance:
-            contour.entrance_segment = contour.segments[:min_index + 1]
-            contour.segments = contour.segments[min_index + 1:]
-            contour.total_segments = total_segments - (min_index + 1)
+            contour.entrance_segment = [contour.store.view(row) for row in contour.rows[:min_index + 1]]
+            contour.rows = contour.rows[min_index + 1:]
             entrance_segment_indices = list(range(min_index + 1))
     
     return contour, entrance_segment_indices
 
 
-def compute_contour_gap(segments: List[Segment]) -> Tuple[str, float]:
+def compute_contour_gap(segments) -> Tuple[str, float]:
     """
     Compute the effective closing gap of a contour, considering possible
     tangential entry/exit segments.
@@ -443,26 +728,28 @@ def compute_contour_gap(segments: List[Segment]) -> Tuple[str, float]:
       - 'skip_last':  segments[0].initial_pos  vs segments[-2].final_pos  (lead-out)
 
     Args:
-        segments: List of Segment objects
+        segments: Contour, or list of Segment objects
 
     Returns:
         (kind, gap_mm): which combination gave the minimum and the distance
     """
-    if not segments:
+    initial_pos, final_pos = _endpoint_columns(segments)
+    n_segments = len(initial_pos)
+    if not n_segments:
         return ('direct', float('inf'))
 
-    first_start = np.array(segments[0].initial_pos[:2])
-    last_end = np.array(segments[-1].final_pos[:2])
+    first_start = initial_pos[0, :2]
+    last_end = final_pos[-1, :2]
     gap_direct = float(np.linalg.norm(last_end - first_start))
 
     candidates = [('direct', gap_direct)]
 
-    if len(segments) >= 3:
-        second_start = np.array(segments[1].initial_pos[:2])
+    if n_segments >= 3:
+        second_start = initial_pos[1, :2]
         gap_skip_first = float(np.linalg.norm(last_end - second_start))
         candidates.append(('skip_first', gap_skip_first))
 
-        penult_end = np.array(segments[-2].final_pos[:2])
+        penult_end = final_pos[-2, :2]
         gap_skip_last = float(np.linalg.norm(penult_end - first_start))
         candidates.append(('skip_last', gap_skip_last))
 
@@ -471,27 +758,25 @@ def compute_contour_gap(segments: List[Segment]) -> Tuple[str, float]:
 
 def _close_contour_with_segment(contour: Contour) -> Contour:
     """Add a fake linear closing segment from end to start of contour."""
+    store = contour.store
     closing_segment = Segment()
     closing_segment.type = 1  # linear
-    closing_segment.subtype = contour.segments[-1].subtype
-    closing_segment.initial_pos = contour.segments[-1].final_pos.copy()
-    closing_segment.final_pos = contour.segments[0].initial_pos.copy()
+    closing_segment.subtype = int(store.subtype[contour.rows[-1]])
+    closing_segment.initial_pos = store.final_pos[contour.rows[-1]].tolist()
+    closing_segment.final_pos = store.initial_pos[contour.rows[0]].tolist()
     closing_segment.arc_sense = 0
-    contour.segments.append(closing_segment)
-    contour.total_segments += 1
+    contour.rows = np.append(contour.rows, store.append(closing_segment))
     return contour
 
 
 def _strip_tangential_segment(contour: Contour, kind: str) -> Contour:
     """Remove the tangential entry or exit segment identified by kind."""
     if kind == 'skip_first':
-        contour.entrance_segment = [contour.segments[0]]
-        contour.segments = contour.segments[1:]
-        contour.total_segments -= 1
+        contour.entrance_segment = [contour.store.view(contour.rows[0])]
+        contour.rows = contour.rows[1:]
     elif kind == 'skip_last':
-        contour.entrance_segment = [contour.segments[-1]]
-        contour.segments = contour.segments[:-1]
-        contour.total_segments -= 1
+        contour.entrance_segment = [contour.store.view(contour.rows[-1])]
+        contour.rows = contour.rows[:-1]
     return contour
 
 
@@ -513,10 +798,10 @@ def detect_micro_joint(contour: Contour,
     Returns:
         The same contour with micro_joint fields updated
     """
-    if contour.total_segments < 1 or not contour.segments:
+    if contour.total_segments < 1:
         return contour
 
-    kind, gap = compute_contour_gap(contour.segments)
+    kind, gap = compute_contour_gap(contour)
 
     # Already closed or open contour
     if gap <= min_gap or gap >= max_gap:
@@ -526,60 +811,69 @@ def detect_micro_joint(contour: Contour,
     contour = _strip_tangential_segment(contour, kind)
     contour.micro_joint = True
     contour.micro_joint_gap = gap
-    contour.micro_joint_start = contour.segments[0].initial_pos.copy()
-    contour.micro_joint_end = contour.segments[-1].final_pos.copy()
+    contour.micro_joint_start = contour.store.initial_pos[contour.rows[0]].tolist()
+    contour.micro_joint_end = contour.store.final_pos[contour.rows[-1]].tolist()
     contour = _close_contour_with_segment(contour)
     return contour
 
 
-def calc_contour_sense(total_segments: int, segments: List[Segment]) -> Tuple[float, int, List[Segment]]:
-    """Calculate contour sense (CW or CCW)"""
-    
+def calc_contour_sense(total_segments: int, segments) -> Tuple[float, int, Any]:
+    """
+    Calculate contour sense (CW or CCW).
+
+    segments can be a Contour (orientations are written to its SegmentStore)
+    or a list of Segment objects; it is returned unchanged.
+    """
+    if isinstance(segments, Contour):
+        rows = segments.rows[:total_segments]
+        store = segments.store
+        seg_type = store.type[rows]
+        initial_pos = store.initial_pos[rows]
+        final_pos = store.final_pos[rows]
+        arc_center_off = store.arc_center_off[rows]
+    else:
+        seg_type = np.array([seg.type for seg in segments[:total_segments]])
+        initial_pos, final_pos = _endpoint_columns(segments[:total_segments])
+        arc_center_off = np.array([seg.arc_center_off for seg in segments[:total_segments]],
+                                  dtype=float).reshape(-1, 3)
+
     if total_segments == 1:
         # Single segment - must be a circle
-        center_pos = np.array(segments[0].initial_pos) + np.array(segments[0].arc_center_off)
+        center_pos = initial_pos[0] + arc_center_off[0]
         
-        v1 = np.array(segments[0].initial_pos[:2]) - center_pos[:2]
-        v2 = np.array(segments[0].final_pos[:2]) - center_pos[:2]
+        v1 = initial_pos[0, :2] - center_pos[:2]
+        v2 = final_pos[0, :2] - center_pos[:2]
         
         angle_1 = math.atan2(v1[1], v1[0])
         angle_2 = math.atan2(v2[1], v2[0])
         
-        if segments[0].type == 2:  # CW
+        if seg_type[0] == 2:  # CW
             if angle_2 > angle_1:
                 angle_2 = angle_2 - 2 * math.pi
-        elif segments[0].type == 3:  # CCW
+        elif seg_type[0] == 3:  # CCW
             if angle_2 < angle_1:
                 angle_2 = angle_2 + 2 * math.pi
         
         contour_sum_orientation = angle_2 - angle_1
-        segments[0].orientation = angle_1
+        orientation = np.array([angle_1])
     
     else:
-        # Multiple segments
-        vector1 = []
+        # Multiple segments: chord direction of every segment in [0, 2*pi)
+        v = final_pos[:, :2] - initial_pos[:, :2]
+        orientation = np.arctan2(v[:, 1], v[:, 0])
+        orientation = np.where(orientation < 0, 2 * math.pi + orientation, orientation)
         
-        for i in range(total_segments):
-            v = np.array(segments[i].final_pos) - np.array(segments[i].initial_pos)
-            angle_1 = math.atan2(v[1], v[0])
-            
-            if angle_1 < 0:
-                angle_1 = 2 * math.pi + angle_1
-            
-            vector1.append(angle_1)
-            segments[i].orientation = angle_1
-        
-        # Calculate angle differences
-        diff_vector = []
-        for i in range(len(vector1)):
-            next_i = (i + 1) % len(vector1)
-            diff = vector1[next_i] - vector1[i]
-            diff_vector.append(diff)
+        # Angle differences to the next segment, put in [-pi, pi] range
+        diff_vector = np.roll(orientation, -1) - orientation
+        diff_vector_pi = np.arctan2(np.sin(diff_vector), np.cos(diff_vector))
         
-        # Put differences in [-pi, pi] range
-        diff_vector_pi = [math.atan2(math.sin(d), math.cos(d)) for d in diff_vector]
-        
-        contour_sum_orientation = sum(diff_vector_pi)
+        contour_sum_orientation = float(sum(diff_vector_pi.tolist()))
+
+    if isinstance(segments, Contour):
+        store.orientation[rows] = orientation
+    else:
+        for seg, angle in zip(segments, orientation.tolist()):
+            seg.orientation = angle
     
     contour_sense = CCW if contour_sum_orientation > 0 else CW
     
@@ -607,20 +901,120 @@ def tci_move_points(points: np.ndarray, offset: np.ndarray, angle_2d: float,
     return moved_points
 
 
-def tci_gcode_reader(filepath: str) -> Tuple[List[PartReference], CuttingUnit, int]:
-    """Main G-code reader function"""
+def _ensure_part(part_references: List[PartReference], ref_index: int, part_index: int) -> Part:
+    """Return part_references[ref_index].parts[part_index], creating missing entries."""
+    if len(part_references) <= ref_index:
+        part_references.extend(PartReference(parts=[Part()])
+                               for _ in range(ref_index + 1 - len(part_references)))
+    parts = part_references[ref_index].parts
+    if len(parts) <= part_index:
+        parts.extend(Part() for _ in range(part_index + 1 - len(parts)))
+    return parts[part_index]
+
+
+def _gcode_instruction(line: str) -> Optional[str]:
+    """G instruction of a stripped 'N... G...' line, or None for any other line."""
+    if not line.startswith('N'):
+        return None
+    space_idx = line.find(' ')
+    if space_idx <= 0:
+        return None
+    gcode_line = line[space_idx + 1:]
+    return gcode_line if gcode_line.startswith('G') else None
+
+
+def _breaks_contour(fields: Tuple) -> bool:
+    """True for non-cutting instructions (rapid moves, piercing/marking qualities, no power)."""
+    seg_type, subtype, _, _, _, power, _ = fields
+    return (seg_type == 0 or subtype == 4 or
+            subtype == 5 or (subtype == 6 and power < 1))
+
+
+def _add_segment(columns: _SegmentColumns, fields: Tuple, new_contour_flag: bool) -> bool:
+    """
+    Add a cutting segment to the part columns, opening a contour when needed.
+
+    Returns:
+        The updated new_contour_flag (always False)
+    """
+    if new_contour_flag or not columns.contour_starts:
+        columns.start_contour()
+    columns.add(fields)
+    return False
+
+
+def _position_after_line(lines: List[str], motion_line: int) -> List[float]:
+    """Current position after the motion line at index motion_line (origin if -1)."""
+    if motion_line < 0:
+        return [0.0, 0.0, 0.0]
+    _, current_pos, _ = parse_segment_line(_gcode_instruction(lines[motion_line].strip()), [0.0, 0.0, 0.0], 0)
+    return current_pos
+
+
+def _build_part_geometry(part: Part, columns: _SegmentColumns) -> Part:
+    """Turn accumulated columns into the part SegmentStore and its raw contours."""
+    part.segments = columns.build()
+    part.contours = [Contour(store=part.segments, rows=part.segments.contour_rows(c))
+                     for c in range(part.segments.total_contours)]
+    part.total_contours = len(part.contours)
+    part.source = None
+    return part
+
+
+def _read_part_source(source: PartSource) -> _SegmentColumns:
+    """Parse the pending line span of a lazy part instance."""
+    columns = _SegmentColumns()
+    current_pos = _position_after_line(source.lines, source.motion_line)
+    current_quality = source.quality
+    new_contour_flag = True
+
+    for line in source.lines[source.start:source.end]:
+        gcode_line = _gcode_instruction(line.strip())
+        if gcode_line is None:
+            continue
+        fields, current_pos, current_quality = parse_segment_line(
+            gcode_line, current_pos, current_quality
+        )
+        if fields is None:
+            continue
+        if _breaks_contour(fields):
+            new_contour_flag = True
+        elif fields[0] > 0:
+            new_contour_flag = _add_segment(columns, fields, new_contour_flag)
+
+    return columns
+
+
+def tci_gcode_reader(filepath: str, lazy_instances: bool = False) -> Tuple[List[PartReference], CuttingUnit, int]:
+    """
+    Main G-code reader function.
+
+    Cutting segments are accumulated per part in plain lists and turned into
+    one SegmentStore per part at the end; contours are row ranges of it.
+
+    Args:
+        filepath: G-code file
+        lazy_instances: When True, parts introduced by a part header only
+            record their pose and line span (Part.source); call
+            ensure_part_geometry() to build the geometry of the ones needed.
+
+    Returns:
+        (part_references, cutting_unit, n_references)
+    """
     
     # Initialize structures
     cutting_unit = CuttingUnit()
     part_references = [PartReference(parts=[Part()])]
+    part_columns: Dict[Tuple[int, int], _SegmentColumns] = {}
     
     # Initialize processing variables
     current_pos = [0.0, 0.0, 0.0]
     current_quality = 0
-    header_flag = True
     new_contour_flag = True
     ref_index = 0
     part_index = 0
+    lazy_source = None  # PartSource being recorded instead of parsed
+    motion_line = -1
     
     try:
         # Try UTF-8 first, fall back to Latin-1 (covers Windows Spanish files)
@@ -631,73 +1025,71 @@ def tci_gcode_reader(filepath: str) -> Tuple[List[PartReference], CuttingUnit, i
                 break
             except UnicodeDecodeError:
                 continue
-        for line in lines:
+        # Header: parsed once, stops at the first N block
+        for label, value in iter_header_fields(lines):
+            cutting_unit = apply_header_field(label, value, cutting_unit)
+
+        for line_index, line in enumerate(lines):
             line = line.strip()
             if not line:
                 continue
 
-            # Process header
-            if header_flag:
-                cutting_unit = process_header(line, cutting_unit)
-
             # Process part info
+            previous_key = (ref_index, part_index)
             ref_index, part_index, part_references, cutting_unit = process_part_info(
                 line, part_references, cutting_unit, ref_index, part_index, filepath
             )
 
-            # Process instruction lines
-            if line.startswith('N'):
-                header_flag = False
-
-                # Extract G-code part
-                space_idx = line.find(' ')
-                if space_idx > 0:
-                    gcode_line = line[space_idx + 1:]
-                else:
-                    continue
-
-                # Process G instructions
-                if gcode_line.startswith('G'):
-                    segment, current_pos, current_quality = process_segment_info(
-                        gcode_line, current_pos, current_quality
-                    )
-
-                    # Check if segment is cutting
-                    if (segment.type == 0 or segment.subtype == 4 or
-                        segment.subtype == 5 or (segment.subtype == 6 and segment.power < 1)):
-                        new_contour_flag = True
-
-                    elif segment.type > 0:
-                        # Ensure we have enough parts
-                        while len(part_references) <= ref_index:
-                            part_references.append(PartReference(parts=[Part()]))
-
-                        while len(part_references[ref_index].parts) <= part_index:
-                            part_references[ref_index].parts.append(Part())
-
-                        if new_contour_flag:
-                            new_contour_flag = False
-                            part_references[ref_index].parts[part_index].total_contours += 1
-                            contour_index = part_references[ref_index].parts[part_index].total_contours - 1
-
-                            # Ensure contours list is long enough
-                            while len(part_references[ref_index].parts[part_index].contours) <= contour_index:
-                                part_references[ref_index].parts[part_index].contours.append(Contour())
-
-                            part_references[ref_index].parts[part_index].contours[contour_index].total_segments = 1
-                        else:
-                            part_references[ref_index].parts[part_index].contours[contour_index].total_segments += 1
+            if lazy_instances and line.startswith('(P') and (ref_index, part_index) != previous_key:
+                if lazy_source is not None:
+                    lazy_source.end = line_index
+                    lazy_source = None
+                    current_pos = _position_after_line(lines, motion_line)
+                    new_contour_flag = True
+
+                if (ref_index, part_index) not in part_columns:
+                    # Only the pose and the line span are kept for now
+                    part = _ensure_part(part_references, ref_index, part_index)
+                    lazy_source = part.source = PartSource(lines, line_index + 1, len(lines),
+                                                           motion_line, current_quality)
+                continue
 
-                        segment_index = part_references[ref_index].parts[part_index].contours[contour_index].total_segments - 1
+            # Process G instructions
+            gcode_line = _gcode_instruction(line)
+            if gcode_line is None:
+                continue
 
-                        # Ensure segments list is long enough
-                        while len(part_references[ref_index].parts[part_index].contours[contour_index].segments) <= segment_index:
-                            part_references[ref_index].parts[part_index].contours[contour_index].segments.append(Segment())
+            if lazy_source is not None:
+                # Only quality changes and the last motion line matter here
+                if gcode_line.startswith('G65'):
+                    fields, _, current_quality = parse_segment_line(gcode_line, current_pos, current_quality)
+                    if fields is None:
+                        continue
+                motion_line = line_index
+                continue
 
-                        part_references[ref_index].parts[part_index].contours[contour_index].segments[segment_index] = segment
+            fields, current_pos, current_quality = parse_segment_line(
+                gcode_line, current_pos, current_quality
+            )
+            if fields is None:
+                continue
+            motion_line = line_index
+
+            if _breaks_contour(fields):
+                new_contour_flag = True
+            elif fields[0] > 0:
+                key = (ref_index, part_index)
+                columns = part_columns.get(key)
+                if columns is None:
+                    _ensure_part(part_references, ref_index, part_index)
+                    columns = part_columns[key] = _SegmentColumns()
+                new_contour_flag = _add_segment(columns, fields, new_contour_flag)
     
     except FileNotFoundError:
         raise FileNotFoundError(f"File not found: {filepath}")
+
+    for (ref_index, part_index), columns in part_columns.items():
+        _build_part_geometry(part_references[ref_index].parts[part_index], columns)
     
     n_references = len(part_references)
     return part_references, cutting_unit, n_references
@@ -739,7 +1131,7 @@ def reverse_contour_segments(contour: Contour) -> Contour:
     return contour
 
 
-def _compute_inter_contour_gap(segs_a: List[Segment], segs_b: List[Segment]) -> Tuple[str, float]:
+def _compute_inter_contour_gap(segs_a, segs_b) -> Tuple[str, float]:
     """
     Compute the best connection gap between two contours, considering that
     the first or last segment of each contour may be a tangential entry/exit.
@@ -747,17 +1139,21 @@ def _compute_inter_contour_gap(segs_a: List[Segment], segs_b: List[Segment]) ->
     Checks direct endpoints and also skipping first/last segment of each contour.
 
     Args:
-        segs_a: Segments of contour A
-        segs_b: Segments of contour B
+        segs_a: Contour A (or its list of segments)
+        segs_b: Contour B (or its list of segments)
 
     Returns:
         (connection_type, gap_mm): best connection found and its distance.
         connection_type is 'a_end->b_start', 'a_end->b_second', 'a_penult->b_start', etc.
     """
-    a_start = np.array(segs_a[0].initial_pos[:2])
-    a_end = np.array(segs_a[-1].final_pos[:2])
-    b_start = np.array(segs_b[0].initial_pos[:2])
-    b_end = np.array(segs_b[-1].final_pos[:2])
+    initial_a, final_a = _endpoint_columns(segs_a)
+    initial_b, final_b = _endpoint_columns(segs_b)
+    n_a, n_b = len(initial_a), len(initial_b)
+
+    a_start = initial_a[0, :2]
+    a_end = final_a[-1, :2]
+    b_start = initial_b[0, :2]
+    b_end = final_b[-1, :2]
 
     candidates = [
         ('a_end->b_start', float(np.linalg.norm(a_end - b_start))),
@@ -767,29 +1163,29 @@ def _compute_inter_contour_gap(segs_a: List[Segment], segs_b: List[Segment]) ->
     ]
 
     # Skip first segment of B (lead-in on B)
-    if len(segs_b) >= 2:
-        b_second = np.array(segs_b[1].initial_pos[:2])
+    if n_b >= 2:
+        b_second = initial_b[1, :2]
         candidates.append(('a_end->b_second', float(np.linalg.norm(a_end - b_second))))
         candidates.append(('a_start->b_second', float(np.linalg.norm(a_start - b_second))))
 
     # Skip last segment of A (lead-out on A)
-    if len(segs_a) >= 2:
-        a_penult = np.array(segs_a[-2].final_pos[:2])
+    if n_a >= 2:
+        a_penult = final_a[-2, :2]
         candidates.append(('a_penult->b_start', float(np.linalg.norm(a_penult - b_start))))
         candidates.append(('a_penult->b_end', float(np.linalg.norm(a_penult - b_end))))
 
     # Skip both: lead-out A + lead-in B
-    if len(segs_a) >= 2 and len(segs_b) >= 2:
+    if n_a >= 2 and n_b >= 2:
         candidates.append(('a_penult->b_second', float(np.linalg.norm(a_penult - b_second))))
 
     # Skip first segment of A (lead-in on A)
-    if len(segs_a) >= 2:
-        a_second = np.array(segs_a[1].initial_pos[:2])
+    if n_a >= 2:
+        a_second = initial_a[1, :2]
         candidates.append(('b_end->a_second', float(np.linalg.norm(b_end - a_second))))
 
     # Skip last segment of B (lead-out on B)
-    if len(segs_b) >= 2:
-        b_penult = np.array(segs_b[-2].final_pos[:2])
+    if n_b >= 2:
+        b_penult = final_b[-2, :2]
         candidates.append(('a_start->b_penult', float(np.linalg.norm(a_start - b_penult))))
 
     return min(candidates, key=lambda c: c[1])
@@ -821,7 +1217,7 @@ def _merge_open_contour_backwards(part: Part, start_idx: int, merge_distance: fl
             break
 
         # Check if current contour is already closed (considering tangential)
-        _, cur_gap = compute_contour_gap(contour_current.segments)
+        _, cur_gap = compute_contour_gap(contour_current)
 
         if cur_gap < merge_distance:
             break
@@ -835,7 +1231,7 @@ def _merge_open_contour_backwards(part: Part, start_idx: int, merge_distance: fl
 
         # Check connection considering tangential entry/exit
         connection, best_gap = _compute_inter_contour_gap(
-            contour_prev.segments, contour_current.segments
+            contour_prev, contour_current
         )
 
         if best_gap >= merge_distance:
@@ -845,14 +1241,12 @@ def _merge_open_contour_backwards(part: Part, start_idx: int, merge_distance: fl
         # connection is 'a_xxx->b_yyy' where a=prev, b=current
         if 'a_end' in connection or 'a_penult' in connection:
             # prev's end connects to current's start: prev + current
-            new_segments = contour_prev.segments + contour_current.segments
+            new_rows = np.concatenate([contour_prev.rows, contour_current.rows])
         else:
             # current's end connects to prev's start: current + prev
-            new_segments = contour_current.segments + contour_prev.segments
+            new_rows = np.concatenate([contour_current.rows, contour_prev.rows])
 
-        new_contour = Contour()
-        new_contour.segments = new_segments
-        new_contour.total_segments = len(new_segments)
+        new_contour = Contour(store=contour_current.store, rows=new_rows)
 
         # Replace current with merged, remove prev
         del part.contours[prev_idx]
@@ -895,7 +1289,7 @@ def try_merge_micro_joint_contours(part: Part, merge_distance: float = 5.0) -> P
             continue
 
         # Check if contour is closed (considering tangential entry/exit)
-        _, cur_gap = compute_contour_gap(contour.segments)
+        _, cur_gap = compute_contour_gap(contour)
 
         if cur_gap < merge_distance:
             idx -= 1
@@ -911,62 +1305,102 @@ def try_merge_micro_joint_contours(part: Part, merge_distance: float = 5.0) -> P
     return part
 
 
+def process_part(part: Part, total_contours: int, entrance_point_distance: float = 1.0) -> Part:
+    """
+    Post-process one part instance: entrance removal, micro-joint merge,
+    contour type, micro-joint detection and contour sense.
+
+    Args:
+        part: Part with its raw contours
+        total_contours: Contours to strip entrances from. As in MATLAB, the
+            raw contour count of the first instance of the reference.
+        entrance_point_distance: Max distance to treat a segment as entrance
+
+    Returns:
+        The processed part
+    """
+    # First: remove entrance segments from all contours
+    for h in range(total_contours):
+        if h >= len(part.contours):
+            continue
+        part.contours[h], _ = remove_entrance_segments(part.contours[h], entrance_point_distance)
+
+    # Merge contours split by micro-joints (G0 short moves)
+    part = try_merge_micro_joint_contours(part)
+
+    # Recalculate total_contours after potential merge
+    actual_total = part.total_contours
+
+    for h in range(actual_total):
+        if h >= len(part.contours):
+            continue
+
+        # Set contour type
+        if h == actual_total - 1:
+            part.contours[h].type = OUTER_CONT
+        else:
+            part.contours[h].type = INNER_CONT
+
+        # Detect micro-joint on all contours (outer and inner)
+        part.contours[h] = detect_micro_joint(part.contours[h])
+
+        # Calculate contour sense
+        total_segments = part.contours[h].total_segments
+        if total_segments > 0:
+            _, sense, _ = calc_contour_sense(total_segments, part.contours[h])
+            part.contours[h].sense = sense
+
+    return part
+
+
 def tci_process_parts(part_references: List[PartReference],
                      entrance_point_distance: float = 1.0) -> List[PartReference]:
-    """Process parts to remove entrance segments and calculate contour properties"""
+    """
+    Process parts to remove entrance segments and calculate contour properties.
 
-    n_references = len(part_references)
+    Works on the SegmentStore rows of each contour: entrance removal and
+    micro-joint merges only re-slice row indexes. Lazy instances (pending
+    Part.source) are skipped; ensure_part_geometry() processes them later.
+    """
 
-    for i in range(n_references):
-        total_ref_parts = part_references[i].total_ref_parts
-        if not part_references[i].parts:
+    for reference in part_references:
+        if not reference.parts:
             continue
 
-        total_contours = part_references[i].parts[0].total_contours
+        # Raw contour count of the first instance, used for every instance
+        total_contours = reference.parts[0].segments.total_contours
 
-        for k in range(total_ref_parts):
-            if k >= len(part_references[i].parts):
+        for k in range(reference.total_ref_parts):
+            if k >= len(reference.parts) or reference.parts[k].source is not None:
                 continue
+            reference.parts[k] = process_part(reference.parts[k], total_contours, entrance_point_distance)
+    
+    return part_references
 
-            # First: remove entrance segments from all contours
-            for h in range(total_contours):
-                if h >= len(part_references[i].parts[k].contours):
-                    continue
-                part_references[i].parts[k].contours[h], _ = remove_entrance_segments(
-                    part_references[i].parts[k].contours[h], entrance_point_distance
-                )
 
-            # Merge contours split by micro-joints (G0 short moves)
-            part_references[i].parts[k] = try_merge_micro_joint_contours(part_references[i].parts[k])
+def ensure_part_geometry(reference: PartReference, part_index: int,
+                         entrance_point_distance: float = 1.0) -> Part:
+    """
+    Build and process the geometry of a lazily read part instance.
 
-            # Recalculate total_contours after potential merge
-            actual_total = part_references[i].parts[k].total_contours
+    Parts already built are returned as they are, so this is safe to call on
+    any instance. The first instance is built too, because its raw contour
+    count drives entrance removal for every instance.
 
-            for h in range(actual_total):
-                if h >= len(part_references[i].parts[k].contours):
-                    continue
+    Returns:
+        reference.parts[part_index], with contours
+    """
+    part = reference.parts[part_index]
+    if part.source is None:
+        return part
 
-                # Set contour type
-                if h == actual_total - 1:
-                    part_references[i].parts[k].contours[h].type = OUTER_CONT
-                else:
-                    part_references[i].parts[k].contours[h].type = INNER_CONT
-
-                # Detect micro-joint on all contours (outer and inner)
-                part_references[i].parts[k].contours[h] = detect_micro_joint(
-                    part_references[i].parts[k].contours[h]
-                )
-
-                # Calculate contour sense
-                total_segments = part_references[i].parts[k].contours[h].total_segments
-                if total_segments > 0:
-                    _, sense, segments = calc_contour_sense(
-                        total_segments, part_references[i].parts[k].contours[h].segments
-                    )
-                    part_references[i].parts[k].contours[h].sense = sense
-                    part_references[i].parts[k].contours[h].segments = segments
-    
-    return part_references
+    if part_index != 0:
+        ensure_part_geometry(reference, 0, entrance_point_distance)
+
+    part = _build_part_geometry(part, _read_part_source(part.source))
+    total_contours = reference.parts[0].segments.total_contours
+    reference.parts[part_index] = process_part(part, total_contours, entrance_point_distance)
+    return reference.parts[part_index]
 
 
 def matlab2_sorting_bounding_box(matlab_bounding_box: np.ndarray) -> np.ndarray:
@@ -998,10 +1432,34 @@ def matlab2_sorting_bounding_box(matlab_bounding_box: np.ndarray) -> np.ndarray:
     return sorting_bounding_box
 
 
+def _row_norms(vectors: np.ndarray) -> np.ndarray:
+    """Euclidean norm of each row, bit-identical to np.linalg.norm on the single row."""
+    return np.sqrt(np.matmul(vectors[:, None, :], vectors[:, :, None])[:, 0, 0])
+
+
+def _point_layout(counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Owner and local index of every output point, for per-item point counts.
+
+    Returns:
+        (owner, local): owner[p] is the item that point p belongs to and
+        local[p] its position inside that item (0 .. counts[owner] - 1)
+    """
+    owner = np.repeat(np.arange(len(counts)), counts)
+    starts = np.cumsum(counts) - counts
+    local = np.arange(len(owner)) - starts[owner]
+    return owner, local
+
+
 def generate_contour_points(contour, dist_res):
     """
     Generates interpolated points along a contour based on its segments.
-    Adapted for Contour dataclass objects from load_slot module.
+    Reads the segment columns of the contour's SegmentStore.
+
+    All lines are sampled in one batch and all arcs in another, selected
+    with a segment-type mask; the points are then laid out in segment order.
+    The arithmetic mirrors the former per-segment np.linspace version, so
+    the result is bit-identical to it.
     
     Args:
         contour: Contour object containing segments
@@ -1010,117 +1468,173 @@ def generate_contour_points(contour, dist_res):
     Returns:
         numpy array: Generated points for the contour
     """
-    points_list = []
-    
-    # Access segments from the Contour object
-    segments = contour.segments
-    total_segments = contour.total_segments
-    
-    for i in range(total_segments):
-        segment = segments[i]
-        seg_type = segment.type
-        
-        if seg_type == 1:  # Line segment
-            initial_pos = np.array(segment.initial_pos)
-            final_pos = np.array(segment.final_pos)
-            vector = final_pos - initial_pos
-            dist = np.linalg.norm(vector)
-            
-            if dist > 0:
-                dire = vector / dist
-                n_gaps = int(np.floor(dist / dist_res))
-                
-                if n_gaps > 0:
-                    distances = np.linspace(0, dist - dist_res, n_gaps)
-                else:
-                    distances = np.array([0])
-                
-                interp_pos = initial_pos + dire * distances[:, np.newaxis]
-            else:
-                interp_pos = initial_pos.reshape(1, -1)
-                
-        elif seg_type == 2:  # Arc segment (clockwise)
-            initial_pos = np.array(segment.initial_pos)
-            final_pos = np.array(segment.final_pos)
-            arc_center_off = np.array(segment.arc_center_off)
-            
-            center_pos = initial_pos + arc_center_off
-            
-            v1 = initial_pos[:2] - center_pos[:2]
-            v2 = final_pos[:2] - center_pos[:2]
-            
-            r = np.linalg.norm(v2)
-            angle_1 = np.arctan2(v1[1], v1[0])
-            angle_2 = np.arctan2(v2[1], v2[0])
-            
-            if angle_2 >= angle_1:
-                angle_2 = angle_2 - 2 * np.pi
-            
-            angles = np.array([angle_1])
-            Z_col = final_pos[2]
-            
-            if (dist_res <= (2 * r)) and (r > 0):
-                angular_res_aux = 2 * np.arcsin(dist_res / (2 * r))
-                n_gaps = int(np.floor(abs(angle_2 - angle_1) / angular_res_aux))
-                
-                if n_gaps > 1:
-                    angles = np.linspace(angle_1, angle_2, n_gaps + 1)
-                    angles = angles[:n_gaps]
-                    Z_col = np.linspace(center_pos[2], final_pos[2], n_gaps)
-            
-            aux_points = center_pos[:2] + r * np.column_stack([np.cos(angles), np.sin(angles)])
-            
-            if isinstance(Z_col, (int, float)):
-                Z_col = np.full(len(angles), Z_col)
-            
-            interp_pos = np.column_stack([aux_points, Z_col])
-            
-        elif seg_type == 3:  # Arc segment (counterclockwise)
-            initial_pos = np.array(segment.initial_pos)
-            final_pos = np.array(segment.final_pos)
-            arc_center_off = np.array(segment.arc_center_off)
-            
-            center_pos = initial_pos + arc_center_off
-            
-            v1 = initial_pos[:2] - center_pos[:2]
-            v2 = final_pos[:2] - center_pos[:2]
-            
-            r = np.linalg.norm(v2)
-            angle_1 = np.arctan2(v1[1], v1[0])
-            angle_2 = np.arctan2(v2[1], v2[0])
-            
-            if angle_2 <= angle_1:
-                angle_2 = angle_2 + 2 * np.pi
-            
-            angles = np.array([angle_1])
-            Z_col = final_pos[2]
-            
-            if (dist_res <= (2 * r)) and (r > 0):
-                angular_res_aux = 2 * np.arcsin(dist_res / (2 * r))
-                n_gaps = int(np.floor(abs(angle_2 - angle_1) / angular_res_aux))
-                
-                if n_gaps > 1:
-                    angles = np.linspace(angle_1, angle_2, n_gaps + 1)
-                    angles = angles[:n_gaps]
-                    Z_col = np.linspace(center_pos[2], final_pos[2], n_gaps)
-            
-            aux_points = center_pos[:2] + r * np.column_stack([np.cos(angles), np.sin(angles)])
-            
-            if isinstance(Z_col, (int, float)):
-                Z_col = np.full(len(angles), Z_col)
-            
-            interp_pos = np.column_stack([aux_points, Z_col])
-        
-        else:
-            continue
-        
-        points_list.append(interp_pos)
-    
-    # Concatenate all points
-    if points_list:
-        return np.vstack(points_list)
-    else:
-        return np.array([]).reshape(0, 3)
+    seg_types = contour.column('type')
+    initial_positions = contour.column('initial_pos')
+    final_positions = contour.column('final_pos')
+
+    is_line = seg_types == 1
+    is_arc = (seg_types == 2) | (seg_types == 3)
+    counts = np.zeros(len(seg_types), dtype=np.intp)
+
+    # Lines: points every dist_res from the start, the last one at dist - dist_res
+    lines = np.flatnonzero(is_line)
+    line_start = initial_positions[lines]
+    vector = final_positions[lines] - line_start
+    dist = _row_norms(vector)
+    moving = dist > 0
+    dire = np.zeros_like(vector)
+    dire[moving] = vector[moving] / dist[moving, np.newaxis]
+    line_counts = np.where(moving, np.maximum(np.floor(dist / dist_res), 1), 1).astype(np.intp)
+    counts[lines] = line_counts
+
+    # Arcs: points every angular step, Z interpolated from the centre height
+    arcs = np.flatnonzero(is_arc)
+    arc_start = initial_positions[arcs]
+    arc_final = final_positions[arcs]
+    center_pos = arc_start + contour.column('arc_center_off')[arcs]
+    v1 = arc_start[:, :2] - center_pos[:, :2]
+    v2 = arc_final[:, :2] - center_pos[:, :2]
+    r = _row_norms(v2)
+    angle_1 = np.arctan2(v1[:, 1], v1[:, 0])
+    angle_2 = np.arctan2(v2[:, 1], v2[:, 0])
+    clockwise = seg_types[arcs] == 2
+    angle_2 = np.where(clockwise & (angle_2 >= angle_1), angle_2 - 2 * np.pi, angle_2)
+    angle_2 = np.where(~clockwise & (angle_2 <= angle_1), angle_2 + 2 * np.pi, angle_2)
+
+    n_gaps = np.zeros(len(arcs), dtype=np.intp)
+    sampled = (dist_res <= (2 * r)) & (r > 0)
+    angular_res_aux = 2 * np.arcsin(dist_res / (2 * r[sampled]))
+    n_gaps[sampled] = np.floor(np.abs(angle_2[sampled] - angle_1[sampled]) / angular_res_aux)
+    subdivided = n_gaps > 1
+    arc_counts = np.where(subdivided, n_gaps, 1)
+    counts[arcs] = arc_counts
+
+    offsets = np.cumsum(counts) - counts
+    points = np.empty((int(counts.sum()), 3))
+
+    owner, local = _point_layout(line_counts)
+    if len(owner):
+        n = line_counts[owner]
+        stop = dist[owner] - dist_res
+        # np.linspace(0, stop, n): local * step, last point exactly at stop
+        with np.errstate(divide='ignore', invalid='ignore'):
+            distances = np.where(n > 1, local * (stop / (n - 1)), 0.0)
+        distances = np.where((n > 1) & (local == n - 1), stop, distances)
+        points[offsets[lines][owner] + local] = line_start[owner] + dire[owner] * distances[:, np.newaxis]
+
+    owner, local = _point_layout(arc_counts)
+    if len(owner):
+        split = subdivided[owner]
+        gaps = n_gaps[owner]
+        # np.linspace(angle_1, angle_2, n_gaps + 1)[:n_gaps]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = (angle_2[owner] - angle_1[owner]) / gaps
+            angles = np.where(split, local * step + angle_1[owner], angle_1[owner])
+            # np.linspace(center_z, final_z, n_gaps), last point exactly at final_z
+            z_start = center_pos[owner, 2]
+            z_stop = arc_final[owner, 2]
+            z_col = local * ((z_stop - z_start) / (gaps - 1)) + z_start
+        z_col = np.where(local == gaps - 1, z_stop, z_col)
+        z_col = np.where(split, z_col, z_stop)
+
+        rows = offsets[arcs][owner] + local
+        points[rows, :2] = center_pos[owner, :2] + r[owner, np.newaxis] * np.column_stack(
+            [np.cos(angles), np.sin(angles)])
+        points[rows, 2] = z_col
+
+    return points
+
+
+def _adaptive_arc_pieces(sweep: np.ndarray, r: np.ndarray, chord_tolerance: float) -> np.ndarray:
+    """
+    Number of chords per arc so that the sagitta stays below chord_tolerance.
+
+    A chord spanning an angle t on a circle of radius r deviates r * (1 - cos(t / 2))
+    from the arc, so the largest admissible step is 2 * acos(1 - tol / r). The step is
+    never larger than a quarter turn, so full circles keep at least four vertices.
+    """
+    step = np.full(len(r), np.pi / 2)
+    curved = r > chord_tolerance
+    step[curved] = np.minimum(step[curved], 2 * np.arccos(1 - chord_tolerance / r[curved]))
+    return np.maximum(np.ceil(np.abs(sweep) / step), 1).astype(np.intp)
+
+
+def generate_contour_points_adaptive(contour, chord_tolerance: float,
+                                     max_points: int = DEFAULT_MAX_CONTOUR_POINTS) -> np.ndarray:
+    """
+    Discretises a contour with vertices only where the geometry needs them.
+
+    Lines contribute just their start point (the end point is the start of the
+    next segment) and zero-length lines nothing. Arcs are split into the fewest
+    equal chords whose sagitta is below chord_tolerance. If the contour still
+    needs more than max_points vertices the tolerance is doubled until it fits;
+    when the straight edges alone exceed the cap the vertices are decimated
+    evenly, which is the only case where the result leaves the tolerance.
+
+    Args:
+        contour: Contour object containing segments
+        chord_tolerance: Maximum distance (mm) between an arc and its chords
+        max_points: Maximum number of points returned for the contour
+
+    Returns:
+        numpy array: (n, 3) points in segment order, same layout as generate_contour_points
+    """
+    seg_types = contour.column('type')
+    initial_positions = contour.column('initial_pos')
+    final_positions = contour.column('final_pos')
+
+    is_line = seg_types == 1
+    is_arc = (seg_types == 2) | (seg_types == 3)
+    counts = np.zeros(len(seg_types), dtype=np.intp)
+
+    lines = np.flatnonzero(is_line)
+    counts[lines] = _row_norms(final_positions[lines] - initial_positions[lines]) > 0
+
+    arcs = np.flatnonzero(is_arc)
+    arc_start = initial_positions[arcs]
+    arc_final = final_positions[arcs]
+    center_pos = arc_start + contour.column('arc_center_off')[arcs]
+    v1 = arc_start[:, :2] - center_pos[:, :2]
+    v2 = arc_final[:, :2] - center_pos[:, :2]
+    r = _row_norms(v2)
+    angle_1 = np.arctan2(v1[:, 1], v1[:, 0])
+    angle_2 = np.arctan2(v2[:, 1], v2[:, 0])
+    clockwise = seg_types[arcs] == 2
+    angle_2 = np.where(clockwise & (angle_2 >= angle_1), angle_2 - 2 * np.pi, angle_2)
+    angle_2 = np.where(~clockwise & (angle_2 <= angle_1), angle_2 + 2 * np.pi, angle_2)
+    sweep = np.where(r > 0, angle_2 - angle_1, 0.0)
+
+    tolerance = max(float(chord_tolerance), 1e-6)
+    max_points = max(int(max_points), 3)
+    for _ in range(32):
+        arc_counts = _adaptive_arc_pieces(sweep, r, tolerance)
+        counts[arcs] = arc_counts
+        if counts.sum() <= max_points:
+            break
+        tolerance *= 2
+
+    offsets = np.cumsum(counts) - counts
+    points = np.empty((int(counts.sum()), 3))
+    line_rows = lines[counts[lines] > 0]
+    points[offsets[line_rows]] = initial_positions[line_rows]
+
+    owner, local = _point_layout(arc_counts)
+    if len(owner):
+        # Chord k starts at angle_1 + k * sweep / n; the first one at the programmed start point
+        angles = angle_1[owner] + local * (sweep[owner] / arc_counts[owner])
+        z_col = arc_start[owner, 2] + local * ((arc_final[owner, 2] - arc_start[owner, 2]) / arc_counts[owner])
+        rows = offsets[arcs][owner] + local
+        points[rows, :2] = center_pos[owner, :2] + r[owner, np.newaxis] * np.column_stack(
+            [np.cos(angles), np.sin(angles)])
+        points[rows, 2] = z_col
+        first = local == 0
+        points[rows[first]] = arc_start[owner[first]]
+
+    if len(points) > max_points:
+        keep = np.unique(np.linspace(0, len(points) - 1, max_points).round().astype(np.intp))
+        points = points[keep]
+
+    return points
 
 
 def build_polygon_chains_from_constraints(constraints, points):
@@ -1222,6 +1736,104 @@ def is_interior_triangle(tri, points, constraint_polygons):
     return True
 
 
+def interior_triangle_mask(triangles: np.ndarray, points: np.ndarray, constraint_polygons) -> np.ndarray:
+    """
+    Vectorized is_interior_triangle for all triangles at once.
+
+    The centroids are classified with shapely's contains_xy on prepared
+    polygons: first against the exterior, then only the ones still inside
+    are tested against each hole.
+
+    Args:
+        triangles: Triangle indices (N x 3)
+        points: Array of points (M x 2)
+        constraint_polygons: List of polygons [exterior, hole1, hole2, ...]
+
+    Returns:
+        Boolean array (N,), True for interior triangles
+    """
+    if not constraint_polygons or len(triangles) == 0:
+        return np.zeros(len(triangles), dtype=bool)
+
+    centroids = points[triangles].mean(axis=1)
+    x, y = centroids[:, 0], centroids[:, 1]
+
+    exterior = constraint_polygons[0]
+    shapely.prepare(exterior)
+    inside = shapely.contains_xy(exterior, x, y)
+
+    for hole_poly in constraint_polygons[1:]:
+        candidates = np.flatnonzero(inside)
+        if len(candidates) == 0:
+            break
+        shapely.prepare(hole_poly)
+        inside[candidates] = ~shapely.contains_xy(hole_poly, x[candidates], y[candidates])
+
+    return inside
+
+
+def contour_constraints(contour_indices: np.ndarray) -> np.ndarray:
+    """
+    Constraint edges closing every contour ring (MATLAB Const).
+
+    Args:
+        contour_indices: Cumulative point count at the end of each contour
+
+    Returns:
+        Array of edges (N x 2): [j, j + 1] along each contour, then [last, first]
+    """
+    ends = np.asarray(contour_indices, dtype=np.int64)
+    starts = np.concatenate([[0], ends[:-1]])
+    first = np.arange(ends[-1], dtype=np.int64)
+    second = first + 1
+    second[ends - 1] = starts
+    return np.column_stack([first, second])
+
+
+def triangulate_points(P: np.ndarray, Const: np.ndarray, constrained: bool = False) -> np.ndarray:
+    """
+    Triangulate the contour points.
+
+    By default this is an unconstrained scipy Delaunay, as before. With
+    constrained=True and the optional 'triangle' package installed, the
+    contour edges are enforced (constrained Delaunay), so no triangle crosses
+    a hole or the outer boundary. If contours intersect (Triangle would have
+    to add vertices) the unconstrained Delaunay is used instead.
+
+    Returns:
+        Triangle indices into P (N x 3)
+    """
+    if constrained:
+        if triangle is not None:
+            # Triangle needs distinct vertices and non-degenerate, unique segments;
+            # points closer than 1e-6 mm (arc end round-off) count as the same vertex
+            unique_points, first_index, inverse = np.unique(np.round(P, 6), axis=0, return_index=True,
+                                                            return_inverse=True)
+            segments = inverse.reshape(-1)[Const]
+            segments = segments[segments[:, 0] != segments[:, 1]]
+            segments = np.unique(np.sort(segments, axis=1), axis=0)
+            if len(unique_points) < 3 or len(segments) == 0:
+                return np.zeros((0, 3), dtype=np.int64)
+
+            result = triangle.triangulate({'vertices': unique_points, 'segments': segments}, 'p')
+            if 'triangles' not in result:
+                return np.zeros((0, 3), dtype=np.int64)
+
+            if len(result['vertices']) == len(unique_points):
+                # Back to indexes of P
+                return first_index[np.asarray(result['triangles'])]
+            # Intersecting contours: Triangle had to add vertices
+            print("Contours intersect, using unconstrained Delaunay")
+        else:
+            print("Constrained triangulation requested but 'triangle' is not installed, using Delaunay")
+
+    try:
+        return Delaunay(P).simplices
+    except QhullError:
+        # Fewer than three points or all of them collinear (e.g. a part made of marks)
+        return np.zeros((0, 3), dtype=np.int64)
+
+
 def boundingbox(polygon):
     """
     Calculates the bounding box of a polygon.
@@ -1432,7 +2044,8 @@ def circumcenter_triangles(triangles: np.ndarray, points: np.ndarray) -> np.ndar
     
     The circumcenter is the point equidistant from all three vertices of a triangle.
     For a triangle with vertices (x1, y1), (x2, y2), (x3, y3), the circumcenter is calculated
-    using the formula derived from the perpendicular bisectors of the sides.
+    using the formula derived from the perpendicular bisectors of the sides, evaluated
+    for all triangles at once. Degenerate triangles fall back to their centroid.
     
     Args:
         triangles: Array of triangle indices (N x 3)
@@ -1441,40 +2054,45 @@ def circumcenter_triangles(triangles: np.ndarray, points: np.ndarray) -> np.ndar
     Returns:
         circumcenters: Array of circumcenter coordinates (N x 2)
     """
-    n_triangles = len(triangles)
-    circumcenters = np.zeros((n_triangles, 2))
-    
-    for i, tri in enumerate(triangles):
-        # Get the three vertices of the triangle
-        p1 = points[tri[0]]
-        p2 = points[tri[1]]
-        p3 = points[tri[2]]
-        
-        # Convert to homogeneous coordinates for circumcenter calculation
-        ax, ay = p1[0], p1[1]
-        bx, by = p2[0], p2[1]
-        cx, cy = p3[0], p3[1]
-        
-        # Calculate the circumcenter using the determinant method
-        # Based on the formula for circumcenter of a triangle
-        D = 2 * (ax * (by - cy) + bx * (cy - ay) + cx * (ay - by))
-        
-        if abs(D) < 1e-10:
-            # Degenerate triangle - use centroid as fallback
-            circumcenters[i] = np.array([(ax + bx + cx) / 3, (ay + by + cy) / 3])
-        else:
-            ux = ((ax**2 + ay**2) * (by - cy) + (bx**2 + by**2) * (cy - ay) + (cx**2 + cy**2) * (ay - by)) / D
-            uy = ((ax**2 + ay**2) * (cx - bx) + (bx**2 + by**2) * (ax - cx) + (cx**2 + cy**2) * (bx - ax)) / D
-            
-            circumcenters[i] = np.array([ux, uy])
-    
-    return circumcenters
-
-
-def find_main_reference(reference: int, part_references: List[PartReference]) -> Tuple[np.ndarray, int, int]:
+    triangles = np.asarray(triangles, dtype=np.intp).reshape(-1, 3)
+    vertices = np.asarray(points, dtype=float)[triangles]
+    ax, ay = vertices[:, 0, 0], vertices[:, 0, 1]
+    bx, by = vertices[:, 1, 0], vertices[:, 1, 1]
+    cx, cy = vertices[:, 2, 0], vertices[:, 2, 1]
+    
+    # Calculate the circumcenter using the determinant method
+    D = 2 * (ax * (by - cy) + bx * (cy - ay) + cx * (ay - by))
+    degenerate = np.abs(D) < 1e-10
+    safe_D = np.where(degenerate, 1.0, D)
+    
+    # float_power keeps the rounding of the former scalar x**2 (array ** 2 squares instead)
+    a_sq = np.float_power(ax, 2) + np.float_power(ay, 2)
+    b_sq = np.float_power(bx, 2) + np.float_power(by, 2)
+    c_sq = np.float_power(cx, 2) + np.float_power(cy, 2)
+    ux = (a_sq * (by - cy) + b_sq * (cy - ay) + c_sq * (ay - by)) / safe_D
+    uy = (a_sq * (cx - bx) + b_sq * (ax - cx) + c_sq * (bx - ax)) / safe_D
+    
+    # Degenerate triangle - use centroid as fallback
+    ux = np.where(degenerate, (ax + bx + cx) / 3, ux)
+    uy = np.where(degenerate, (ay + by + cy) / 3, uy)
+    
+    return np.column_stack([ux, uy])
+
+
+def find_main_reference(reference: int, part_references: List[PartReference],
+                        constrained: bool = False, chord_tolerance: Optional[float] = None,
+                        max_contour_points: int = DEFAULT_MAX_CONTOUR_POINTS) -> Tuple[np.ndarray, int, int]:
     """
     Find the first valid main reference part and compute its Delaunay triangulation bounding box.
     
+    Args:
+        reference: Reference index
+        part_references: Parts read by tci_gcode_reader
+        constrained: Use a constrained triangulation (needs the 'triangle' package)
+        chord_tolerance: None samples every DEFAULT_DIST_RES mm (MATLAB behaviour);
+            a value in mm switches to generate_contour_points_adaptive
+        max_contour_points: Point cap per contour for the adaptive sampling
+    
     Returns:
         Tuple of (ref_bounding_box, ref_part, computable, polyout)
     """
@@ -1485,11 +2103,11 @@ def find_main_reference(reference: int, part_references: List[PartReference]) ->
     
     while main_ref_not_found and ref_part < len(part_references[reference].parts):
 
-        parts_field = part_references[reference].parts[ref_part]
+        parts_field = ensure_part_geometry(part_references[reference], ref_part)
         
         # Access totalContours from the Part object (it's an attribute, not a nested field)
         totalCon = parts_field.total_contours
-        dist_res = 3
+        dist_res = DEFAULT_DIST_RES
         
         points = []
         contour_lengths = np.zeros(totalCon, dtype=int)
@@ -1502,7 +2120,10 @@ def find_main_reference(reference: int, part_references: List[PartReference]) ->
             contour = contours_field[i]
             
             # Generate contour points using the translated function
-            contour_points = generate_contour_points(contour, dist_res)
+            if chord_tolerance is None:
+                contour_points = generate_contour_points(contour, dist_res)
+            else:
+                contour_points = generate_contour_points_adaptive(contour, chord_tolerance, max_contour_points)
             
             if len(contour_points) > 0:  # Only add non-empty arrays
                 points.append(contour_points)
@@ -1526,21 +2147,7 @@ def find_main_reference(reference: int, part_references: List[PartReference]) ->
         P = points[:, :2]
         
         # Build Const (constraints) - matching MATLAB logic
-        # First contour
-        Const = []
-        for j in range(contour_indices[0] - 1):
-            Const.append([j, j + 1])
-        Const.append([contour_indices[0] - 1, 0])  # Close first contour
-        
-        # Remaining contours
-        for i in range(1, len(contour_indices)):
-            start_idx = contour_indices[i - 1]
-            end_idx = contour_indices[i]
-            for j in range(start_idx, end_idx - 1):
-                Const.append([j, j + 1])
-            Const.append([end_idx - 1, start_idx])  # Close contour
-        
-        Const = np.array(Const)
+        Const = contour_constraints(contour_indices)
         
         # Build polygons from constraints
         # This gives us the exterior polygon and interior holes
@@ -1556,23 +2163,23 @@ def find_main_reference(reference: int, part_references: List[PartReference]) ->
                 print(f"  Hole {i+1}: area = {poly.area:.2f}")
         
         # DT = delaunayTriangulation(P, Const);
-        # In Python, we use scipy.spatial.Delaunay
-        DT = Delaunay(P)
+        # scipy.spatial.Delaunay by default, constrained with 'triangle' if requested
+        simplices = triangulate_points(P, Const, constrained)
         
         delaunayCheck = 0
         polyout = None
         
         # if ~isempty(DT.ConnectivityList)
-        if DT.simplices is not None and len(DT.simplices) > 0:
+        if simplices is not None and len(simplices) > 0:
             # TF = isInterior(DT);
             # Filter triangles that are in the interior
-            TF = np.array([is_interior_triangle(tri, P, constraint_polygons) for tri in DT.simplices])
+            TF = interior_triangle_mask(simplices, P, constraint_polygons)
             
-            print(f"\nTotal triangles: {len(DT.simplices)}")
+            print(f"\nTotal triangles: {len(simplices)}")
             print(f"Interior triangles: {np.sum(TF)}")
             
             # if (DT.ConnectivityList(TF,:) <= length(P))
-            interior_triangles = DT.simplices[TF]
+            interior_triangles = simplices[TF]
 
             if len(interior_triangles) > 0 and np.all(interior_triangles < len(P)):
                 # TR = triangulation(DT.ConnectivityList(TF,:), P);
@@ -1617,13 +2224,543 @@ def find_main_reference(reference: int, part_references: List[PartReference]) ->
     return ref_bounding_box, ref_part, computable, polyout, voronoi
 
 
+# Reference cache: instances of the same part differ by the G-code rounding
+# of their coordinates (0.01 mm), so geometry is matched with a tolerance
+REFERENCE_CACHE_TOLERANCE = 0.1
+REFERENCE_CACHE_MAX_VARIANTS = 16
+
+
+def _reference_frame(part: Part) -> Optional[Tuple[np.ndarray, float]]:
+    """
+    Frame of a part that does not depend on where or how it is nested.
+
+    Origin: mean of all segment start points. Direction: from the origin to
+    the start point of the widest contour (largest spread of its start
+    points) farthest from it, so it does not depend on the order the
+    contours are cut in.
+
+    Returns:
+        (origin, angle), or None if the part has no segments
+    """
+    starts = [contour.column('initial_pos')[:, :2] for contour in part.contours[:part.total_contours]
+              if contour.total_segments > 0]
+    if not starts:
+        return None
+    origin = np.vstack(starts).mean(axis=0)
+    widest = max(starts, key=lambda pts: float(pts.var(axis=0).sum()))
+    offsets = widest - origin
+    far = int(np.argmax(np.hypot(offsets[:, 0], offsets[:, 1])))
+    return origin, math.atan2(offsets[far, 1], offsets[far, 0])
+
+
+def _canonical_contours(part: Part, frame: Tuple[np.ndarray, float]) -> List[Dict[str, Any]]:
+    """
+    Contours of a part in its _reference_frame.
+
+    Each contour gives its segment types, arc senses, perimeter (sum of chords)
+    and the (3, n, 2) start points / end points / arc centres (0 for lines).
+    """
+    origin, angle = frame
+    contours = []
+    for contour in part.contours[:part.total_contours]:
+        seg_types = contour.column('type')
+        coords = np.vstack([contour.column('initial_pos')[:, :2], contour.column('final_pos')[:, :2],
+                            contour.column('arc_center')[:, :2]])
+        local = tci_move_points(coords, np.zeros(2), -angle, origin).reshape(3, -1, 2)
+        local[2, seg_types == 1] = 0.0
+        contours.append({
+            'types': seg_types.astype(int).tolist(),
+            'senses': contour.column('arc_sense').astype(int).tolist(),
+            'perimeter': float(_row_norms(local[1] - local[0]).sum()),
+            'coords': local,
+        })
+    return contours
+
+
+def reference_geometry_key(part: Part, settings: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    Hash of a part's contours, invariant to placement, rotation and contour order.
+
+    Built from what survives the G-code rounding: segment types and arc
+    senses of each contour and its perimeter rounded to 1 mm. Different parts
+    may share a key; _match_cached_reference tells them apart.
+
+    Args:
+        part: Part with geometry (see ensure_part_geometry)
+        settings: Extra values that change the result (sampling, triangulation)
 
-def load_slot(slot_file_lpp: str) -> int:
+    Returns:
+        Hex digest, or None if the part has no segments
+    """
+    frame = _reference_frame(part)
+    if frame is None:
+        return None
+    signature = sorted([c['types'], c['senses'], round(c['perimeter'])] for c in _canonical_contours(part, frame))
+    payload = json.dumps({'version': VERSION, 'settings': settings or {}, 'contours': signature}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _match_cached_reference(variants: List[Dict[str, Any]], contours: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """First stored variant whose contours all match the given ones within REFERENCE_CACHE_TOLERANCE."""
+    for variant in variants:
+        stored = [np.asarray(c, dtype=float) for c in variant.get('contours', [])]
+        if len(stored) != len(contours):
+            continue
+        free = list(range(len(stored)))
+        for contour in contours:
+            coords = contour['coords']
+            match = next((j for j in free if stored[j].shape == coords.shape
+                          and np.abs(stored[j] - coords).max() <= REFERENCE_CACHE_TOLERANCE), None)
+            if match is None:
+                break
+            free.remove(match)
+        else:
+            return variant
+    return None
+
+
+def _reference_to_frame(polyout: Polygon, voronoi: np.ndarray, frame: Tuple[np.ndarray, float],
+                        contours: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Cache variant: contours, polyShape and voronoi of find_main_reference in the part frame."""
+    origin, angle = frame
+    local = shapely.transform(polyout, lambda xy: tci_move_points(xy, np.zeros(2), -angle, origin))
+    return {
+        'contours': [c['coords'].tolist() for c in contours],
+        'polyShape': {
+            'exterior': np.asarray(local.exterior.coords).tolist(),
+            'holes': [np.asarray(ring.coords).tolist() for ring in local.interiors],
+        },
+        'voronoi': tci_move_points(np.asarray(voronoi).reshape(-1, 2), np.zeros(2), -angle, origin).tolist(),
+    }
+
+
+def _reference_from_frame(variant: Dict[str, Any], frame: Tuple[np.ndarray, float]) -> Tuple[Polygon, np.ndarray]:
+    """Inverse of _reference_to_frame: polyShape and voronoi posed on an instance."""
+    origin, angle = frame
+    shape = variant['polyShape']
+    local = Polygon(shape['exterior'], holes=shape['holes'])
+    polyout = shapely.transform(local, lambda xy: tci_move_points(xy, origin, angle, np.zeros(2)))
+    voronoi = tci_move_points(np.asarray(variant['voronoi'], dtype=float).reshape(-1, 2), origin, angle, np.zeros(2))
+    return polyout, voronoi
+
+
+def cached_main_reference(reference: int, part_references: List[PartReference], reference_cache,
+                          settings: Dict[str, Any], **kwargs) -> Tuple[np.ndarray, int, int]:
+    """
+    find_main_reference through a ReferenceCache (module_ai2/reference_cache.py).
+
+    The key is the geometry of the first instance. On a hit the stored
+    polyShape and voronoi are posed on that instance; on a miss
+    find_main_reference runs and its result is added to the key's variants
+    when the first instance was the valid one. Either way the result goes
+    through the part frame, so hits and misses give the same output.
+
+    Args:
+        reference: Reference index
+        part_references: Parts read by tci_gcode_reader
+        reference_cache: ReferenceCache instance
+        settings: Options that change the result, part of the key
+        **kwargs: Passed to find_main_reference
+
+    Returns:
+        Same as find_main_reference
+    """
+    main_part = ensure_part_geometry(part_references[reference], 0)
+    key = reference_geometry_key(main_part, settings)
+    if key is None:
+        return find_main_reference(reference, part_references, **kwargs)
+
+    frame = _reference_frame(main_part)
+    contours = _canonical_contours(main_part, frame)
+    entry = reference_cache.lookup(key) or {}
+    variants = entry.get('variants', [])
+    variant = _match_cached_reference(variants, contours)
+    if variant is not None:
+        polyout, voronoi = _reference_from_frame(variant, frame)
+        print(f"Reference cache hit: {part_references[reference].ref_name}")
+        return np.array(polyout.bounds).reshape(2, 2), 0, 1, polyout, voronoi
+
+    result = find_main_reference(reference, part_references, **kwargs)
+    ref_bounding_box, ref_part, computable, polyout, voronoi = result
+    if not (computable and ref_part == 0):
+        return result
+
+    variant = _reference_to_frame(polyout, voronoi, frame, contours)
+    reference_cache.store(key, {'variants': [variant] + variants[:REFERENCE_CACHE_MAX_VARIANTS - 1]})
+    # Return what a later hit will return, so the refPartJson bytes (and the
+    # solution cache keys derived from them) do not change between runs
+    polyout, voronoi = _reference_from_frame(variant, frame)
+    return np.array(polyout.bounds).reshape(2, 2), 0, 1, polyout, voronoi
+
+
+
+def _reference_entries(part_reference: PartReference, reference: int, cutting_unit: CuttingUnit,
+                       first_part_index: int, reference_options: Dict[str, Any],
+                       reference_cache=None) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    refPartJson entry and partJson entries of one reference.
+
+    References are independent of each other, so this is the unit of work
+    of load_slot_payload, serial or in a process pool.
+
+    Args:
+        part_reference: Reference with its instances
+        reference: Index of the reference in the slot (for the log)
+        cutting_unit: Slot header (thickness, material)
+        first_part_index: Global index of the reference's first instance
+        reference_options: find_main_reference options (constrained, chord_tolerance, max_contour_points)
+        reference_cache: Optional ReferenceCache
+
+    Returns:
+        (ref_entry, part_entries), already JSON-compatible
+    """
+    part_references = [part_reference]
+    part_json = []
+    part_global_index = first_part_index
+
+    # Calculate reference bounding box using helper function
+    if reference_cache is not None:
+        ref_bounding_box, ref_part, computable, polyout, voronoi = cached_main_reference(
+            0, part_references, reference_cache, reference_options, **reference_options)
+    else:
+        ref_bounding_box, ref_part, computable, polyout, voronoi = find_main_reference(
+            0, part_references, **reference_options)
+    
+    # Store reference data for later use
+    ref_data = {
+        'ref_name': part_reference.ref_name,
+        'ref_bounding_box': ref_bounding_box,
+        'ref_part_index': ref_part,
+        'ref_angle': part_reference.parts[ref_part].vangle_2d,
+        'ref_offset': np.array(part_reference.parts[ref_part].rotation_point[:2]),
+        'ref_computable': computable,
+    }
+    
+    # Process all parts for this reference (following MATLAB order)
+    for part_index in range(part_reference.total_ref_parts):
+        print(f"Processing part {part_global_index + 1}: ref={reference}, part={part_index}")
+        
+        # Get part transformation data
+        part_data = part_reference.parts[part_index]
+        part_offset = np.array(part_data.rotation_point[:2])
+        part_angle = part_data.vangle_2d
+        
+        # Create reference sorting bounding box 4 points (same as MATLAB)
+        ref_bounding_box_sorting = matlab2_sorting_bounding_box(ref_data['ref_bounding_box'])
+        
+        # Rotate and translate reference BoundingBox to part Bounding box (same as MATLAB)
+        bounding_box_4pts = tci_move_points(ref_bounding_box_sorting, 
+                                          part_offset, 
+                                          part_angle - ref_data['ref_angle'], 
+                                          ref_data['ref_offset'])
+        
+        # Calculate angle based on bounding box (same as MATLAB)
+        angle = math.atan2(bounding_box_4pts[1, 1] - bounding_box_4pts[0, 1], 
+                         bounding_box_4pts[1, 0] - bounding_box_4pts[0, 0])
+        
+        # Use the 4-point bounding box for partJson
+        bounding_box = bounding_box_4pts.tolist()
+        
+        # Create part JSON entry
+        part_entry = {
+            'reference': ref_data['ref_name'],
+            'boundingBox': bounding_box,  # Already a list of lists
+            'angle': angle
+        }
+        
+        part_json.append(part_entry)
+        print(f"  Added part: {ref_data['ref_name']} at angle {angle}")
+        
+        part_global_index += 1
+
+    # Create refPartJson entries using the same logic as the first pass
+    # Reference Angle and Offset for rotation and translation (same as MATLAB)
+    total_con = part_reference.parts[ref_part].total_contours
+    
+    # Create sorting bounding box (4 points) - same as MATLAB
+    bounding_box = matlab2_sorting_bounding_box(ref_bounding_box)
+    
+    # Calculate angle of part wrt bounding box (same as MATLAB)
+    angle = math.atan2(bounding_box[1, 1] - bounding_box[0, 1], 
+                        bounding_box[1, 0] - bounding_box[0, 0])
+    
+    # Create rotated zero bounding box (same as MATLAB)
+    # rotatedZeroBoundingBox = tci_movePoints(boundingBox,[0 0], -angle, boundingBox(1,:));
+    rotated_zero_bbox = tci_move_points(bounding_box, np.array([0, 0]), -angle, bounding_box[0])
+    
+    # Apply same transformation to polyout polygon using Shapely affinity
+    # Equivalent to tci_move_points(polyout, [0,0], -angle, bounding_box[0])
+    # 1. Translate so rotation point is at origin: subtract bounding_box[0]
+    rotated_polyout = affinity.translate(polyout, xoff=-bounding_box[0][0], yoff=-bounding_box[0][1])
+    
+    # 2. Rotate by -angle around the origin
+    rotated_polyout = affinity.rotate(rotated_polyout, -angle * 180 / np.pi, origin=(0, 0))
+    
+    # Rotate voronoi points
+    rotated_voronoi = tci_move_points(voronoi, np.array([0, 0]), -angle, bounding_box[0])
+
+    # Create reference JSON structure (same as MATLAB)
+    # The geometry (the bulk of refPartJson) is built from JSON types directly,
+    # so only the small header goes through serialize_for_json
+    ref_part_data = serialize_for_json({
+        'reference': part_reference.ref_name,
+        'boundingBox': rotated_zero_bbox,  # Use the rotated bounding box
+        'angle': 0,  # Always 0 for reference as in MATLAB
+        'computable': computable,
+        'toolLocation': [],
+        'toolActive': [],
+        'thickness': cutting_unit.thickness,
+        'material': cutting_unit.material,
+    })
+    ref_part_data['geometry'] = {
+        'totalContours': serialize_for_json(total_con),
+        'contours': [],
+        'voronoi': rotated_voronoi.tolist(),
+        'polyShape': serialize_for_json(rotated_polyout)
+    }
+    
+    # Add detailed contour geometry (same as MATLAB)
+    # tci_movePoints(pos, [0 0], -angle, boundingBox(1,:)) for every position of
+    # the part at once: all contours are stacked in one (N,2) block (initial,
+    # final and arc centre of each segment, then the micro-joint ends) and the
+    # JSON is built from slices of the result. arcCenterOff is a vector, so it
+    # is rotated about [0,0] in a block of its own, as in MATLAB.
+    contours = part_reference.parts[ref_part].contours[:total_con]
+    origin = np.array([0, 0])
+    positions = []
+    offsets = []
+    for contour in contours:
+        store, rows = contour.store, contour.rows
+        positions += [store.initial_pos[rows, :2], store.final_pos[rows, :2], store.arc_center[rows, :2]]
+        offsets.append(store.arc_center_off[rows, :2])
+        if contour.micro_joint:
+            positions.append(np.array([contour.micro_joint_start[:2], contour.micro_joint_end[:2]], dtype=float))
+    moved_positions = (tci_move_points(np.concatenate(positions), origin, -angle, bounding_box[0]).tolist()
+                       if positions else [])
+    moved_offsets = tci_move_points(np.concatenate(offsets), origin, -angle, origin).tolist() if offsets else []
+
+    contours_list = []
+    position_cursor = 0
+    offset_cursor = 0
+    for contour in contours:
+        store, rows = contour.store, contour.rows
+        n = len(rows)
+        initial_pos = moved_positions[position_cursor:position_cursor + n]
+        final_pos = moved_positions[position_cursor + n:position_cursor + 2 * n]
+        arc_center = moved_positions[position_cursor + 2 * n:position_cursor + 3 * n]
+        arc_center_off = moved_offsets[offset_cursor:offset_cursor + n]
+        position_cursor += 3 * n
+        offset_cursor += n
+
+        contour_data = serialize_for_json({
+            'totalSegments': contour.total_segments,
+            'type': contour.type,
+            'sense': contour.sense
+        })
+
+        # Add micro-joint info if detected
+        if contour.micro_joint:
+            contour_data['microJoint'] = True
+            contour_data['microJointGap'] = serialize_for_json(contour.micro_joint_gap)
+            contour_data['microJointStart'] = moved_positions[position_cursor]
+            contour_data['microJointEnd'] = moved_positions[position_cursor + 1]
+            position_cursor += 2
+
+        # Add segments with transformed coordinates (same as MATLAB)
+        segments_list = [
+            {
+                'type': seg_type,
+                'initialPos': initial_pos[k],
+                'finalPos': final_pos[k],
+                'arcCenter': arc_center[k],
+                'arcCenterOff': arc_center_off[k],
+                'arcSense': arc_sense
+            }
+            for k, (seg_type, arc_sense) in enumerate(zip(store.type[rows].tolist(), store.arc_sense[rows].tolist()))
+        ]
+
+        # MATLAB: single segment becomes object, multiple segments become array
+        if len(segments_list) == 1:
+            contour_data['segments'] = segments_list[0]
+        else:
+            contour_data['segments'] = segments_list
+
+        contours_list.append(contour_data)
+    
+    # MATLAB: single contour becomes object, multiple contours become array
+    if len(contours_list) == 1:
+        ref_part_data['geometry']['contours'] = contours_list[0]
+    else:
+        ref_part_data['geometry']['contours'] = contours_list
+    
+    return ref_part_data, serialize_for_json(part_json)
+
+
+def _reference_entries_task(args: Tuple) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """_reference_entries with packed arguments, for ProcessPoolExecutor.map."""
+    return _reference_entries(*args)
+
+
+def _detached_reference(reference: PartReference) -> PartReference:
+    """
+    Copy of a reference whose lazy instances keep only their own G-code lines.
+
+    PartSource.lines is the whole program, shared by every instance; sending
+    it to a worker process per reference would pickle the program each time.
+    """
+    parts = []
+    for part in reference.parts:
+        source = part.source
+        if source is not None:
+            head = [source.lines[source.motion_line]] if source.motion_line >= 0 else []
+            part = replace(part, source=PartSource(
+                lines=head + source.lines[source.start:source.end],
+                start=len(head),
+                end=len(head) + source.end - source.start,
+                motion_line=0 if head else -1,
+                quality=source.quality,
+            ))
+        parts.append(part)
+    return replace(reference, parts=parts)
+
+
+def load_slot_payload(slot_file_lpp: str, lazy_instances: bool = True,
+                      constrained_triangulation: bool = False,
+                      chord_tolerance: Optional[float] = None,
+                      max_contour_points: int = DEFAULT_MAX_CONTOUR_POINTS,
+                      reference_cache=None,
+                      workers: int = 1) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Loads and processes a TCI G-Code slot file in memory.
+
+    Same processing as load_slot, without writing anything: the lists are
+    exactly what json.load would return for refPartJson and partJson.
+    Does not change the working directory, so it can run from threads.
+
+    Args:
+        slot_file_lpp: Path to the .lpp file
+        lazy_instances: Build geometry only for the instance used as main
+            reference; the other copies keep just their pose (partJson)
+        constrained_triangulation: Triangulate the main reference with the
+            contour edges enforced (optional 'triangle' package)
+        chord_tolerance: Sample contours to this chord error (mm) instead of
+            every DEFAULT_DIST_RES mm; None keeps the fixed sampling
+        max_contour_points: Point cap per contour for the adaptive sampling
+        reference_cache: Optional ReferenceCache (module_ai2/reference_cache.py)
+            reused across programs for the main reference geometry
+        workers: Processes for the per-reference work (triangulation and
+            export); 1 runs it in this process. Output is the same either way
+
+    Returns:
+        (ref_list, part_list): refPartJson and partJson contents
+
+    Raises:
+        FileNotFoundError: If the slot file does not exist
+    """
+    if not Path(slot_file_lpp).exists():
+        raise FileNotFoundError(f"Slot file not found: {slot_file_lpp}")
+
+    print(f"Reading G-Code file: {slot_file_lpp}")
+    # Process G-Code
+    part_references, cutting_unit, n_references = tci_gcode_reader(
+        slot_file_lpp, lazy_instances=lazy_instances)
+    print(f"Found {n_references} references")
+    
+    print("Processing parts...")
+    part_references = tci_process_parts(part_references)        
+    
+    # Process references from slot
+    total_refs = len(part_references)
+    reference_options = {
+        'constrained': constrained_triangulation,
+        'chord_tolerance': chord_tolerance,
+        'max_contour_points': max_contour_points,
+    }
+
+    # Process references and parts following MATLAB order
+    first_part_indices = np.cumsum([0] + [ref.total_ref_parts for ref in part_references[:-1]]).tolist()
+    tasks = [(part_references[reference], reference, cutting_unit, first_part_indices[reference],
+              reference_options, reference_cache) for reference in range(total_refs)]
+
+    if workers > 1 and total_refs > 1:
+        # Every reference is independent; map() keeps the reference order
+        tasks = [(_detached_reference(task[0]),) + task[1:] for task in tasks]
+        with ProcessPoolExecutor(max_workers=min(workers, total_refs)) as executor:
+            results = list(executor.map(_reference_entries_task, tasks))
+    else:
+        results = [_reference_entries(*task) for task in tasks]
+
+    ref_part_json = [ref_entry for ref_entry, _ in results]
+    part_json = [part_entry for _, part_entries in results for part_entry in part_entries]
+    return ref_part_json, part_json
+
+
+def write_json_file(path, payload: Any, indent: Optional[int] = None) -> None:
+    """
+    Writes payload as UTF-8 JSON, compact unless indent is given.
+
+    Uses orjson when it is installed (any indent is then 2 spaces, the only
+    width orjson supports, and numpy arrays are written natively), otherwise
+    the json module. Both read back the same with json.load.
+
+    Args:
+        path: Destination file
+        payload: JSON-compatible object (see serialize_for_json)
+        indent: Indentation for a human-readable file; None writes compact JSON
+    """
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | (orjson.OPT_INDENT_2 if indent is not None else 0)
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(payload, option=option))
+        return
+
+    separators = (',', ':') if indent is None else None
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=indent, separators=separators, ensure_ascii=False)
+
+
+def write_load_slot_json(slot_name: str, ref_list: List[Dict[str, Any]], part_list: List[Dict[str, Any]],
+                         output_dir: Optional[str] = None, indent: Optional[int] = None) -> Tuple[Path, Path]:
+    """
+    Writes refPartJson_<slot>.json and partJson_<slot>.json.
+
+    Args:
+        slot_name: Slot file stem
+        ref_list, part_list: Output of load_slot_payload
+        output_dir: Destination folder (None = working directory)
+        indent: JSON indentation; None writes compact JSON
+
+    Returns:
+        (ref_path, parts_path)
+    """
+    folder = Path(output_dir) if output_dir is not None else Path('.')
+    ref_path = folder / f"refPartJson_{slot_name}.json"
+    parts_path = folder / f"partJson_{slot_name}.json"
+
+    write_json_file(ref_path, ref_list, indent=indent)
+    write_json_file(parts_path, part_list, indent=indent)
+
+    return ref_path, parts_path
+
+
+def load_slot(slot_file_lpp: str, lazy_instances: bool = True,
+              constrained_triangulation: bool = False,
+              chord_tolerance: Optional[float] = None,
+              max_contour_points: int = DEFAULT_MAX_CONTOUR_POINTS,
+              reference_cache=None, output_dir: Optional[str] = None,
+              indent: Optional[int] = None, workers: int = 1) -> int:
     """
     Main function to load and process TCI G-Code slot file.
+
+    Runs load_slot_payload and writes refPartJson_<slot>.json and
+    partJson_<slot>.json (see write_load_slot_json).
     
     Args:
         slot_file_lpp: Path to the .lpp file
+        lazy_instances, constrained_triangulation, chord_tolerance,
+        max_contour_points, reference_cache, workers: See load_slot_payload
+        output_dir: Folder for the JSON files (None = working directory)
+        indent: JSON indentation; None writes compact JSON
         
     Returns:
         error_flag: 0 = success, negative = error
@@ -1636,204 +2773,15 @@ def load_slot(slot_file_lpp: str) -> int:
     if not slot_path.exists():
         return -1  # Slot file not found
     
-    slot_name = slot_path.stem
-    
     try:
-        print(f"Reading G-Code file: {slot_file_lpp}")
-        # Process G-Code
-        part_references, cutting_unit, n_references = tci_gcode_reader(slot_file_lpp)
-        print(f"Found {n_references} references")
-        
-        print("Processing parts...")
-        part_references = tci_process_parts(part_references)        
-        
-        # Process references from slot
-        total_refs = len(part_references)
-        ref_part_json = []
-        part_json = []
-        
-        # Process references and parts following MATLAB order
-        part_global_index = 0
-        
-        # First pass: Process references (for refPartJson)
-        for reference in range(total_refs):
-            # Calculate reference bounding box using helper function
-            ref_bounding_box, ref_part, computable, polyout, voronoi = find_main_reference(reference, part_references)
-            
-            # Store reference data for later use
-            ref_data = {
-                'ref_name': part_references[reference].ref_name,
-                'ref_bounding_box': ref_bounding_box,
-                'ref_part_index': ref_part,
-                'ref_angle': part_references[reference].parts[ref_part].vangle_2d,
-                'ref_offset': np.array(part_references[reference].parts[ref_part].rotation_point[:2]),
-                'ref_computable': computable,
-            }
-            
-            # Process all parts for this reference (following MATLAB order)
-            for part_index in range(part_references[reference].total_ref_parts):
-                print(f"Processing part {part_global_index + 1}: ref={reference}, part={part_index}")
-                
-                # Get part transformation data
-                part_data = part_references[reference].parts[part_index]
-                part_offset = np.array(part_data.rotation_point[:2])
-                part_angle = part_data.vangle_2d
-                
-                # Create reference sorting bounding box 4 points (same as MATLAB)
-                ref_bounding_box_sorting = matlab2_sorting_bounding_box(ref_data['ref_bounding_box'])
-                
-                # Rotate and translate reference BoundingBox to part Bounding box (same as MATLAB)
-                bounding_box_4pts = tci_move_points(ref_bounding_box_sorting, 
-                                                  part_offset, 
-                                                  part_angle - ref_data['ref_angle'], 
-                                                  ref_data['ref_offset'])
-                
-                # Calculate angle based on bounding box (same as MATLAB)
-                angle = math.atan2(bounding_box_4pts[1, 1] - bounding_box_4pts[0, 1], 
-                                 bounding_box_4pts[1, 0] - bounding_box_4pts[0, 0])
-                
-                # Use the 4-point bounding box for partJson
-                bounding_box = bounding_box_4pts.tolist()
-                
-                # Create part JSON entry
-                part_entry = {
-                    'reference': ref_data['ref_name'],
-                    'boundingBox': bounding_box,  # Already a list of lists
-                    'angle': angle
-                }
-                
-                part_json.append(part_entry)
-                print(f"  Added part: {ref_data['ref_name']} at angle {angle}")
-                
-                part_global_index += 1
-        
-            # Create refPartJson entries using the same logic as the first pass
-            # Reference Angle and Offset for rotation and translation (same as MATLAB)
-            total_con = part_references[reference].parts[ref_part].total_contours
-            
-            # Create sorting bounding box (4 points) - same as MATLAB
-            bounding_box = matlab2_sorting_bounding_box(ref_bounding_box)
-            
-            # Calculate angle of part wrt bounding box (same as MATLAB)
-            angle = math.atan2(bounding_box[1, 1] - bounding_box[0, 1], 
-                                bounding_box[1, 0] - bounding_box[0, 0])
-            
-            # Create rotated zero bounding box (same as MATLAB)
-            # rotatedZeroBoundingBox = tci_movePoints(boundingBox,[0 0], -angle, boundingBox(1,:));
-            rotated_zero_bbox = tci_move_points(bounding_box, np.array([0, 0]), -angle, bounding_box[0])
-            
-            # Apply same transformation to polyout polygon using Shapely affinity
-            # Equivalent to tci_move_points(polyout, [0,0], -angle, bounding_box[0])
-            # 1. Translate so rotation point is at origin: subtract bounding_box[0]
-            rotated_polyout = affinity.translate(polyout, xoff=-bounding_box[0][0], yoff=-bounding_box[0][1])
-            
-            # 2. Rotate by -angle around the origin
-            rotated_polyout = affinity.rotate(rotated_polyout, -angle * 180 / np.pi, origin=(0, 0))
-            
-            # Rotate voronoi points
-            rotated_voronoi = tci_move_points(voronoi, np.array([0, 0]), -angle, bounding_box[0])
-
-            # Create reference JSON structure (same as MATLAB)
-            ref_part_data = {
-                'reference': part_references[reference].ref_name,
-                'boundingBox': rotated_zero_bbox.tolist(),  # Use the rotated bounding box
-                'angle': 0,  # Always 0 for reference as in MATLAB
-                'computable': computable,
-                'toolLocation': [],
-                'toolActive': [],
-                'thickness': cutting_unit.thickness,
-                'material': cutting_unit.material,
-                'geometry': {
-                    'totalContours': total_con,
-                    'contours': [],
-                    'voronoi': rotated_voronoi,
-                    'polyShape': rotated_polyout
-                }
-            }
-            
-            # Add detailed contour geometry (same as MATLAB)
-            contours_list = []
-            for i in range(total_con):
-                if i < len(part_references[reference].parts[ref_part].contours):
-                    contour = part_references[reference].parts[ref_part].contours[i]
-                    
-                    contour_data = {
-                        'totalSegments': contour.total_segments,
-                        'type': contour.type,
-                        'sense': contour.sense
-                    }
-
-                    # Add micro-joint info if detected
-                    if contour.micro_joint:
-                        mj_start = tci_move_points(
-                            np.array([contour.micro_joint_start[:2]]),
-                            np.array([0, 0]), -angle, bounding_box[0])[0]
-                        mj_end = tci_move_points(
-                            np.array([contour.micro_joint_end[:2]]),
-                            np.array([0, 0]), -angle, bounding_box[0])[0]
-                        contour_data['microJoint'] = True
-                        contour_data['microJointGap'] = contour.micro_joint_gap
-                        contour_data['microJointStart'] = mj_start.tolist()
-                        contour_data['microJointEnd'] = mj_end.tolist()
-                    
-                    # Add segments with transformed coordinates (same as MATLAB)
-                    segments_list = []
-                    for j in range(min(contour.total_segments, len(contour.segments))):
-                        segment = contour.segments[j]
-                        
-                        # Apply tci_movePoints transformation like in MATLAB
-                        # tci_movePoints(pos, [0 0], -angle, boundingBox(1,:))
-                        initial_pos = tci_move_points(np.array([segment.initial_pos[:2]]), 
-                                                    np.array([0, 0]), -angle, bounding_box[0])[0]
-                        final_pos = tci_move_points(np.array([segment.final_pos[:2]]), 
-                                                    np.array([0, 0]), -angle, bounding_box[0])[0]
-                        arc_center = tci_move_points(np.array([segment.arc_center[:2]]), 
-                                                    np.array([0, 0]), -angle, bounding_box[0])[0]
-                        # For arcCenterOff, rotation point is [0,0] as in MATLAB
-                        arc_center_off = tci_move_points(np.array([segment.arc_center_off[:2]]), 
-                                                        np.array([0, 0]), -angle, np.array([0, 0]))[0]
-                        
-                        segment_data = {
-                            'type': segment.type,
-                            'initialPos': initial_pos.tolist(),
-                            'finalPos': final_pos.tolist(),
-                            'arcCenter': arc_center.tolist(),
-                            'arcCenterOff': arc_center_off.tolist(),
-                            'arcSense': segment.arc_sense
-                        }
-                        segments_list.append(segment_data)
-                    
-                    # MATLAB: single segment becomes object, multiple segments become array
-                    if len(segments_list) == 1:
-                        contour_data['segments'] = segments_list[0]
-                    else:
-                        contour_data['segments'] = segments_list
-                    
-                    contours_list.append(contour_data)
-            
-            # MATLAB: single contour becomes object, multiple contours become array
-            if len(contours_list) == 1:
-                ref_part_data['geometry']['contours'] = contours_list[0]
-            else:
-                ref_part_data['geometry']['contours'] = contours_list
-            
-            ref_part_json.append(ref_part_data)
-        
-        # Save JSON files
-        ref_filename = f"refPartJson_{slot_name}.json"
-        parts_filename = f"partJson_{slot_name}.json"
-        
-        # Serialize data to JSON-compatible format (converts Shapely to GeoJSON)
-        ref_part_json_serialized = serialize_for_json(ref_part_json)
-        part_json_serialized = serialize_for_json(part_json)
-        
-        with open(ref_filename, 'w') as f:
-            json.dump(ref_part_json_serialized, f, indent=2)
-        
-        with open(parts_filename, 'w') as f:
-            json.dump(part_json_serialized, f, indent=2)
-        
-        print(f"Files saved: {ref_filename}, {parts_filename}")
+        ref_list, part_list = load_slot_payload(
+            slot_file_lpp, lazy_instances=lazy_instances,
+            constrained_triangulation=constrained_triangulation,
+            chord_tolerance=chord_tolerance, max_contour_points=max_contour_points,
+            reference_cache=reference_cache, workers=workers)
+        ref_path, parts_path = write_load_slot_json(slot_path.stem, ref_list, part_list,
+                                                    output_dir=output_dir, indent=indent)
+        print(f"Files saved: {ref_path}, {parts_path}")
         
     except Exception as e:
         print(f"Error processing file: {e}")
@@ -1852,12 +2800,17 @@ if __name__ == "__main__":
         print(f"load_slot v{VERSION}")
         sys.exit(0)
 
-    if len(sys.argv) != 2:
+    args = sys.argv[1:]
+    pretty = "--pretty" in args
+    if pretty:
+        args.remove("--pretty")
+
+    if len(args) != 1:
         print(f"load_slot v{VERSION}")
-        print("Usage: python load_slot.py <slot_file.lpp>")
+        print("Usage: python load_slot.py [--pretty] <slot_file.lpp>")
         print("       python load_slot.py --version")
         sys.exit(1)
 
-    slot_file = sys.argv[1]
-    error_flag = load_slot(slot_file)
+    slot_file = args[0]
+    error_flag = load_slot(slot_file, indent=2 if pretty else None)
     sys.exit(error_flag)
\ No newline at end of file
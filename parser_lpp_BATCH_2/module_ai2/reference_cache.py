@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Persistent on-disk cache of main-reference geometry for load_slot.
+
+The same reference appears in many programs. load_slot hashes the main
+part's contours in a frame that does not depend on where or how the part
+is nested (reference_geometry_key) and stores here the expensive result of
+find_main_reference (polyShape and voronoi) in that frame. Later programs
+only pose it on their own instance.
+
+One JSON file per entry, written atomically, so several processes can
+share the directory. A stamp file ties the directory to the load_slot
+VERSION: when the algorithm changes, the old entries are discarded.
+
+Layout:
+
+    <cache_dir>/
+    ├── cache_version.json
+    └── ab/
+        └── abcdef....json
+"""
+
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+CACHE_FORMAT_VERSION = 1
+STAMP_FILENAME = "cache_version.json"
+
+
+class ReferenceCache:
+    """
+    Bounded LRU cache of main-reference geometry, keyed by geometry hash.
+
+    Recency is the entry file mtime (refreshed on every hit); prune() evicts
+    the oldest entries until max_entries and max_size_mb hold.
+    """
+
+    def __init__(self, cache_dir: str, version: str, max_entries: Optional[int] = 2000,
+                 max_size_mb: Optional[float] = None):
+        """
+        Args:
+            cache_dir: Cache directory (created on first store)
+            version: Algorithm version (load_slot VERSION); a different stamp empties the cache
+            max_entries: Maximum number of entries (None = unbounded)
+            max_size_mb: Maximum total size in MB (None = unbounded)
+        """
+        self.cache_dir = Path(cache_dir)
+        self.version = str(version)
+        self.max_entries = int(max_entries) if max_entries else None
+        self.max_bytes = int(float(max_size_mb) * 1024 * 1024) if max_size_mb else None
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._stamp_checked = False
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Picklable for load_slot worker processes; counters restart there
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def stamp(self) -> Dict[str, Any]:
+        return {"format": CACHE_FORMAT_VERSION, "load_slot_version": self.version}
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _check_stamp(self) -> None:
+        """Discard every entry if the directory was written by another algorithm version."""
+        with self._lock:
+            if self._stamp_checked:
+                return
+            self._stamp_checked = True
+            stamp_path = self.cache_dir / STAMP_FILENAME
+            try:
+                with open(stamp_path, 'r', encoding='utf-8') as f:
+                    if json.load(f) == self.stamp:
+                        return
+            except (OSError, ValueError):
+                pass
+            if self.cache_dir.is_dir():
+                for child in self.cache_dir.iterdir():
+                    if child.is_dir():
+                        shutil.rmtree(child, ignore_errors=True)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = stamp_path.with_suffix(f".tmp{os.getpid()}")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.stamp, f)
+            os.replace(tmp_path, stamp_path)
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the stored payload for key, or None.
+        """
+        self._check_stamp()
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return payload
+
+    def store(self, key: str, payload: Dict[str, Any]) -> bool:
+        """
+        Writes the payload for key (atomic replace). Returns False on I/O error.
+        """
+        self._check_stamp()
+        path = self._entry_path(key)
+        tmp_path = path.with_suffix(f".tmp{os.getpid()}_{threading.get_ident()}")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            return False
+        with self._lock:
+            self.stores += 1
+        return True
+
+    def prune(self) -> int:
+        """
+        Evicts least recently used entries until the limits hold.
+
+        Returns:
+            Number of entries removed
+        """
+        if self.max_entries is None and self.max_bytes is None:
+            return 0
+        entries = []
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+
+        removed = 0
+        for _, size, path in entries:
+            over_entries = self.max_entries is not None and len(entries) - removed > self.max_entries
+            over_bytes = self.max_bytes is not None and total_bytes > self.max_bytes
+            if not (over_entries or over_bytes):
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total_bytes -= size
+            removed += 1
+        with self._lock:
+            self.evictions += removed
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
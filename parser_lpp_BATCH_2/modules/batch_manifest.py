@@ -0,0 +1,112 @@
+"""Manifiesto del modo incremental de main.py (batch.incremental).
+
+Guarda, por cada programa de INPUT ya procesado, el hash de su contenido y
+las piezas que generó con sus salidas (CNC, PNG y DXF por robot). Con él una
+ejecución incremental sabe qué programas son nuevos o han cambiado y qué
+ficheros borrar de los que ya no están.
+
+También guarda la firma de lo que afecta a todas las piezas a la vez
+(config.json, herramientas, solver, versión de load_slot). Si cambia, la
+ejecución deja de ser incremental y se procesa todo desde cero.
+
+    {
+      "format": 1,
+      "settings": {"config": "...", "tools": {"tool_A.json": "..."}, ...},
+      "programs": {
+        "programa.cnc": {
+          "sha256": "...",
+          "complete": true,
+          "pieces": [
+            {"robot": "ANTHRO", "piece": "ID1_x", "solutions_dir": "ANTHRO/OUT_solutions",
+             "files": ["ANTHRO/OUT_cnc/ID1_x.cnc", "ANTHRO/OUT_png/ID1_x.png", "ANTHRO/OUT_dxf/ID1_x.dxf"]}
+          ]
+        }
+      }
+    }
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+MANIFEST_FORMAT_VERSION = 1
+
+
+def file_sha256(path: str | Path) -> str:
+    """Hash SHA-256 del contenido de un fichero."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def settings_signature(config_path: str | Path, tool_paths: list[str | Path], extra: dict[str, Any] | None = None) -> dict[str, Any]:
+    """Firma de config.json, de cada herramienta y de los valores extra (solver, versiones)."""
+    config_path = Path(config_path)
+    return {
+        "format": MANIFEST_FORMAT_VERSION,
+        "config": file_sha256(config_path) if config_path.exists() else None,
+        "tools": {Path(path).name: file_sha256(path) for path in tool_paths},
+        **(extra or {}),
+    }
+
+
+class BatchManifest:
+    """Programas procesados y sus salidas. No es seguro entre hilos: solo lo usa main()."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.settings: dict[str, Any] = {}
+        self.programs: dict[str, dict[str, Any]] = {}
+
+    @classmethod
+    def load(cls, path: str | Path) -> "BatchManifest":
+        """Lee el manifiesto; si no existe o no se puede leer, devuelve uno vacío."""
+        manifest = cls(path)
+        try:
+            with open(manifest.path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return manifest
+        if not isinstance(payload, dict) or payload.get("format") != MANIFEST_FORMAT_VERSION:
+            return manifest
+        settings = payload.get("settings")
+        programs = payload.get("programs")
+        manifest.settings = settings if isinstance(settings, dict) else {}
+        manifest.programs = programs if isinstance(programs, dict) else {}
+        return manifest
+
+    def save(self) -> None:
+        """Escribe el manifiesto de forma atómica."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp{os.getpid()}")
+        payload = {"format": MANIFEST_FORMAT_VERSION, "settings": self.settings, "programs": self.programs}
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def is_current(self, name: str, digest: str) -> bool:
+        """True si el programa ya se procesó completo con este mismo contenido."""
+        entry = self.programs.get(name)
+        return isinstance(entry, dict) and entry.get("sha256") == digest and bool(entry.get("complete"))
+
+    def pieces(self, name: str) -> list[dict[str, Any]]:
+        entry = self.programs.get(name)
+        pieces = entry.get("pieces") if isinstance(entry, dict) else None
+        return [piece for piece in pieces or [] if isinstance(piece, dict)]
+
+    def record(self, name: str, digest: str, pieces: list[dict[str, Any]], complete: bool = True) -> None:
+        self.programs[name] = {"sha256": digest, "complete": bool(complete), "pieces": pieces}
+
+    def mark_incomplete(self, name: str) -> None:
+        """El programa se volverá a procesar en la siguiente ejecución aunque no cambie."""
+        if name in self.programs:
+            self.programs[name]["complete"] = False
+
+    def forget(self, name: str) -> None:
+        self.programs.pop(name, None)
@@ -57,10 +57,14 @@ def extract_params(line: str) -> dict[str, float]:
 
 def iter_cnc_lines(cnc_path: str | Path) -> Iterable[str]:
     with open(cnc_path, "r", encoding="latin-1", newline=None) as f:
-        for raw_line in f:
-            line = clean_line(raw_line)
-            if line:
-                yield line
+        yield from iter_clean_lines(f)
+
+
+def iter_clean_lines(raw_lines: Iterable[str]) -> Iterable[str]:
+    for raw_line in raw_lines:
+        line = clean_line(raw_line)
+        if line:
+            yield line
 
 
 def _entity_end(entity: Entity) -> tuple[float, float] | None:
@@ -97,13 +101,18 @@ def simplify_contour_geometry(contour: Contour, tol: float = 1e-3) -> Contour:
     )
 
 def parse_cnc_contours(cnc_path: str | Path) -> list[Contour]:
+    return parse_cnc_contours_from_lines(iter_cnc_lines(cnc_path))
+
+
+def parse_cnc_contours_from_lines(lines: Iterable[str]) -> list[Contour]:
+    """Como parse_cnc_contours, pero sobre líneas ya en memoria (limpias o no)."""
     contours: list[Contour] = []
     current_contour: Contour | None = None
     current_pos: tuple[float, float] | None = None
     modal_motion: str | None = None
     contour_index = 0
 
-    for line in iter_cnc_lines(cnc_path):
+    for line in iter_clean_lines(lines):
         params = extract_params(line)
 
         if "G65" in line and "P9102" in line:
@@ -288,9 +297,12 @@ def cnc_to_single_dxf(
         out_dir.mkdir(parents=True, exist_ok=True)
         dxf_path = out_dir / f"{cnc_path.stem}_all_contours.dxf"
 
-    contours = parse_cnc_contours(cnc_path)
     if geometry_only:
-        contours = [simplify_contour_geometry(c) for c in contours]
+        from modules.geometry_cache import get_piece_geometry
+
+        contours = get_piece_geometry(cnc_path).contours
+    else:
+        contours = parse_cnc_contours(cnc_path)
     if not contours:
         raise ValueError(f"No se han detectado contornos en: {cnc_path}")
 
@@ -13,6 +13,8 @@ try:
 except ImportError:
     from modules.cnc_to_dxf_combined import Contour, Entity, parse_cnc_contours, simplify_contour_geometry
 
+from modules.geometry_cache import PieceGeometry, get_piece_geometry
+
 META_PATTERN = re.compile(r"^\(\s*META\s+([A-Z0-9_]+)\s*:\s*(.*?)\s*\)$", re.IGNORECASE)
 
 
@@ -33,78 +35,91 @@ def _read_piece_info(cnc_path: str | Path) -> tuple[str, str, dict[str, str]]:
     return piece_id, piece_name, meta
 
 
-def _distance(p1: tuple[float, float], p2: tuple[float, float]) -> float:
-    return math.hypot(p2[0] - p1[0], p2[1] - p1[1])
-
+def contours_bbox(contours: list[Contour], arc_segments: int = 48) -> tuple[float, float, float, float]:
+    all_pts: list[tuple[float, float]] = []
+    for contour in contours:
+        all_pts.extend(contour_to_points(contour, arc_segments=arc_segments, close_if_open=False))
 
-def _angle_rad(center: tuple[float, float], pt: tuple[float, float]) -> float:
-    return math.atan2(pt[1] - center[1], pt[0] - center[0])
+    if not all_pts:
+        raise ValueError("No hay puntos para calcular el bounding box")
 
+    xs = [p[0] for p in all_pts]
+    ys = [p[1] for p in all_pts]
+    return min(xs), min(ys), max(xs), max(ys)
 
-def _normalize_angle(angle: float) -> float:
-    two_pi = 2.0 * math.pi
-    while angle < 0:
-        angle += two_pi
-    while angle >= two_pi:
-        angle -= two_pi
-    return angle
-
-
-def _sample_arc(entity: Entity, segments: int = 48) -> list[tuple[float, float]]:
-    assert entity.start and entity.end and entity.center and entity.radius is not None
-    start_a = _normalize_angle(_angle_rad(entity.center, entity.start))
-    end_a = _normalize_angle(_angle_rad(entity.center, entity.end))
-
-    if entity.clockwise:
-        if end_a >= start_a:
-            end_a -= 2.0 * math.pi
-    else:
-        if end_a <= start_a:
-            end_a += 2.0 * math.pi
-
-    pts: list[tuple[float, float]] = []
-    for i in range(segments + 1):
-        t = i / segments
-        a = start_a + (end_a - start_a) * t
-        x = entity.center[0] + entity.radius * math.cos(a)
-        y = entity.center[1] + entity.radius * math.sin(a)
-        pts.append((x, y))
-    return pts
 
+def _sample_arcs_array(arcs: list[Entity], segments: int) -> np.ndarray:
+    """Muestrea varios arcos a la vez; devuelve un array (arcos, segments + 1, 2).
 
-def contour_to_points(contour: Contour, arc_segments: int = 48, close_if_open: bool = True) -> list[tuple[float, float]]:
-    pts: list[tuple[float, float]] = []
+    Ángulos de inicio y fin normalizados a [0, 2pi) y barrido en el sentido
+    del arco, con segments tramos iguales.
+    """
+    two_pi = 2.0 * math.pi
+    centers = np.array([a.center for a in arcs], dtype=float)
+    starts = np.array([a.start for a in arcs], dtype=float)
+    ends = np.array([a.end for a in arcs], dtype=float)
+    radii = np.array([a.radius for a in arcs], dtype=float)
+    clockwise = np.array([bool(a.clockwise) for a in arcs])
+
+    def normalized(pts: np.ndarray) -> np.ndarray:
+        ang = np.arctan2(pts[:, 1] - centers[:, 1], pts[:, 0] - centers[:, 0])
+        ang = np.where(ang < 0, ang + two_pi, ang)
+        return np.where(ang >= two_pi, ang - two_pi, ang)
+
+    start_a = normalized(starts)
+    end_a = normalized(ends)
+    end_a = np.where(clockwise & (end_a >= start_a), end_a - two_pi, end_a)
+    end_a = np.where(~clockwise & (end_a <= start_a), end_a + two_pi, end_a)
+
+    t = np.arange(segments + 1, dtype=float) / segments
+    angles = start_a[:, None] + (end_a - start_a)[:, None] * t[None, :]
+    out = np.empty((len(arcs), segments + 1, 2), dtype=float)
+    out[:, :, 0] = centers[:, 0, None] + radii[:, None] * np.cos(angles)
+    out[:, :, 1] = centers[:, 1, None] + radii[:, None] * np.sin(angles)
+    return out
+
+
+def contour_to_array(contour: Contour, arc_segments: int = 48, close_if_open: bool = True) -> np.ndarray:
+    """Puntos del contorno como array (n, 2): extremos de las líneas y arcos muestreados.
+
+    Todos los arcos del contorno se muestrean en una sola operación. Es el
+    único muestreo de contornos: contour_to_points (métricas) sale de aquí,
+    así que los PNG y las métricas usan exactamente los mismos puntos.
+    """
+    arcs = [e for e in contour.entities if e.type == "ARC"]
+    arc_pts = _sample_arcs_array(arcs, arc_segments) if arcs else None
+
+    chunks: list[np.ndarray] = []
+    n_pts = 0
+    arc_idx = 0
     for entity in contour.entities:
         if entity.type == "LINE":
             if entity.start is None or entity.end is None:
                 continue
-            if not pts:
-                pts.append(entity.start)
-            pts.append(entity.end)
-        elif entity.type == "ARC":
-            arc_pts = _sample_arc(entity, segments=arc_segments)
-            if not pts:
-                pts.extend(arc_pts)
+            if not n_pts:
+                chunks.append(np.array([entity.start, entity.end], dtype=float))
+                n_pts += 2
             else:
-                pts.extend(arc_pts[1:])
-
-    if close_if_open and len(pts) >= 2 and _distance(pts[0], pts[-1]) > 1e-3:
-        pts.append(pts[0])
+                chunks.append(np.array([entity.end], dtype=float))
+                n_pts += 1
+        elif entity.type == "ARC":
+            sampled = arc_pts[arc_idx] if n_pts == 0 else arc_pts[arc_idx, 1:]
+            arc_idx += 1
+            chunks.append(sampled)
+            n_pts += len(sampled)
+
+    if not chunks:
+        return np.empty((0, 2), dtype=float)
+    pts = np.concatenate(chunks, axis=0)
+    if close_if_open and len(pts) >= 2 and math.hypot(*(pts[-1] - pts[0])) > 1e-3:
+        pts = np.vstack([pts, pts[:1]])
     return pts
 
 
-def contours_bbox(contours: list[Contour], arc_segments: int = 48) -> tuple[float, float, float, float]:
-    all_pts: list[tuple[float, float]] = []
-    for contour in contours:
-        all_pts.extend(contour_to_points(contour, arc_segments=arc_segments, close_if_open=False))
-
-    if not all_pts:
-        raise ValueError("No hay puntos para calcular el bounding box")
-
-    xs = [p[0] for p in all_pts]
-    ys = [p[1] for p in all_pts]
-    return min(xs), min(ys), max(xs), max(ys)
 
+def contour_to_points(contour: Contour, arc_segments: int = 48, close_if_open: bool = True) -> list[tuple[float, float]]:
+    """Igual que contour_to_array, como lista de tuplas (x, y)."""
+    return [tuple(pt) for pt in contour_to_array(contour, arc_segments=arc_segments, close_if_open=close_if_open).tolist()]
 
 def _fit_transform(
     bbox: tuple[float, float, float, float],
@@ -128,6 +143,14 @@ def _canvas_xy(pt: tuple[float, float], scale: float, tx: float, ty: float, out_
     return int(round(x)), int(round(out_wh[1] - y))
 
 
+def canvas_points(pts: np.ndarray, scale: float, tx: float, ty: float, out_wh: tuple[int, int]) -> np.ndarray:
+    """_canvas_xy aplicado en bloque a un array (n, 2); devuelve int32 listo para cv2.polylines."""
+    mapped = np.empty_like(pts, dtype=float)
+    mapped[:, 0] = pts[:, 0] * scale + tx
+    mapped[:, 1] = out_wh[1] - (pts[:, 1] * scale + ty)
+    return np.rint(mapped).astype(np.int32)
+
+
 def _safe_float(meta: dict[str, str], key: str) -> float | None:
     raw = meta.get(key)
     if raw is None or raw == "":
@@ -138,6 +161,82 @@ def _safe_float(meta: dict[str, str], key: str) -> float | None:
         return None
 
 
+def render_piece_contours(
+    contours: list[Contour] | PieceGeometry,
+    save_path: str | Path,
+    piece_id: str,
+    piece_name: str,
+    meta: dict[str, str] | None = None,
+    out_WH: tuple[int, int] = (800, 800),
+    N: int = 72,
+    auto_close_open: bool = True,
+    draw_bounding: bool = False,
+    show_metrics: bool = True,
+) -> bool:
+    """Dibuja contornos ya parseados y simplificados y guarda el PNG en save_path.
+
+    Es el núcleo de draw_contours; permite pintar una pieza en memoria sin
+    volver a leerla desde disco. Con un PieceGeometry se reutilizan sus
+    puntos muestreados y su bounding box.
+    """
+    meta = meta or {}
+    geometry = contours if isinstance(contours, PieceGeometry) else PieceGeometry(contours)
+    bbox = geometry.bbox(N)
+    min_x, min_y, max_x, max_y = bbox
+    bbox_x = max_x - min_x
+    bbox_y = max_y - min_y
+
+    canvas = np.ones((out_WH[1], out_WH[0], 3), dtype=np.uint8) * 245
+    scale, tx, ty = _fit_transform(bbox, out_WH, margin=40)
+
+    if draw_bounding:
+        p1 = _canvas_xy((min_x, min_y), scale, tx, ty, out_WH)
+        p2 = _canvas_xy((max_x, max_y), scale, tx, ty, out_WH)
+        left = min(p1[0], p2[0])
+        right = max(p1[0], p2[0])
+        top = min(p1[1], p2[1])
+        bottom = max(p1[1], p2[1])
+        cv2.rectangle(canvas, (left, top), (right, bottom), (0, 0, 0), 1)
+
+    color = (0, 140, 255)
+    polylines = [
+        canvas_points(pts, scale, tx, ty, out_WH)
+        for pts in geometry.arrays(N, close_if_open=auto_close_open)
+        if len(pts) >= 2
+    ]
+    if polylines:
+        cv2.polylines(canvas, polylines, False, color, 2)
+
+    if show_metrics:
+        material = meta.get("MATERIAL", "")
+        thickness = meta.get("THICKNESS", "")
+        ferromagnetic = meta.get("FERROMAGNETIC", "")
+        area_mm2 = _safe_float(meta, "AREA_MM2")
+        weight_kg = _safe_float(meta, "WEIGHT_KG")
+
+        overlay_lines = [
+            f"ID:{piece_id}  NAME:{piece_name}",
+            f"BBOX: {bbox_x:.2f} x {bbox_y:.2f} mm",
+        ]
+        if material or thickness:
+            overlay_lines.append(f"MAT:{material}  THK:{thickness} mm")
+        if area_mm2 is not None:
+            overlay_lines.append(f"AREA: {area_mm2:.2f} mm2")
+        if weight_kg is not None:
+            overlay_lines.append(f"PESO: {weight_kg:.4f} kg")
+        if ferromagnetic:
+            overlay_lines.append(f"FERRO: {ferromagnetic}")
+
+        y = 24
+        for line in overlay_lines:
+            cv2.putText(canvas, line, (8, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1, cv2.LINE_AA)
+            y += 20
+
+    save_path = Path(save_path)
+    save_path.parent.mkdir(parents=True, exist_ok=True)
+    return bool(cv2.imwrite(str(save_path), canvas))
+
+
 def draw_contours(
     pieces_files: Iterable[str | Path],
     output_filename: str | Path | None = None,
@@ -167,65 +266,11 @@ def draw_contours(
     for idx, cnc_path in enumerate(piece_files):
         piece_id, piece_name, meta = _read_piece_info(cnc_path)
 
-        contours = parse_cnc_contours(cnc_path)
-        contours = [simplify_contour_geometry(c) for c in contours]
-        contours = [c for c in contours if c.entities]
-        if not contours:
+        geometry = get_piece_geometry(cnc_path)
+        if not geometry.contours:
             print(f"No se detectaron contornos en '{cnc_path}'")
             continue
 
-        bbox = contours_bbox(contours, arc_segments=N)
-        min_x, min_y, max_x, max_y = bbox
-        bbox_x = max_x - min_x
-        bbox_y = max_y - min_y
-
-        canvas = np.ones((out_WH[1], out_WH[0], 3), dtype=np.uint8) * 245
-        scale, tx, ty = _fit_transform(bbox, out_WH, margin=40)
-
-        if draw_bounding:
-            p1 = _canvas_xy((min_x, min_y), scale, tx, ty, out_WH)
-            p2 = _canvas_xy((max_x, max_y), scale, tx, ty, out_WH)
-            left = min(p1[0], p2[0])
-            right = max(p1[0], p2[0])
-            top = min(p1[1], p2[1])
-            bottom = max(p1[1], p2[1])
-            cv2.rectangle(canvas, (left, top), (right, bottom), (0, 0, 0), 1)
-
-        color = (0, 140, 255)
-        for contour in contours:
-            pts = contour_to_points(contour, arc_segments=N, close_if_open=auto_close_open)
-            if len(pts) < 2:
-                continue
-            for a, b in zip(pts[:-1], pts[1:]):
-                p1 = _canvas_xy(a, scale, tx, ty, out_WH)
-                p2 = _canvas_xy(b, scale, tx, ty, out_WH)
-                cv2.line(canvas, p1, p2, color, 2)
-
-        if show_metrics:
-            material = meta.get("MATERIAL", "")
-            thickness = meta.get("THICKNESS", "")
-            ferromagnetic = meta.get("FERROMAGNETIC", "")
-            area_mm2 = _safe_float(meta, "AREA_MM2")
-            weight_kg = _safe_float(meta, "WEIGHT_KG")
-
-            overlay_lines = [
-                f"ID:{piece_id}  NAME:{piece_name}",
-                f"BBOX: {bbox_x:.2f} x {bbox_y:.2f} mm",
-            ]
-            if material or thickness:
-                overlay_lines.append(f"MAT:{material}  THK:{thickness} mm")
-            if area_mm2 is not None:
-                overlay_lines.append(f"AREA: {area_mm2:.2f} mm2")
-            if weight_kg is not None:
-                overlay_lines.append(f"PESO: {weight_kg:.4f} kg")
-            if ferromagnetic:
-                overlay_lines.append(f"FERRO: {ferromagnetic}")
-
-            y = 24
-            for line in overlay_lines:
-                cv2.putText(canvas, line, (8, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1, cv2.LINE_AA)
-                y += 20
-
         if output_filename is not None and len(piece_files) == 1:
             save_path = Path(output_filename)
         elif output_filename is not None and len(piece_files) > 1 and idx == 0:
@@ -233,8 +278,18 @@ def draw_contours(
         else:
             save_path = Path(out_path) / f"{cnc_path.stem}_contours.png"
 
-        save_path.parent.mkdir(parents=True, exist_ok=True)
-        ok = cv2.imwrite(str(save_path), canvas)
+        ok = render_piece_contours(
+            geometry,
+            save_path,
+            piece_id,
+            piece_name,
+            meta,
+            out_WH=out_WH,
+            N=N,
+            auto_close_open=auto_close_open,
+            draw_bounding=draw_bounding,
+            show_metrics=show_metrics,
+        )
         result = result or ok
 
     return result
@@ -3,8 +3,9 @@ from __future__ import annotations
 import argparse
 import json
 import math
+import os
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable
 import sys
 
 import cv2
@@ -13,8 +14,8 @@ import numpy as np
 if __package__ in (None, ''):
     sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
-from modules.draw_part import contour_to_points, contours_bbox
-from modules.cnc_to_dxf import parse_cnc_contours, simplify_contour_geometry
+from modules.draw_part import canvas_points
+from modules.geometry_cache import get_piece_geometry
 
 
 def _load_json(path: str | Path) -> Any:
@@ -430,6 +431,79 @@ def _draw_solution_not_found_banner(canvas: np.ndarray, text: str = 'Solucion no
     cv2.putText(canvas, text, text_org, font, scale, (0, 0, 180), thickness, cv2.LINE_AA)
 
 
+def publish_png(image: np.ndarray, destinations: Iterable[str | Path], mode: str = "hardlink") -> dict[Path, bool]:
+    """Codifica la imagen una sola vez y la publica en varios destinos.
+
+    El primer destino recibe los bytes codificados; el resto se crea como
+    enlace duro (mode="hardlink") o como copia de esos mismos bytes
+    (mode="copy" o si el enlace no es posible, p. ej. entre volúmenes).
+    """
+    destinations = [Path(p) for p in destinations]
+    published: dict[Path, bool] = {p: False for p in destinations}
+    if not destinations:
+        return published
+
+    ok, encoded = cv2.imencode('.png', image)
+    if not ok:
+        return published
+    data = encoded.tobytes()
+
+    first = destinations[0]
+    for dst in destinations:
+        try:
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            if dst != first and published.get(first) and mode == "hardlink":
+                try:
+                    if dst.exists():
+                        dst.unlink()
+                    os.link(first, dst)
+                    published[dst] = True
+                    continue
+                except OSError:
+                    pass
+            dst.write_bytes(data)
+            published[dst] = True
+        except OSError:
+            published[dst] = False
+    return published
+
+
+CONTACT_SHEET_TILE_PX = 300
+CONTACT_SHEET_LABEL_PX = 26
+
+
+def contact_sheet_tile(image: np.ndarray, label: str, tile_px: int = CONTACT_SHEET_TILE_PX) -> np.ndarray:
+    """Reduce un overlay a una miniatura de tile_px de ancho con su etiqueta encima."""
+    height, width = image.shape[:2]
+    scale = tile_px / max(width, height, 1)
+    thumb = cv2.resize(image, (max(1, int(round(width * scale))), max(1, int(round(height * scale)))), interpolation=cv2.INTER_AREA)
+
+    tile = np.full((tile_px + CONTACT_SHEET_LABEL_PX, tile_px, 3), 245, dtype=np.uint8)
+    y0 = CONTACT_SHEET_LABEL_PX + (tile_px - thumb.shape[0]) // 2
+    x0 = (tile_px - thumb.shape[1]) // 2
+    tile[y0:y0 + thumb.shape[0], x0:x0 + thumb.shape[1]] = thumb
+    cv2.putText(tile, label, (6, CONTACT_SHEET_LABEL_PX - 8), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (15, 15, 15), 1, cv2.LINE_AA)
+    cv2.rectangle(tile, (0, 0), (tile.shape[1] - 1, tile.shape[0] - 1), (180, 180, 180), 1)
+    return tile
+
+
+def build_contact_sheet(tiles: list[np.ndarray], columns: int = 4) -> np.ndarray | None:
+    """Junta las miniaturas de contact_sheet_tile en una rejilla de columns columnas."""
+    if not tiles:
+        return None
+    columns = max(1, min(int(columns), len(tiles)))
+    rows = math.ceil(len(tiles) / columns)
+    tile_h = max(tile.shape[0] for tile in tiles)
+    tile_w = max(tile.shape[1] for tile in tiles)
+    sheet = np.full((rows * tile_h, columns * tile_w, 3), 255, dtype=np.uint8)
+    for index, tile in enumerate(tiles):
+        row, column = divmod(index, columns)
+        y0 = row * tile_h
+        x0 = column * tile_w
+        sheet[y0:y0 + tile.shape[0], x0:x0 + tile.shape[1]] = tile
+    return sheet
+
+
 def draw_solution_overlay_png(
     piece_cnc: str | Path,
     processed_tool_json: str | Path,
@@ -437,20 +511,40 @@ def draw_solution_overlay_png(
     output_png: str | Path,
     out_wh: tuple[int, int] = (1100, 950),
     metadata: dict[str, Any] | None = None,
+    extra_outputs: Iterable[str | Path] = (),
+    publish_mode: str = "hardlink",
 ) -> bool:
     """Dibuja la herramienta solucionada sobre la pieza.
 
+    El overlay se rasteriza y codifica una sola vez; extra_outputs recibe el
+    mismo PNG (ver publish_png). Devuelve True si se escribió output_png.
+    """
+    canvas = render_solution_overlay(piece_cnc, processed_tool_json, solution_json, out_wh=out_wh, metadata=metadata)
+    if canvas is None:
+        return False
+    published = publish_png(canvas, [output_png, *extra_outputs], mode=publish_mode)
+    return published[Path(output_png)]
+
+
+def render_solution_overlay(
+    piece_cnc: str | Path,
+    processed_tool_json: str | Path,
+    solution_json: str | Path,
+    out_wh: tuple[int, int] = (1100, 950),
+    metadata: dict[str, Any] | None = None,
+) -> np.ndarray | None:
+    """Rasteriza la herramienta solucionada sobre la pieza y devuelve la imagen BGR.
+
     Regla visual:
     - actuador activo: circulo relleno + contorno
     - actuador inactivo: solo contorno
 
     Además añade un panel con la información útil para revisar la calidad de la solución.
+    Devuelve None si la pieza no tiene contornos.
     """
-    contours = parse_cnc_contours(piece_cnc)
-    contours = [simplify_contour_geometry(c) for c in contours]
-    contours = [c for c in contours if c.entities]
-    if not contours:
-        return False
+    geometry = get_piece_geometry(piece_cnc)
+    if not geometry.contours:
+        return None
 
     solution_payload = _load_json(solution_json)
     tool_positions = _read_tool_positions(processed_tool_json)
@@ -464,7 +558,7 @@ def draw_solution_overlay_png(
     has_geometry = bool(explicit_points or tool_center is not None)
     solution_is_reliable = _solution_is_reliable(metadata, has_active_info, has_geometry)
 
-    min_x, min_y, max_x, max_y = contours_bbox(contours, arc_segments=72)
+    min_x, min_y, max_x, max_y = geometry.bbox(72)
     width = max(max_x - min_x, 1e-6)
     height = max(max_y - min_y, 1e-6)
     margin = 40
@@ -490,13 +584,9 @@ def draw_solution_overlay_png(
     bottom = max(p1[1], p2[1])
     cv2.rectangle(canvas, (left, top), (right, bottom), (0, 0, 0), 1)
 
-    for contour in contours:
-        pts = contour_to_points(contour, arc_segments=72, close_if_open=True)
-        if len(pts) < 2:
-            continue
-        mapped = [canvas_xy(pt) for pt in pts]
-        for a, b in zip(mapped[:-1], mapped[1:]):
-            cv2.line(canvas, a, b, (0, 140, 255), 2)
+    polylines = [canvas_points(pts, scale, tx, ty, out_wh) for pts in geometry.arrays(72, close_if_open=True) if len(pts) >= 2]
+    if polylines:
+        cv2.polylines(canvas, polylines, False, (0, 140, 255), 2)
 
     piece_center = [0.5 * (min_x + max_x), 0.5 * (min_y + max_y)]
     metadata_piece_center = _metadata_piece_center(metadata)
@@ -575,9 +665,7 @@ def draw_solution_overlay_png(
     if not solution_is_reliable:
         _draw_solution_not_found_banner(canvas)
 
-    output_png = Path(output_png)
-    output_png.parent.mkdir(parents=True, exist_ok=True)
-    return bool(cv2.imwrite(str(output_png), canvas))
+    return canvas
 
 
 def _infer_paths_from_combo_dir(combo_dir: str | Path) -> tuple[Path, Path, Path, Path, dict[str, Any] | None]:
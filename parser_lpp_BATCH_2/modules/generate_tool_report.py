@@ -29,6 +29,9 @@ def fmt_num(value, digits=2):
 def load_rows(path):
     with open(path, "r", encoding="utf-8") as f:
         rows = json.load(f)
+    if isinstance(rows, dict):
+        # summary.json actual: {"solution_cache": {...}, "rows": [...]}; los antiguos son la lista.
+        rows = rows.get("rows")
     if not isinstance(rows, list):
         raise ValueError("El JSON de entrada debe ser una lista de resultados")
 
@@ -62,6 +65,8 @@ def build_stats(rows):
         "invalid_rows": sum(1 for r in rows if not r.get("solution_valid")),
         "status_counts": Counter(r.get("status", "unknown") for r in rows),
         "robot_group_counts": Counter(r.get("robot_group", "UNKNOWN") for r in rows),
+        "solution_cache_hits": sum(1 for r in rows if r.get("solution_cache_hit")),
+        "solution_cache_misses": sum(1 for r in rows if r.get("solution_cache_key") and not r.get("solution_cache_hit")),
     }
     overview["valid_rate"] = pct(overview["valid_rows"], overview["total_rows"])
 
@@ -187,6 +192,7 @@ def build_markdown(overview, tool_stats, piece_stats, recommendations):
     lines.append(f"- Herramientas evaluadas: {', '.join(overview['tools'])}")
     lines.append(f"- Soluciones válidas: {overview['valid_rows']} ({overview['valid_rate']:.2f}%)")
     lines.append(f"- Soluciones no válidas: {overview['invalid_rows']} ({pct(overview['invalid_rows'], overview['total_rows']):.2f}%)")
+    lines.append(f"- Caché de soluciones: {overview['solution_cache_hits']} aciertos, {overview['solution_cache_misses']} fallos")
     lines.append("")
     lines.append("### Estados")
     lines.append("")
@@ -298,6 +304,8 @@ def write_report_workbook(path, overview, tool_stats, piece_stats, recommendatio
         ["invalid_rows", overview["invalid_rows"]],
         ["valid_rate_pct", overview["valid_rate"] / 100.0],
     ]
+    overview_rows.append(["solution_cache_hits", overview["solution_cache_hits"]])
+    overview_rows.append(["solution_cache_misses", overview["solution_cache_misses"]])
     overview_rows.extend([[f"status::{status}", count] for status, count in sorted(overview["status_counts"].items())])
     overview_rows.extend([[f"robot::{robot}", count] for robot, count in sorted(overview["robot_group_counts"].items())])
     _write_sheet_rows(ws_overview, ["metric", "value"], overview_rows)
@@ -0,0 +1,155 @@
+"""Caché de geometría de piezas compartida por todo el proceso.
+
+Los CNC de pieza se parsean y simplifican una sola vez; PNG, DXF, métricas,
+referencias JSON y overlays reutilizan los mismos contornos, sus puntos
+muestreados y su bounding box.
+
+La clave es (ruta, mtime, tamaño), de modo que un CNC reescrito nunca
+devuelve la geometría antigua. Quien reescribe un CNC (rewrite_piece_header)
+llama además a invalidate_piece_geometry para liberar la entrada.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from modules.cnc_to_dxf import Contour, parse_cnc_contours, simplify_contour_geometry
+
+DEFAULT_MAX_ENTRIES = 512
+
+
+class PieceGeometry:
+    """Contornos simplificados (sin contornos vacíos) de una pieza y sus derivados memorizados."""
+
+    def __init__(self, contours: list[Contour]) -> None:
+        self.contours = contours
+        self._points: dict[tuple[int, bool], list[list[tuple[float, float]]]] = {}
+        self._arrays: dict[tuple[int, bool], list[Any]] = {}
+        self._bbox: dict[int, tuple[float, float, float, float]] = {}
+        self._lock = threading.Lock()
+
+    def points(self, arc_segments: int = 48, close_if_open: bool = True) -> list[list[tuple[float, float]]]:
+        """Puntos muestreados de cada contorno, en el mismo orden que contours."""
+        key = (int(arc_segments), bool(close_if_open))
+        with self._lock:
+            cached = self._points.get(key)
+        if cached is not None:
+            return cached
+
+        # Mismo muestreo que arrays (y que contour_to_points), reutilizando su caché.
+        sampled = [[tuple(pt) for pt in pts.tolist()] for pts in self.arrays(arc_segments, close_if_open)]
+        with self._lock:
+            return self._points.setdefault(key, sampled)
+
+    def arrays(self, arc_segments: int = 48, close_if_open: bool = True) -> list[Any]:
+        """Como points, pero con un array NumPy (n, 2) por contorno (para dibujar)."""
+        key = (int(arc_segments), bool(close_if_open))
+        with self._lock:
+            cached = self._arrays.get(key)
+        if cached is not None:
+            return cached
+
+        from modules.draw_part import contour_to_array
+
+        sampled = [contour_to_array(c, arc_segments=arc_segments, close_if_open=close_if_open) for c in self.contours]
+        with self._lock:
+            return self._arrays.setdefault(key, sampled)
+
+    def bbox(self, arc_segments: int = 48) -> tuple[float, float, float, float]:
+        """Igual que contours_bbox(contours, arc_segments)."""
+        key = int(arc_segments)
+        with self._lock:
+            cached = self._bbox.get(key)
+        if cached is not None:
+            return cached
+
+        all_pts = [pt for pts in self.points(arc_segments, close_if_open=False) for pt in pts]
+        if not all_pts:
+            raise ValueError("No hay puntos para calcular el bounding box")
+        xs = [p[0] for p in all_pts]
+        ys = [p[1] for p in all_pts]
+        box = (min(xs), min(ys), max(xs), max(ys))
+        with self._lock:
+            return self._bbox.setdefault(key, box)
+
+
+class GeometryCache:
+    """LRU de PieceGeometry indexada por (ruta, mtime, tamaño). Segura entre hilos."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[str, int, int], PieceGeometry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path: str | Path) -> tuple[str, int, int]:
+        resolved = os.path.abspath(os.fspath(path))
+        st = os.stat(resolved)
+        return resolved, st.st_mtime_ns, st.st_size
+
+    def get(self, path: str | Path) -> PieceGeometry:
+        key = self._key(path)
+        with self._lock:
+            geometry = self._entries.get(key)
+            if geometry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return geometry
+            self.misses += 1
+
+        contours = [simplify_contour_geometry(c) for c in parse_cnc_contours(key[0])]
+        return self._store(key, PieceGeometry([c for c in contours if c.entities]))
+
+    def seed(self, path: str | Path, geometry: PieceGeometry) -> PieceGeometry:
+        """Registra la geometría ya calculada en memoria para un CNC recién escrito."""
+        return self._store(self._key(path), geometry)
+
+    def invalidate(self, path: str | Path) -> None:
+        resolved = os.path.abspath(os.fspath(path))
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == resolved]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def _store(self, key: tuple[str, int, int], geometry: PieceGeometry) -> PieceGeometry:
+        with self._lock:
+            # Versiones anteriores del mismo fichero ya no sirven.
+            for old_key in [k for k in self._entries if k[0] == key[0] and k != key]:
+                del self._entries[old_key]
+            geometry = self._entries.setdefault(key, geometry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return geometry
+
+
+_GEOMETRY_CACHE = GeometryCache()
+
+
+def get_piece_geometry(path: str | Path) -> PieceGeometry:
+    return _GEOMETRY_CACHE.get(path)
+
+
+def seed_piece_geometry(path: str | Path, geometry: PieceGeometry) -> PieceGeometry:
+    return _GEOMETRY_CACHE.seed(path, geometry)
+
+
+def invalidate_piece_geometry(path: str | Path) -> None:
+    _GEOMETRY_CACHE.invalidate(path)
+
+
+def geometry_cache_stats() -> dict[str, Any]:
+    return _GEOMETRY_CACHE.stats()
@@ -1,40 +1,225 @@
+"""Log de la aplicación: un fichero por día en LOG/.
 
-from os import path, mkdir, sep, getcwd
+LogThis solo mete el mensaje en una cola y vuelve; un único hilo escritor
+vacía la cola por lotes y abre el fichero del día una vez por lote, en lugar
+de una vez por mensaje. Se puede llamar desde los workers de compute_ref.
+
+Formatos:
+- texto (por defecto): 'YYYY-M-D_Sorting-study.log', una línea por mensaje
+  'D-M-YYYY H:M:S <tipo> [<código>] = <mensaje> <valor>'
+- JSON lines (configure_log(json_lines=True)): 'YYYY-M-D_Sorting-study.jsonl',
+  un objeto por línea con ts, kind, code, message, value y thread
+
+Al salir del proceso se escribe todo lo pendiente (atexit).
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
 from datetime import datetime
+from typing import Any
+
+LOG_DIR_NAME = "LOG"
+MAX_BATCH = 1000
+
+_STOP = object()
+
+
+class _QueueLogWriter:
+    """Cola de mensajes de log con un hilo escritor que los vuelca por lotes."""
+
+    def __init__(self) -> None:
+        self.json_lines = False
+        # None: carpeta LOG del directorio actual en el momento de cada mensaje, como antes.
+        self.log_dir: str | None = None
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self._drain_lock = threading.Lock()
+        self._known_dirs: set[str] = set()
+
+    # ------------------------------------------------------------------
+    # Lado de quien registra
+    # ------------------------------------------------------------------
+
+    def put(self, code: str, kind: str, message: str, value: Any) -> None:
+        log_dir = self.log_dir if self.log_dir is not None else os.path.join(os.getcwd(), LOG_DIR_NAME)
+        record = (datetime.now(), log_dir, self.json_lines, code, kind, message, value, threading.current_thread().name)
+        if self._closed:
+            # Durante el cierre del intérprete o en un proceso hijo no hay hilo escritor.
+            self._write_batch([record])
+            return
+        if self._thread is None:
+            self._start()
+        self._queue.put(record)
+        if self._closed and not self._writer_alive():
+            # close() llegó entre la comprobación y el put: nadie más vaciará la cola.
+            self._drain()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Espera a que se escriba todo lo encolado hasta ahora."""
+        if self._thread is None or self._closed:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float | None = 5.0) -> None:
+        """Escribe lo pendiente y detiene el hilo escritor."""
+        if self._closed:
+            return
+        self._closed = True
+        thread = self._thread
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+        # Mensajes encolados por otros hilos detrás de la orden de parar.
+        if not self._writer_alive():
+            self._drain()
+
+    def _writer_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _drain(self) -> None:
+        """Escribe lo que quede en la cola; solo cuando el hilo escritor ya no corre."""
+        with self._drain_lock:
+            batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(batch)
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="logthis-writer", daemon=True)
+                self._thread.start()
+
+    def _after_fork(self) -> None:
+        # En un proceso hijo (ProcessPoolExecutor con fork) el hilo escritor no
+        # existe y el hijo puede terminar sin pasar por atexit: se escribe directo.
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        self._closed = True
+
+    # ------------------------------------------------------------------
+    # Hilo escritor
+    # ------------------------------------------------------------------
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if self._write_batch(batch):
+                return
+
+    def _write_batch(self, batch: list[Any]) -> bool:
+        """Escribe un lote agrupado por fichero; devuelve True si incluía la orden de parar."""
+        lines_by_path: dict[str, list[str]] = {}
+        waiters: list[threading.Event] = []
+        stop = False
+        for item in batch:
+            if item is _STOP:
+                stop = True
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            else:
+                path, line = _format_record(*item)
+                lines_by_path.setdefault(path, []).append(line)
+
+        for path, lines in lines_by_path.items():
+            try:
+                directory = os.path.dirname(path)
+                if directory not in self._known_dirs:
+                    os.makedirs(directory, exist_ok=True)
+                    self._known_dirs.add(directory)
+                if path.endswith(".jsonl"):
+                    with open(path, "a", encoding="utf-8", newline="") as archivo_log:
+                        archivo_log.write("".join(lines))
+                else:
+                    with open(path, "a", newline="") as archivo_log:
+                        archivo_log.write("".join(lines))
+            except Exception as exc:
+                sys.stderr.write(f"LogThis: no se pudo escribir en '{path}': {exc}\n")
+
+        for waiter in waiters:
+            waiter.set()
+        return stop
+
+
+def _format_record(
+    ahora: datetime,
+    log_dir: str,
+    json_lines: bool,
+    code: str,
+    kind: str,
+    message: str,
+    value: Any,
+    thread_name: str,
+) -> tuple[str, str]:
+    """Devuelve (fichero del día, línea) de un mensaje."""
+    base_name = f"{ahora.year}-{ahora.month}-{ahora.day}_Sorting-study"
+    if json_lines:
+        payload = {
+            "ts": ahora.isoformat(timespec="milliseconds"),
+            "kind": kind,
+            "code": code,
+            "message": message,
+            "value": value,
+            "thread": thread_name,
+        }
+        return os.path.join(log_dir, f"{base_name}.jsonl"), json.dumps(payload, ensure_ascii=False, default=str) + "\n"
+
+    ahora_hora = f"{ahora.hour}:{ahora.minute}:{ahora.second}"
+    ahora_fecha = f"{ahora.day}-{ahora.month}-{ahora.year}"
+    return os.path.join(log_dir, f"{base_name}.log"), f"{ahora_fecha} {ahora_hora} {kind} [{code}] = {message} {value}\n"
+
+
+_WRITER = _QueueLogWriter()
+atexit.register(_WRITER.close)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_WRITER._after_fork)
+
 
 def LogThis(mess_code: str,is_input: str, mess_str: str, value: str):
     """Función para escribir en el log de la aplicación. Crea un nuevo archivo de log cada día, con el formato 'YYYY-MM-DD.log'. Cada entrada de log incluye una marca de tiempo, el código del mensaje, si es una entrada o salida, y el mensaje en sí.
+
+    El mensaje se encola y lo escribe el hilo escritor del log: la llamada no toca el disco.
     Args:
         mess_code (str): Código del mensaje, para identificar el tipo de evento o acción.
         is_input (str): Indica si el mensaje es una entrada ('IN'), una salida ('OUT') o error ('ERR').
         mess_str (str): El mensaje descriptivo que se desea registrar.
         value (str): El valor asociado al mensaje, que puede ser cualquier información relevante. O el número de error.
     Returns:
-        bool: True si el archivo de log ya existía, False en caso contrario.
+        bool: True cuando el mensaje queda encolado (antes indicaba si el fichero del día ya existía; nadie lo usaba).
     """
-    
-    ahora = datetime.now()
-    cwd_path = getcwd() 
-    
-    ## variables para el log
-    ahora_hora = f"{ahora.hour}:{ahora.minute}:{ahora.second}"
-    ahora_fecha = f"{ahora.day}-{ahora.month}-{ahora.year}"
-    ahora_filename = f"{ahora.year}-{ahora.month}-{ahora.day}_Sorting-study.log"
-    timestamp = str(f"{ahora_fecha} {ahora_hora}")
-    new_line = f"{timestamp} {is_input} [{mess_code}] = {mess_str} {value}\n"
-    log_route = "LOG"
-    #print (new_line)
-    
-    if path.exists(f"{log_route}{sep}{ahora_filename}"):
-        exist_log = True
-
-    else:
-        exist_log = False
-        #print("<--no existe el fichero log")
-        if not path.exists(f"{cwd_path}{sep}LOG"):
-            mkdir(f"{cwd_path}{sep}LOG")
-
-    with open(f"{log_route}{sep}{ahora_filename}", 'a', newline="") as archivo_log:
-        archivo_log.write(new_line)  
-
-    return exist_log
\ No newline at end of file
+    _WRITER.put(mess_code, is_input, mess_str, value)
+    return True
+
+
+def configure_log(json_lines: bool | None = None, log_dir: str | None = None) -> None:
+    """Cambia el formato (texto o JSON lines) o la carpeta de los mensajes que se registren a partir de ahora."""
+    if json_lines is not None:
+        _WRITER.json_lines = bool(json_lines)
+    if log_dir is not None:
+        _WRITER.log_dir = os.path.abspath(log_dir)
+
+
+def flush_log(timeout: float | None = None) -> bool:
+    """Espera a que el hilo escritor haya volcado todos los mensajes registrados hasta ahora."""
+    return _WRITER.flush(timeout)
@@ -1,6 +1,66 @@
-
 import re
 
+# Etiqueta en el programa -> clave en el diccionario de cabecera.
+# "NUMBER OF SHEETS " conserva el espacio final por compatibilidad.
+HEAD_KEYS = {
+    "MACHINE": "MACHINE",
+    "MATERIAL": "MATERIAL",
+    "THICKNESS": "THICKNESS",
+    "LENS": "LENS",
+    "GAS": "GAS",
+    "POWER": "POWER",
+    "PARAM": "PARAM",
+    "REPETITIONS": "REPETITIONS",
+    "SIMULATION TIME": "SIMULATION TIME",
+    "FORMAT": "FORMAT",
+    "JOB NUMBER": "JOB NUMBER",
+    "PROGRAM NUMBER": "PROGRAM NUMBER",
+    "TYPE": "TYPE",
+    "NUMBER OF SHEETS": "NUMBER OF SHEETS ",
+    "CUTTING HEADS": "CUTTING HEADS",
+    "#516": "#516",
+    "#517": "#517",
+}
+
+# Un único patrón para todas las líneas de cabecera: "( CLAVE : valor )" o "#516= 1 ;"
+HEAD_PATTERN = re.compile(
+    r"\(\s*(?P<label>" + "|".join(re.escape(k) for k in HEAD_KEYS if not k.startswith("#")) + r") :\s*(?P<value>.*?)\s*\)"
+    r"|(?P<var>#516|#517)\s*=\s*(?P<number>\d+)\s*;"
+)
+
+# La cabecera termina en el primer bloque numerado (N105 G65 ...).
+N_BLOCK_PATTERN = re.compile(r"^N\d")
+
+FORMAT_PATTERN = re.compile(r"(\d+)[xX](\d+)")
+
+
+def iter_header_fields(file_content):
+    """Recorre la cabecera del programa y entrega pares (etiqueta, valor) en texto.
+
+    Se detiene en el primer bloque N, así que el cuerpo del programa no se
+    recorre. Las etiquetas son las claves de HEAD_KEYS sin normalizar.
+    """
+    for line in file_content:
+        line = line.strip()
+        if N_BLOCK_PATTERN.match(line):
+            return
+        if "(" not in line and "#" not in line:
+            continue
+        for match in HEAD_PATTERN.finditer(line):
+            if match.group("label"):
+                yield match.group("label"), match.group("value")
+            else:
+                yield match.group("var"), match.group("number")
+
+
+def parse_format(value):
+    """Descompone '1500x3000' en la tupla (1500, 3000); None si no es válido."""
+    format_match = FORMAT_PATTERN.search(str(value))
+    if not format_match:
+        return None
+    return int(format_match.group(1)), int(format_match.group(2))
+
+
 def parse_gcode_head(file_content):
     head_dict = {
         "MACHINE" :  "h",
@@ -22,63 +82,14 @@ def parse_gcode_head(file_content):
         "#517" : ""
     }
 
-    head_vars = list(head_dict.keys())
-
-    patterns = [
-        r"\( MACHINE :\s*(.*?)\s*\)",
-        r"\( MATERIAL :\s*(.*?)\s*\)",
-        r"\( THICKNESS :\s*(.*?)\s*\)",
-        r"\( LENS :\s*(.*?)\s*\)",
-        r"\( GAS :\s*(.*?)\s*\)",
-        r"\( POWER :\s*(.*?)\s*\)",
-        r"\( PARAM :\s*(.*?)\s*\)",
-        r"\( REPETITIONS :\s*(.*?)\s*\)",
-        r"\( SIMULATION TIME :\s*(.*?)\s*\)",
-        r"\( FORMAT :\s*(.*?)\s*\)",
-        r"\( JOB NUMBER :\s*(.*?)\s*\)",
-        r"\( PROGRAM NUMBER :\s*(.*?)\s*\)",
-        r"\( TYPE :\s*(.*?)\s*\)",
-        r"\( NUMBER OF SHEETS :\s*(.*?)\s*\)",
-        r"\(\s*CUTTING HEADS :\s*(.*?)\s*\)",
-        r"#516\s*=\s*(\d+)\s*;",
-        r"#517\s*=\s*(\d+)\s*;"
-    ]
-
-    patt_is_head = r"\(|#"    # Para encontrar que empieza por ( o por #
-
-    i:int = 0
-    n = len(patterns)
+    for label, value in iter_header_fields(file_content):
+        head_dict[HEAD_KEYS[label]] = value
 
-    # Parsear el archivo línea por línea
-    for line in file_content:
-        line = line.strip()
-        # Solo si empieza por (
-        match_line = re.search(patt_is_head, line)
-        if match_line:
-            while i < n:
-                match = re.search(patterns[i], line)
-                if match:
-                    #print(f"Found: {match.group()}")
-                    #print(f"{match[0]}")
-                    #print(head_vars[i], "=", match.group(1))
-                    head_dict[f"{head_vars[i]}"] = match.group(1)
-                i += 1    
-        i = 0
-    
     # Descomponemos el str del formato en una tupla
-    formato = head_dict["FORMAT"]
-    #print(formato)
-
-    format_match = re.search(r"(\d+)[xX](\d+)", formato)
-
-    if format_match:
-        f_x = int(format_match.group(1))
-        f_y = int(format_match.group(2))
-        #print("X =", f_x)
-        #print("Y =", f_y)
-    else:
+    formato = parse_format(head_dict["FORMAT"])
+    if formato is None:
         print("No se encontraró formaro válido.")
-        f_x, f_y = 0, 0
-    
-    head_dict["FORMAT"] = (f_x, f_y)       # Sobreescribimos el valor de formato por la tupla.
+        formato = (0, 0)
+
+    head_dict["FORMAT"] = formato       # Sobreescribimos el valor de formato por la tupla.
     return head_dict
@@ -1,75 +1,104 @@
 import re
+from dataclasses import dataclass, field
 from pathlib import Path
 from os import path
+from typing import Any, Iterable, Iterator
 
 
-def parse_gcode_parts(file_content, output_dir="OUT_cnc"):
-    """Extrae piezas del G-code y las escribe en el directorio indicado.
+@dataclass
+class ParsedPiece:
+    """Pieza separada del programa, en memoria.
 
-    Devuelve la lista ordenada de nombres de archivo CNC generados.
+    lines contiene el cuerpo CNC sin las dos líneas de cabecera (ID y nombre).
+    contours y metrics se rellenan en el procesado posterior para no volver a
+    parsear la pieza desde disco.
+    """
+    piece_id: str
+    piece_name: str
+    lines: list[str] = field(default_factory=list)
+    contours: list[Any] | None = None
+    metrics: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def filename(self) -> str:
+        return f"ID{self.piece_id}_{self.piece_name}.cnc"
+
+    def cnc_lines(self) -> list[str]:
+        """Contenido completo del CNC de la pieza, tal y como se escribe a disco."""
+        return [self.piece_id, self.piece_name, *self.lines]
+
+
+# Expresiones regulares para identificar piezas y el fin de una pieza
+PIECE_PATTERN = re.compile(r"^\(P(\d+):ID(\d+):(.*?)\)")
+N_PATTERN = re.compile(r"^N\d+\s")
+END_PART_CALL_PATTERN = re.compile(r"\bP9103\b")
+
+
+def iter_gcode_parts(file_content: Iterable[str]) -> Iterator[ParsedPiece]:
+    """Recorre el G-code una sola vez y va entregando cada pieza al cerrarse.
+
+    Las piezas salen en el orden del programa. Un ID ya visto no abre una
+    pieza nueva (las repeticiones del nido se ignoran). Cada línea se
+    clasifica una sola vez: cabecera de pieza, fuera de pieza o cuerpo.
     """
     print("\nInicida la busqueda de piezas...")
-    current_line = 0
-    procesed_id = []
-    generated_files = []
+    procesed_id = set()
+    n_pieces = 0
     current_piece_id = -1
+    current_piece_name = None
     current_contour = []
     piece_id = None
-    output_dir = Path(output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
 
-    # Regular expressions para identificar piezas y el fin de una pieza
-    piece_pattern = r'^\(P(\d+):ID(\d+):(.*?)\)'
-    n_pattern = r'^N\d+\s'
-    end_part_call_pattern = re.compile(r"\bP9103\b")
+    match_piece = PIECE_PATTERN.match
+    match_n = N_PATTERN.match
+    search_end = END_PART_CALL_PATTERN.search
 
-    n_lines = len(file_content)
-
-    while current_line <= n_lines - 1:
-        piece_match = re.match(piece_pattern, file_content[current_line])
+    for line in file_content:
+        piece_match = match_piece(line) if line.startswith("(P") else None
 
         if piece_match:
             piece_id = piece_match.group(2)
-            piece_name = piece_match.group(3)
-            if procesed_id.count(piece_id) == 0:
-                procesed_id.append(piece_id)
+            if piece_id not in procesed_id:
+                procesed_id.add(piece_id)
+                n_pieces += 1
                 current_piece_id = piece_id
-                current_piece_name = piece_name
-                output_filename = output_dir / f"ID{current_piece_id}_{current_piece_name}.cnc"
-                print(f"    --> {file_content[current_line]}")
-
-        else:
-            if end_part_call_pattern.search(file_content[current_line]) and current_piece_id == piece_id:
-                nxxx_match = re.match(n_pattern, file_content[current_line])
-                if nxxx_match and current_piece_id == piece_id:
-                    _, n_characters = nxxx_match.span()
-                    current_contour.append(file_content[current_line][n_characters:])
-                else:
-                    current_contour.append(file_content[current_line])
-
-                with open(output_filename, "w", encoding="utf-8", newline="\n") as archivo:
-                    archivo.write(f"{current_piece_id}\n")
-                    archivo.write(f"{current_piece_name}\n")
-                    for c in current_contour:
-                        archivo.write(f"{c}\n")
-                generated_files.append(output_filename.name)
-
-                current_piece_id = None
-                current_piece_name = None
-                current_contour = []
-
-            else:
-                nxxx_match = re.match(n_pattern, file_content[current_line])
-                if nxxx_match and current_piece_id == piece_id:
-                    _, n_characters = nxxx_match.span()
-                    current_contour.append(file_content[current_line][n_characters:])
-                else:
-                    if current_piece_id == piece_id:
-                        current_contour.append(file_content[current_line])
-
-        current_line += 1
-
-    print(len(procesed_id), "piezas encontradas")
+                current_piece_name = piece_match.group(3)
+                print(f"    --> {line}")
+            continue
+
+        # Fuera de una pieza abierta la línea no aporta nada.
+        if current_piece_id != piece_id:
+            continue
+
+        nxxx_match = match_n(line) if line.startswith("N") else None
+        current_contour.append(line[nxxx_match.end():] if nxxx_match else line)
+
+        if "P9103" in line and search_end(line):
+            yield ParsedPiece(piece_id=current_piece_id, piece_name=current_piece_name, lines=current_contour)
+
+            current_piece_id = None
+            current_piece_name = None
+            current_contour = []
+
+    print(n_pieces, "piezas encontradas")
+
+
+def parse_gcode_parts(file_content, output_dir="OUT_cnc"):
+    """Extrae piezas del G-code y las escribe en el directorio indicado.
+
+    Devuelve la lista ordenada de nombres de archivo CNC generados.
+    """
+    generated_files = []
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    for piece in iter_gcode_parts(file_content):
+        output_filename = output_dir / piece.filename
+        with open(output_filename, "w", encoding="utf-8", newline="\n") as archivo:
+            for c in piece.cnc_lines():
+                archivo.write(f"{c}\n")
+        generated_files.append(output_filename.name)
+
     generated_files.sort()
     return generated_files
 
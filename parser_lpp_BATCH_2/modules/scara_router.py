@@ -116,6 +116,7 @@ def route_piece_outputs(
     scara_root: str | Path = "SCARA",
     scara_enabled: bool = True,
     move_cnc: bool = True,
+    cnc_lines: list[str] | None = None,
 ) -> dict[str, Any]:
     """
     Redirige cada pieza a su carpeta de robot:
@@ -125,6 +126,9 @@ def route_piece_outputs(
     Si la pieza pasa filtros de SCARA se clasifica como SCARA.
     En caso contrario va a ANTHRO.
 
+    Si se pasa cnc_lines, la pieza está en memoria: se escribe directamente
+    en su carpeta final con el nombre de piece_path y no se mueve nada.
+
     Devuelve un dict con rutas finales y el resultado del filtrado.
     """
     piece_path = Path(piece_path)
@@ -156,7 +160,10 @@ def route_piece_outputs(
     final_dxf_path = dxf_dir / f"{piece_path.stem}.dxf"
     final_png_path = png_dir / f"{piece_path.stem}_contours.png"
 
-    if move_cnc:
+    if cnc_lines is not None:
+        with open(final_piece_path, "w", encoding="utf-8", newline="\n") as f:
+            f.write("\n".join(cnc_lines) + "\n")
+    elif move_cnc:
         try:
             if piece_path.resolve() != final_piece_path.resolve():
                 if final_piece_path.exists():
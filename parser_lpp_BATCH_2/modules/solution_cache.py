@@ -0,0 +1,288 @@
+"""Caché persistente de soluciones de compute_ref entre ejecuciones.
+
+Cada entrada guarda los ficheros que dejó el solver en la carpeta de la
+combinación y el resultado de la ejecución (stdout, códigos de retorno,
+report). La clave es un hash del contenido que realmente recibe el solver:
+geometría del ref JSON, herramienta procesada, material y parámetros.
+
+Estructura en disco:
+
+    <cache_dir>/
+    ├── index.json
+    └── ab/
+        └── abcdef.../
+            ├── run_result.json
+            └── ref_<pieza>_solution.json
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+CACHE_FORMAT_VERSION = 1
+INDEX_FILENAME = "index.json"
+RUN_RESULT_FILENAME = "run_result.json"
+
+# Campos del ref JSON que identifican la pieza pero no cambian lo que resuelve el solver.
+REF_IDENTITY_KEYS = ("reference", "pieceId", "sourceCnc")
+
+
+def _load_json(path: str | Path) -> Any:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _canonical_json_bytes(payload: Any) -> bytes:
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def compute_solution_cache_key(
+    ref_json_path: str | Path,
+    tool_json_path: str | Path,
+    material_json_path: str | Path,
+    max_compute_time: float,
+    enhance_opti: int,
+    solver_signature: str = "",
+) -> str:
+    """Calcula la clave de caché de una combinación pieza + herramienta.
+
+    Se eliminan del ref los campos de identidad de la pieza para que la misma
+    geometría en otro nido o con otro ID comparta solución.
+    """
+    ref_payload = _load_json(ref_json_path)
+    if isinstance(ref_payload, dict):
+        ref_payload = {k: v for k, v in ref_payload.items() if k not in REF_IDENTITY_KEYS}
+
+    digest = hashlib.sha256()
+    parts = (
+        {"cache_format": CACHE_FORMAT_VERSION, "solver": solver_signature},
+        ref_payload,
+        _load_json(tool_json_path),
+        _load_json(material_json_path),
+        {"max_compute_time": float(max_compute_time), "enhance_opti": int(enhance_opti)},
+    )
+    for part in parts:
+        digest.update(_canonical_json_bytes(part))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SolutionCache:
+    """Caché LRU en disco de resultados de compute_ref.
+
+    Es segura entre hilos del mismo proceso. El índice se persiste con save().
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path,
+        max_entries: int | None = 5000,
+        max_size_mb: float | None = None,
+    ) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = int(max_entries) if max_entries else None
+        self.max_bytes = int(float(max_size_mb) * 1024 * 1024) if max_size_mb else None
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._index: dict[str, dict[str, Any]] = self._load_index()
+
+    # ------------------------------------------------------------------
+    # Índice
+    # ------------------------------------------------------------------
+
+    @property
+    def index_path(self) -> Path:
+        return self.cache_dir / INDEX_FILENAME
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def _load_index(self) -> dict[str, dict[str, Any]]:
+        if not self.index_path.exists():
+            return {}
+        try:
+            payload = _load_json(self.index_path)
+        except Exception:
+            return {}
+        if not isinstance(payload, dict) or payload.get("version") != CACHE_FORMAT_VERSION:
+            return {}
+        entries = payload.get("entries")
+        return entries if isinstance(entries, dict) else {}
+
+    def save(self) -> None:
+        """Aplica la expulsión LRU y guarda el índice de forma atómica."""
+        with self._lock:
+            self._evict_locked()
+            if not self._dirty:
+                return
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_FORMAT_VERSION, "entries": self._index}, f)
+            os.replace(tmp_path, self.index_path)
+            self._dirty = False
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "entries": len(self._index),
+            }
+
+    # ------------------------------------------------------------------
+    # Consulta y almacenamiento
+    # ------------------------------------------------------------------
+
+    def lookup(self, key: str, combo_dir: str | Path, ref_json_path: str | Path) -> dict[str, Any] | None:
+        """Restaura en combo_dir los ficheros de una entrada y devuelve su run_result.
+
+        Devuelve None si no hay entrada válida para la clave.
+        """
+        with self._lock:
+            entry = self._index.get(key)
+        entry_dir = self._entry_dir(key)
+        run_result_path = entry_dir / RUN_RESULT_FILENAME
+        if entry is None or not run_result_path.exists():
+            with self._lock:
+                self.misses += 1
+                if entry is not None:
+                    self._index.pop(key, None)
+                    self._dirty = True
+            return None
+
+        try:
+            stored = _load_json(run_result_path)
+            run_result = self._restore_files(stored, entry_dir, Path(combo_dir), Path(ref_json_path))
+        except Exception:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            entry["last_hit"] = time.time()
+            entry["hits"] = int(entry.get("hits", 0)) + 1
+            self._dirty = True
+        return run_result
+
+    def store(self, key: str, run_result: dict[str, Any], combo_dir: str | Path, ref_json_path: str | Path) -> bool:
+        """Guarda en caché los ficheros nuevos del solver y su run_result."""
+        combo_dir = Path(combo_dir)
+        ref_stem = Path(ref_json_path).stem
+        entry_dir = self._entry_dir(key)
+        tmp_dir = entry_dir.with_name(f"{entry_dir.name}.tmp{threading.get_ident()}")
+        try:
+            if tmp_dir.exists():
+                shutil.rmtree(tmp_dir)
+            tmp_dir.mkdir(parents=True, exist_ok=True)
+
+            files: list[str] = []
+            size_bytes = 0
+            for file_path in run_result.get("new_files") or []:
+                src = Path(file_path)
+                if not src.is_file() or src.parent.resolve() != combo_dir.resolve():
+                    continue
+                shutil.copy2(src, tmp_dir / src.name)
+                size_bytes += src.stat().st_size
+                files.append(src.name)
+
+            stored = {k: v for k, v in run_result.items() if k != "new_files"}
+            stored["files"] = files
+            stored["ref_stem"] = ref_stem
+            with open(tmp_dir / RUN_RESULT_FILENAME, "w", encoding="utf-8") as f:
+                json.dump(stored, f, ensure_ascii=False)
+            size_bytes += (tmp_dir / RUN_RESULT_FILENAME).stat().st_size
+
+            if entry_dir.exists():
+                shutil.rmtree(entry_dir)
+            os.replace(tmp_dir, entry_dir)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return False
+
+        now = time.time()
+        with self._lock:
+            self._index[key] = {"created": now, "last_hit": now, "hits": 0, "size_bytes": size_bytes}
+            self.stores += 1
+            self._dirty = True
+        return True
+
+    # ------------------------------------------------------------------
+    # Internos
+    # ------------------------------------------------------------------
+
+    def _restore_files(self, stored: dict[str, Any], entry_dir: Path, combo_dir: Path, ref_json_path: Path) -> dict[str, Any]:
+        """Copia los ficheros de la entrada adaptando nombres e identidad a la pieza actual."""
+        combo_dir.mkdir(parents=True, exist_ok=True)
+        old_stem = str(stored.get("ref_stem") or "")
+        new_stem = ref_json_path.stem
+        ref_payload = _load_json(ref_json_path)
+        identity = {k: ref_payload[k] for k in REF_IDENTITY_KEYS if isinstance(ref_payload, dict) and k in ref_payload}
+
+        def rename(text: str) -> str:
+            return text.replace(old_stem, new_stem) if old_stem and old_stem != new_stem else text
+
+        new_files: list[str] = []
+        for name in stored.get("files") or []:
+            src = entry_dir / name
+            dst = combo_dir / rename(name)
+            if dst.suffix.lower() == ".json" and identity:
+                payload = _load_json(src)
+                changes = {k: v for k, v in identity.items() if isinstance(payload, dict) and k in payload and payload[k] != v}
+                if changes:
+                    payload.update(changes)
+                    with open(dst, "w", encoding="utf-8") as f:
+                        json.dump(payload, f, indent=2, ensure_ascii=False)
+                    new_files.append(str(dst))
+                    continue
+            shutil.copy2(src, dst)
+            new_files.append(str(dst))
+
+        run_result = {k: v for k, v in stored.items() if k not in ("files", "ref_stem")}
+        run_result["stdout"] = rename(str(run_result.get("stdout") or ""))
+        run_result["stderr"] = rename(str(run_result.get("stderr") or ""))
+        report = dict(run_result.get("report") or {})
+        if report.get("solution_saved_to"):
+            report["solution_saved_to"] = rename(str(report["solution_saved_to"]))
+        run_result["report"] = report
+        run_result["new_files"] = sorted(new_files)
+        run_result["from_cache"] = True
+        return run_result
+
+    def _evict_locked(self) -> None:
+        """Expulsa entradas por orden de último acierto hasta cumplir los límites."""
+        if not self._index:
+            return
+        total_bytes = sum(int(e.get("size_bytes", 0)) for e in self._index.values())
+
+        def over_limits() -> bool:
+            if self.max_entries is not None and len(self._index) > self.max_entries:
+                return True
+            if self.max_bytes is not None and total_bytes > self.max_bytes:
+                return True
+            return False
+
+        if not over_limits():
+            return
+        for key in sorted(self._index, key=lambda k: float(self._index[k].get("last_hit", 0.0))):
+            if not over_limits():
+                break
+            entry = self._index.pop(key)
+            total_bytes -= int(entry.get("size_bytes", 0))
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            self.evictions += 1
+            self._dirty = True
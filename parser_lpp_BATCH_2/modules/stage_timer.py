@@ -0,0 +1,97 @@
+"""Tiempos por fase del pipeline de main.py.
+
+stage_timer(fase) mide un bloque y guarda su duración en un registro común
+del proceso, seguro entre hilos (los workers de compute_ref también miden).
+Con into=<dict> la duración se suma además en ese diccionario: así se
+construyen los tiempos por pieza y por combinación de metadata_parser.json.
+
+write_stage_timings() deja el resumen de todas las medidas, con número de
+medidas, total, p50, p95 y máximo por fase, en segundos:
+
+    {
+      "wall_s": 41.2,
+      "stages": {
+        "solver": {"count": 24, "total_s": 30.1, "p50_s": 1.2, "p95_s": 2.4, "max_s": 2.9},
+        "png": {"count": 12, "total_s": 0.9, "p50_s": 0.07, "p95_s": 0.11, "max_s": 0.12}
+      }
+    }
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+_lock = threading.Lock()
+_samples: dict[str, list[float]] = {}
+_started = time.perf_counter()
+
+
+def record_stage(stage: str, seconds: float, into: dict[str, float] | None = None) -> None:
+    """Añade una medida de la fase al registro y, si se pasa, a into."""
+    with _lock:
+        _samples.setdefault(stage, []).append(seconds)
+    if into is not None:
+        into[stage] = round(into.get(stage, 0.0) + seconds, 6)
+
+
+@contextmanager
+def stage_timer(stage: str, into: dict[str, float] | None = None) -> Iterator[None]:
+    """Mide el bloque como una medida de la fase, también si termina con excepción."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - t0, into)
+
+
+def _percentile(values: list[float], q: float) -> float:
+    """Percentil q (0-100) con interpolación lineal; values debe estar ordenada."""
+    if len(values) == 1:
+        return values[0]
+    position = (len(values) - 1) * q / 100.0
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def stage_timings_summary() -> dict[str, object]:
+    """Resumen por fase de las medidas acumuladas desde el arranque o el último reset."""
+    with _lock:
+        samples = {stage: sorted(values) for stage, values in _samples.items()}
+        wall = time.perf_counter() - _started
+    stages = {
+        stage: {
+            "count": len(values),
+            "total_s": round(sum(values), 6),
+            "p50_s": round(_percentile(values, 50), 6),
+            "p95_s": round(_percentile(values, 95), 6),
+            "max_s": round(values[-1], 6),
+        }
+        for stage, values in sorted(samples.items())
+        if values
+    }
+    return {"wall_s": round(wall, 6), "stages": stages}
+
+
+def reset_stage_timings() -> None:
+    global _started
+    with _lock:
+        _samples.clear()
+        _started = time.perf_counter()
+
+
+def write_stage_timings(path: str | Path) -> Path:
+    """Escribe el resumen de forma atómica y devuelve la ruta."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.tmp{os.getpid()}")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(stage_timings_summary(), f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
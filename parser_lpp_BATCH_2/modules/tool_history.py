@@ -0,0 +1,130 @@
+"""Histórico de éxito de herramientas por familia de material y clase de tamaño.
+
+Se alimenta de las filas de summary.json (de la ejecución actual y, si se
+configuran, de summary.json archivados) y se guarda en un JSON persistente:
+
+    {
+      "version": 1,
+      "imported": {"<ruta summary.json>": <mtime_ns>},
+      "stats": {"STEEL|L": {"tool_A": {"runs": 12, "valid": 9}}}
+    }
+
+Sirve para ordenar las herramientas que se prueban primero en los modos de
+selección no exhaustivos.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable
+
+HISTORY_FORMAT_VERSION = 1
+
+
+def tool_name_from_path(tool_file: str | None) -> str:
+    """Normaliza 'TOOLS/processed/tool_A_with_polygons.json' o 'tool_A.json' a 'tool_A'."""
+    name = os.path.basename(str(tool_file or ""))
+    return name.replace("_with_polygons.json", "").replace(".json", "")
+
+
+def history_key(material_family: str | None, bbox_class: str | None) -> str:
+    return f"{(material_family or 'UNKNOWN').upper()}|{bbox_class or 'UNKNOWN'}"
+
+
+class ToolHistory:
+    """Contadores de ejecuciones y soluciones válidas por (familia, clase, herramienta)."""
+
+    def __init__(self, path: str | Path | None = None) -> None:
+        self.path = Path(path) if path else None
+        self.imported: dict[str, int] = {}
+        self.stats: dict[str, dict[str, dict[str, int]]] = {}
+        self._dirty = False
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except Exception:
+            return
+        if not isinstance(payload, dict) or payload.get("version") != HISTORY_FORMAT_VERSION:
+            return
+        if isinstance(payload.get("imported"), dict):
+            self.imported = payload["imported"]
+        if isinstance(payload.get("stats"), dict):
+            self.stats = payload["stats"]
+
+    def save(self) -> None:
+        if self.path is None or not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": HISTORY_FORMAT_VERSION, "imported": self.imported, "stats": self.stats},
+                f,
+                indent=2,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def add_rows(self, rows: list[dict[str, Any]], key_for_row: Callable[[dict[str, Any]], str]) -> int:
+        """Suma al histórico las filas en las que el solver llegó a ejecutarse.
+
+        Las filas servidas desde la caché de soluciones no cuentan: ese
+        resultado ya se sumó cuando el solver se ejecutó de verdad.
+        """
+        added = 0
+        for row in rows:
+            if not isinstance(row, dict) or not row.get("run_executed") or row.get("solution_cache_hit"):
+                continue
+            tool_name = tool_name_from_path(row.get("tool_file"))
+            if not tool_name:
+                continue
+            counters = self.stats.setdefault(key_for_row(row), {}).setdefault(tool_name, {"runs": 0, "valid": 0})
+            counters["runs"] = int(counters.get("runs", 0)) + 1
+            if row.get("solution_valid"):
+                counters["valid"] = int(counters.get("valid", 0)) + 1
+            added += 1
+        if added:
+            self._dirty = True
+        return added
+
+    def import_summary(self, summary_path: str | Path, key_for_row: Callable[[dict[str, Any]], str]) -> int:
+        """Importa un summary.json archivado una sola vez por versión del fichero."""
+        summary_path = Path(summary_path)
+        try:
+            mtime_ns = summary_path.stat().st_mtime_ns
+        except OSError:
+            return 0
+        marker = str(summary_path.resolve())
+        if self.imported.get(marker) == mtime_ns:
+            return 0
+        try:
+            with open(summary_path, "r", encoding="utf-8") as f:
+                rows = json.load(f)
+        except Exception:
+            return 0
+        if isinstance(rows, dict):
+            rows = rows.get("rows")
+        if not isinstance(rows, list):
+            return 0
+        added = self.add_rows(rows, key_for_row)
+        self.imported[marker] = mtime_ns
+        self._dirty = True
+        return added
+
+    def success_score(self, key: str, tool_name: str) -> float:
+        """Tasa de éxito suavizada: una herramienta sin histórico puntúa 0.5."""
+        counters = self.stats.get(key, {}).get(tool_name_from_path(tool_name), {})
+        runs = int(counters.get("runs", 0))
+        valid = int(counters.get("valid", 0))
+        return (valid + 1.0) / (runs + 2.0)
+
+    def order_tools(self, key: str, tool_names: list[str]) -> list[str]:
+        """Ordena por tasa de éxito descendente; en empate se respeta el orden de entrada."""
+        return sorted(tool_names, key=lambda name: -self.success_score(key, name))
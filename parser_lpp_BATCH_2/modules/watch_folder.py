@@ -0,0 +1,178 @@
+"""Vigilancia de la carpeta INPUT para el modo servicio de main.py (--watch).
+
+FolderWatcher detecta por sondeo los programas nuevos, modificados o
+borrados. Un fichero solo se entrega cuando lleva settle_s segundos sin
+cambiar de tamaño ni de fecha y se puede abrir, para no procesar programas
+que el CAM o la copia por red aún están escribiendo.
+
+JobStatusBoard escribe un JSON de estado por programa en la carpeta de
+trabajos (OUT_jobs), con el último trabajo lanzado para ese programa:
+
+    {
+      "job_id": "20250106-101500-0003",
+      "program": "programa.cnc",
+      "action": "process",
+      "state": "done",
+      "queued_at": "2025-01-06T10:15:00",
+      "started_at": "2025-01-06T10:15:02",
+      "finished_at": "2025-01-06T10:15:40",
+      "duration_s": 38.2,
+      "pieces": 12,
+      "combos": 24,
+      "valid_solutions": 20,
+      "error": null
+    }
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+
+def _now_iso() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class FolderWatcher:
+    """Detecta por sondeo los ficheros listos o eliminados de una carpeta.
+
+    poll() devuelve los ficheros nuevos o modificados que ya están estables y
+    los que se habían confirmado con acknowledge() y ya no existen. Un fichero
+    que no se confirma (por ejemplo, porque la cola está llena) se vuelve a
+    entregar en el siguiente sondeo.
+    """
+
+    def __init__(self, directory: str | Path, extensions: tuple[str, ...] = (".lpp", ".cnc"), settle_s: float = 3.0) -> None:
+        self.directory = Path(directory)
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.settle_s = max(0.0, float(settle_s))
+        # nombre -> (tamaño, mtime_ns, instante en que se vio así por primera vez)
+        self._pending: dict[str, tuple[int, int, float]] = {}
+        # nombre -> (tamaño, mtime_ns) ya entregado y confirmado
+        self._acknowledged: dict[str, tuple[int, int]] = {}
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        entries: dict[str, tuple[int, int]] = {}
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.name.lower().endswith(self.extensions):
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            pass
+        return entries
+
+    def _readable(self, name: str) -> bool:
+        # En Windows no se puede abrir un fichero que otro proceso tiene abierto para escritura.
+        try:
+            with open(self.directory / name, "rb"):
+                return True
+        except OSError:
+            return False
+
+    def poll(self, now: float | None = None) -> tuple[list[str], list[str]]:
+        """Devuelve (ficheros listos, ficheros confirmados que han desaparecido)."""
+        now = time.monotonic() if now is None else now
+        entries = self._scan()
+        ready: list[str] = []
+        for name, signature in sorted(entries.items()):
+            if self._acknowledged.get(name) == signature:
+                self._pending.pop(name, None)
+                continue
+            previous = self._pending.get(name)
+            if previous is None or previous[:2] != signature:
+                self._pending[name] = (signature[0], signature[1], now)
+                continue
+            if now - previous[2] >= self.settle_s and self._readable(name):
+                ready.append(name)
+        for name in [name for name in self._pending if name not in entries]:
+            del self._pending[name]
+        removed = sorted(name for name in self._acknowledged if name not in entries)
+        return ready, removed
+
+    def acknowledge(self, name: str) -> None:
+        """Marca el fichero como entregado con su tamaño y fecha actuales."""
+        try:
+            stat = (self.directory / name).stat()
+        except OSError:
+            self._acknowledged.pop(name, None)
+            return
+        self._acknowledged[name] = (stat.st_size, stat.st_mtime_ns)
+        self._pending.pop(name, None)
+
+    def forget(self, name: str) -> None:
+        """Olvida un fichero eliminado ya entregado como borrado."""
+        self._acknowledged.pop(name, None)
+        self._pending.pop(name, None)
+
+
+class JobStatusBoard:
+    """Crea los trabajos del modo servicio y publica su estado en status_dir."""
+
+    def __init__(self, status_dir: str | Path) -> None:
+        self.status_dir = Path(status_dir)
+        self.status_dir.mkdir(parents=True, exist_ok=True)
+        self._sequence = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def new_job(self, program: str, action: str) -> dict[str, Any]:
+        """Crea un trabajo en estado 'queued' y escribe su JSON."""
+        with self._lock:
+            sequence = next(self._sequence)
+        job = {
+            "job_id": f"{time.strftime('%Y%m%d-%H%M%S')}-{sequence:04d}",
+            "program": program,
+            "action": action,
+            "state": "queued",
+            "queued_at": _now_iso(),
+            "started_at": None,
+            "finished_at": None,
+            "duration_s": None,
+            "pieces": None,
+            "combos": None,
+            "valid_solutions": None,
+            "error": None,
+        }
+        self.write(job)
+        return job
+
+    def start(self, job: dict[str, Any]) -> None:
+        job["state"] = "running"
+        job["started_at"] = _now_iso()
+        job["_t0"] = time.perf_counter()
+        self.write(job)
+
+    def finish(self, job: dict[str, Any], state: str, **fields: Any) -> None:
+        """Cierra el trabajo con su estado final (done, unchanged o failed)."""
+        job.update(fields)
+        job["state"] = state
+        job["finished_at"] = _now_iso()
+        t0 = job.pop("_t0", None)
+        if t0 is not None:
+            job["duration_s"] = round(time.perf_counter() - t0, 3)
+        self.write(job)
+
+    def status_path(self, program: str) -> Path:
+        return self.status_dir / f"{Path(program).stem}.json"
+
+    def write(self, job: dict[str, Any]) -> None:
+        """Escribe el estado de forma atómica para que nadie lea un JSON a medias."""
+        path = self.status_path(job["program"])
+        tmp_path = path.with_name(f"{path.name}.tmp{threading.get_ident()}")
+        payload = {key: value for key, value in job.items() if not key.startswith("_")}
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)